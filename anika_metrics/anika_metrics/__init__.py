@@ -0,0 +1,12 @@
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from anika_metrics.middleware import MetricsMiddleware
+from anika_metrics.registry import DEFAULT_BUCKETS, MetricsRegistry, metrics
+
+__all__ = [
+    'CONTENT_TYPE_LATEST',
+    'DEFAULT_BUCKETS',
+    'MetricsMiddleware',
+    'MetricsRegistry',
+    'metrics',
+]
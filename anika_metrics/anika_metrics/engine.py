@@ -0,0 +1,65 @@
+"""Метрики движков SQLAlchemy.
+
+Модуль импортирует SQLAlchemy, поэтому подключается только сервисами,
+работающими с PostgreSQL через SQLAlchemy.
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from anika_metrics.registry import metrics
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Регистрирует метрики запросов и пула соединений движка SQLAlchemy.
+
+    Args:
+        engine (AsyncEngine): Движок SQLAlchemy.
+    """
+    duration = metrics.histogram('db_query_seconds',
+                                 'Время выполнения запросов к PostgreSQL',
+                                 labels=('operation',))
+    errors = metrics.counter('db_query_errors_total',
+                             'Запросы к PostgreSQL, завершившиеся ошибкой')
+    connections = metrics.gauge('db_pool_connections',
+                                'Открытые соединения в пуле PostgreSQL')
+    in_use = metrics.gauge('db_pool_connections_in_use',
+                           'Соединения PostgreSQL, выданные из пула')
+    sync_engine = engine.sync_engine
+
+    # Время начала хранится в соединении: на одном соединении запросы
+    # выполняются последовательно
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, *_args) -> None:
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, _cursor, statement, *_args) -> None:
+        started = conn.info.pop('query_started', None)
+        if started is not None:
+            duration.labels(
+                operation=statement.split(None, 1)[0].upper(),
+            ).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def handle_error(context) -> None:
+        if context.connection is not None:
+            context.connection.info.pop('query_started', None)
+        errors.inc()
+
+    @event.listens_for(sync_engine.pool, 'connect')
+    def connect(*_args) -> None:
+        connections.inc()
+
+    @event.listens_for(sync_engine.pool, 'close')
+    def close(*_args) -> None:
+        connections.dec()
+
+    @event.listens_for(sync_engine.pool, 'checkout')
+    def checkout(*_args) -> None:
+        in_use.inc()
+
+    @event.listens_for(sync_engine.pool, 'checkin')
+    def checkin(*_args) -> None:
+        in_use.dec()
@@ -0,0 +1,73 @@
+import time
+from typing import TYPE_CHECKING
+
+from anika_metrics.registry import metrics
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class MetricsMiddleware:
+    """ASGI-промежуточный слой, измеряющий время обработки HTTP-запросов.
+
+    Время измеряется от получения запроса до отправки заголовков ответа,
+    поэтому для потоковых ответов учитывается время до начала потока,
+    а не его длительность. Маршрут берется из шаблона пути, чтобы
+    идентификаторы в путях не порождали новые наборы меток; запросы,
+    не совпавшие ни с одним маршрутом, учитываются с маршрутом 'unmatched'.
+
+    Атрибуты:
+        _app (ASGIApp): Оборачиваемое приложение.
+        _duration (Histogram): Время обработки запросов по методу, маршруту
+            и коду ответа.
+    """
+
+    def __init__(self, app: 'ASGIApp'):
+        """Инициализирует промежуточный слой.
+
+        Args:
+            app (ASGIApp): Оборачиваемое приложение.
+        """
+        self._app = app
+        self._duration = metrics.histogram(
+            'http_request_duration_seconds',
+            'Время обработки HTTP-запросов до отправки заголовков ответа',
+            labels=('method', 'route', 'status'),
+        )
+
+    async def __call__(self, scope: 'Scope', receive: 'Receive',
+                       send: 'Send') -> None:
+        """Обрабатывает запрос и регистрирует время его обработки.
+
+        Args:
+            scope (Scope): Параметры соединения.
+            receive (Receive): Функция получения событий ASGI.
+            send (Send): Функция отправки событий ASGI.
+        """
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status: int) -> None:
+            nonlocal observed
+            observed = True
+            route = scope.get('route')
+            self._duration.labels(
+                method=scope['method'],
+                route=getattr(route, 'path', 'unmatched'),
+                status=status,
+            ).observe(time.perf_counter() - started)
+
+        async def send_wrapper(message: 'Message') -> None:
+            if message['type'] == 'http.response.start':
+                observe(message['status'])
+            await send(message)
+
+        try:
+            await self._app(scope, receive, send_wrapper)
+        finally:
+            if not observed:
+                observe(500)
@@ -0,0 +1,183 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Границы корзин гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса.
+
+    Метрики создаются в собственном реестре prometheus_client, а не
+    в глобальном, чтобы повторное создание компонентов (например, в тестах)
+    получало уже зарегистрированную метрику вместо ошибки о дублировании
+    имени. prometheus_client обновляет значения под блокировкой, поэтому
+    метрики можно изменять из потоков драйверов баз данных и отправки логов.
+
+    Атрибуты:
+        _registry (CollectorRegistry): Реестр prometheus_client.
+        _metrics (Dict[str, Counter | Gauge | Histogram]): Зарегистрированные
+            метрики по имени.
+        _labels (Dict[str, Tuple[str, ...]]): Имена меток зарегистрированных
+            метрик.
+    """
+
+    def __init__(self):
+        """Инициализирует пустой реестр метрик."""
+        self._registry = CollectorRegistry()
+        self._metrics: Dict[str, Counter | Gauge | Histogram] = {}
+        self._labels: Dict[str, Tuple[str, ...]] = {}
+
+    def _get_or_create(self, metric_class: type, name: str, description: str,
+                       labels: Sequence[str], **kwargs: Any):
+        """Возвращает зарегистрированную метрику или создаёт новую.
+
+        Args:
+            metric_class (type): Класс метрики prometheus_client.
+            name (str): Имя метрики.
+            description (str): Описание метрики.
+            labels (Sequence[str]): Имена меток метрики.
+            **kwargs: Дополнительные параметры конструктора метрики.
+
+        Returns:
+            Counter | Gauge | Histogram: Метрика.
+
+        Raises:
+            ValueError: Если метрика с таким именем уже зарегистрирована
+                с другим типом или метками.
+        """
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = metric_class(
+                name, description, labelnames=labels,
+                registry=self._registry, **kwargs,
+            )
+            self._labels[name] = tuple(labels)
+        if (type(metric) is not metric_class
+                or self._labels[name] != tuple(labels)):
+            raise ValueError(f'Metric {name} is already registered '
+                             f'with another type or labels')
+        return metric
+
+    def counter(self, name: str, description: str,
+                labels: Sequence[str] = ()) -> Counter:
+        """Возвращает счётчик с указанным именем.
+
+        Args:
+            name (str): Имя метрики.
+            description (str): Описание метрики.
+            labels (Sequence[str], optional): Имена меток. По умолчанию
+                метрика без меток.
+
+        Returns:
+            Counter: Счётчик.
+        """
+        return self._get_or_create(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str,
+              labels: Sequence[str] = ()) -> Gauge:
+        """Возвращает метрику-индикатор с указанным именем.
+
+        Args:
+            name (str): Имя метрики.
+            description (str): Описание метрики.
+            labels (Sequence[str], optional): Имена меток. По умолчанию
+                метрика без меток.
+
+        Returns:
+            Gauge: Метрика-индикатор.
+        """
+        return self._get_or_create(Gauge, name, description, labels)
+
+    def histogram(self, name: str, description: str,
+                  labels: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        """Возвращает гистограмму с указанным именем.
+
+        Args:
+            name (str): Имя метрики.
+            description (str): Описание метрики.
+            labels (Sequence[str], optional): Имена меток. По умолчанию
+                метрика без меток.
+            buckets (Optional[Sequence[float]], optional): Верхние границы
+                корзин. По умолчанию DEFAULT_BUCKETS.
+
+        Returns:
+            Histogram: Гистограмма.
+        """
+        return self._get_or_create(Histogram, name, description, labels,
+                                   buckets=buckets or DEFAULT_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает снимок всех зарегистрированных метрик.
+
+        Значения счётчиков и индикаторов возвращаются вместе с метками,
+        для гистограмм - накопленные значения корзин, сумма и количество
+        наблюдений.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Значения метрик по имени.
+        """
+        result = {}
+        for name, metric in list(self._metrics.items()):
+            for family in metric.collect():
+                result[name] = {
+                    'type': family.type,
+                    'description': family.documentation,
+                    'values': _family_values(family.name, family.type,
+                                             family.samples),
+                }
+        return result
+
+    def render(self) -> bytes:
+        """Возвращает все метрики в текстовом формате Prometheus.
+
+        Returns:
+            bytes: Текст для ответа на запрос Prometheus.
+        """
+        return generate_latest(self._registry)
+
+
+def _family_values(name: str, kind: str,
+                   samples: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Группирует значения семейства метрик по наборам меток.
+
+    Args:
+        name (str): Имя семейства без суффиксов.
+        kind (str): Тип метрики.
+        samples (Sequence[Any]): Значения семейства.
+
+    Returns:
+        List[Dict[str, Any]]: Значения с метками; для гистограмм - корзины,
+            сумма и количество.
+    """
+    if kind != 'histogram':
+        value_name = f'{name}_total' if kind == 'counter' else name
+        return [{'labels': sample.labels, 'value': sample.value}
+                for sample in samples if sample.name == value_name]
+
+    values: Dict[tuple, Dict[str, Any]] = {}
+    for sample in samples:
+        labels = {key: value for key, value in sample.labels.items()
+                  if key != 'le'}
+        value = values.setdefault(tuple(sorted(labels.items())),
+                                  {'labels': labels, 'buckets': {}})
+        if sample.name == f'{name}_bucket':
+            value['buckets'][sample.labels['le']] = int(sample.value)
+        elif sample.name == f'{name}_sum':
+            value['sum'] = sample.value
+        elif sample.name == f'{name}_count':
+            value['count'] = int(sample.value)
+    return list(values.values())
+
+
+# Реестр метрик сервиса
+metrics = MetricsRegistry()
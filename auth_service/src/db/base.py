@@ -1,3 +1,4 @@
+from anika_metrics.engine import instrument_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
@@ -16,4 +17,5 @@ async def init_database(database_url: str) -> async_sessionmaker:
         database_url,
         echo=True,
     )
+    instrument_engine(engine)
     return async_sessionmaker(engine, expire_on_commit=False)
@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager
 from typing import Any, Dict
 
+from anika_metrics import MetricsMiddleware
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
@@ -9,6 +10,7 @@ from fastapi.responses import JSONResponse
 
 from src.db.base import init_database
 from src.dependencies.config import get_db_config
+from src.routes.metrics import metrics_router
 from src.routes.users import auth_router
 
 
@@ -65,7 +67,9 @@ def create_app() -> FastAPI:
         FastAPI: Fastapi application
     """
     app = FastAPI(lifespan=lifespan_events)
+    app.add_middleware(MetricsMiddleware)
     app.include_router(auth_router)
+    app.include_router(metrics_router)
     app.openapi_schema = get_openapi_schema(app)
     return app
 
@@ -0,0 +1,17 @@
+from anika_metrics import CONTENT_TYPE_LATEST, metrics
+from fastapi import APIRouter, Response
+
+
+metrics_router = APIRouter(tags=['Metrics'])
+
+
+@metrics_router.get('/metrics', response_class=Response)
+async def get_metrics() -> Response:
+    """
+    Service metrics in the Prometheus text format
+
+    Returns:
+        Response: request latency per route, query latency
+        and connection pool usage
+    """
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
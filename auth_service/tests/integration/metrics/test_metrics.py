@@ -0,0 +1,19 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposes_request_latency(
+    fastapi_test_client: AsyncClient,
+) -> None:
+    await fastapi_test_client.post(
+        url='/auth/token',
+        json={'username': 'user1', 'password': 'password1'},
+    )
+    response = await fastapi_test_client.get(url='/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert (
+        'http_request_duration_seconds_count'
+        '{method="POST",route="/auth/token",status="403"}'
+    ) in response.text
@@ -0,0 +1,90 @@
+"""Сравнивает затраты CPU на сборку ответа /messages/search через модели и напрямую из документов.
+
+Запуск из каталога messages_microservice:
+
+    python -m benchmarks.search_encoding --documents 10000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from src.schemas.responses import MessageOutput, SearchOutput
+from src.utils.encoding import encode_response
+from src.utils.search import message_output
+
+
+def make_documents(count: int) -> List[Dict[str, Any]]:
+    """Создает документы сообщений в том виде, в котором их возвращает драйвер MongoDB.
+
+    Args:
+        count (int): Количество документов.
+
+    Returns:
+        List[Dict[str, Any]]: Документы.
+    """
+    return [{'_id': ObjectId(), 'unique_id': index, 'topic_id': 1, 'created_date': datetime.now(),
+             'idempotency_key': None, 'expire_at': None,
+             'payload': {'order_id': index, 'status': 'paid', 'amount': 1234.5, 'created_date': datetime.now(),
+                         'items': [{'sku': f'sku-{item}', 'qty': item} for item in range(5)]}}
+            for index in range(count)]
+
+
+async def through_models(documents: List[Dict[str, Any]]) -> bytes:
+    """Прежняя схема: модели на каждое сообщение, затем проверка и сериализация ответа FastAPI."""
+    output = SearchOutput(messages=[MessageOutput(**document) for document in documents],
+                          unique_ids=list(range(len(documents))))
+    field = create_response_field(name='Response', type_=SearchOutput, mode='serialization')
+    content = await serialize_response(field=field, response_content=output, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def direct(documents: List[Dict[str, Any]]) -> bytes:
+    """Текущая схема: словари нужной формы сериализуются сразу в байты ответа."""
+    return encode_response({'messages': [message_output(document) for document in documents],
+                            'unique_ids': list(range(len(documents))), 'next_cursor': None, 'explain': None})
+
+
+async def measure(function: Callable[[List[Dict[str, Any]]], Awaitable[bytes]],
+                  documents: List[Dict[str, Any]], repeat: int) -> float:
+    """Возвращает лучшее время сборки ответа в миллисекундах.
+
+    Args:
+        function (Callable[[List[Dict[str, Any]]], Awaitable[bytes]]): Проверяемая схема.
+        documents (List[Dict[str, Any]]): Документы.
+        repeat (int): Количество повторов.
+
+    Returns:
+        float: Время сборки ответа в миллисекундах.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await function(documents)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+async def main() -> None:
+    """Выводит время сборки ответа для обеих схем."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents)
+    print(f'documents: {args.documents}')
+    before = await measure(through_models, documents, args.repeat)
+    after = await measure(direct, documents, args.repeat)
+    print(f'models + FastAPI serialization: {before:8.1f} ms')
+    print(f'direct encoding:                {after:8.1f} ms ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
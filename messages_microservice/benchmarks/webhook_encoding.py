@@ -0,0 +1,101 @@
+"""Сравнивает затраты CPU на сериализацию сообщений при рассылке вебхуков.
+
+Запуск из каталога messages_microservice:
+
+    python -m benchmarks.webhook_encoding --subscribers 10 --messages 2000
+"""
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from src.database.models import Message
+from src.utils.encoding import encode_body, join_bodies
+
+
+def make_messages(count: int) -> List[Message]:
+    """Создает сообщения с типичной вложенной полезной нагрузкой.
+
+    Args:
+        count (int): Количество сообщений.
+
+    Returns:
+        List[Message]: Сообщения.
+    """
+    return [Message(unique_id=index, topic_id=1,
+                    payload={'order_id': index, 'status': 'paid', 'amount': 1234.5, 'currency': 'RUB',
+                             'items': [{'sku': f'sku-{item}', 'qty': item, 'price': 99.9} for item in range(10)],
+                             'customer': {'id': index * 7, 'email': 'user@example.com', 'tags': ['a', 'b', 'c']}})
+            for index in range(count)]
+
+
+def per_delivery(messages: List[Message], subscribers: int) -> None:
+    """Прежняя схема: сообщение сериализуется заново для каждой подписки."""
+    for message in messages:
+        payload = message.dict()
+        for _ in range(subscribers):
+            json.dumps(payload, default=str).encode()
+
+
+def encode_once(messages: List[Message], subscribers: int) -> None:
+    """Текущая схема: сообщение сериализуется один раз, тело переиспользуется всеми подписками."""
+    for message in messages:
+        body = encode_body(message.dict())
+        for _ in range(subscribers):
+            len(body)
+
+
+def measure(function: Callable[[List[Message], int], None], messages: List[Message], subscribers: int,
+            repeat: int) -> float:
+    """Возвращает лучшее время выполнения в микросекундах на сообщение.
+
+    Args:
+        function (Callable[[List[Message], int], None]): Проверяемая схема.
+        messages (List[Message]): Сообщения.
+        subscribers (int): Количество подписок на тему.
+        repeat (int): Количество повторов.
+
+    Returns:
+        float: Время на одно сообщение в микросекундах.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(messages, subscribers)
+        best = min(best, time.perf_counter() - started)
+    return best / len(messages) * 1e6
+
+
+def main() -> None:
+    """Выводит время сериализации на сообщение для обеих схем и сборки пакета."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--subscribers', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    bodies = [encode_body(message.dict()) for message in messages]
+    payloads = [message.dict() for message in messages]
+
+    print(f'messages: {args.messages}, subscribers: {args.subscribers}')
+    before = measure(per_delivery, messages, args.subscribers, args.repeat)
+    after = measure(encode_once, messages, args.subscribers, args.repeat)
+    print(f'per-delivery json.dumps: {before:8.1f} us/message')
+    print(f'encode once:             {after:8.1f} us/message ({before / after:.1f}x)')
+
+    batch = 100
+    started = time.perf_counter()
+    for start in range(0, len(payloads), batch):
+        json.dumps(payloads[start:start + batch], default=str).encode()
+    reencoded = (time.perf_counter() - started) / len(payloads) * 1e6
+    started = time.perf_counter()
+    for start in range(0, len(bodies), batch):
+        join_bodies(bodies[start:start + batch])
+    joined = (time.perf_counter() - started) / len(bodies) * 1e6
+    print(f'batch of {batch}, re-encoded: {reencoded:8.1f} us/message')
+    print(f'batch of {batch}, joined:     {joined:8.1f} us/message')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,58 @@
-from contextlib import suppress
+import asyncio
+from contextlib import suppress, asynccontextmanager
+from typing import AsyncIterator
+
 import uvicorn
+from anika_metrics import MetricsMiddleware
 from fastapi import FastAPI
 
 from config import config
-from handlers import router
+from handlers import router, metrics_router
+from src.depends import create_mongodb, create_outbox_dispatcher, create_webhooks_notifier, create_index_manager, \
+    create_topics_cache, create_search_cache, create_query_guard, create_write_buffer, create_message_storage, \
+    create_message_feed, create_topic_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Создает общие для процесса ресурсы при запуске приложения и освобождает их при остановке.
+
+    Args:
+        app (FastAPI): Экземпляр приложения FastAPI.
+    """
+    app.state.mongodb = create_mongodb()
+    app.state.topics_cache = create_topics_cache()
+    app.state.topic_service = create_topic_service()
+    app.state.search_cache = create_search_cache()
+    app.state.query_guard = create_query_guard()
+    app.state.message_storage = create_message_storage(app.state.mongodb)
+    app.state.write_buffer = create_write_buffer(app.state.mongodb, app.state.message_storage)
+    app.state.message_feed = create_message_feed(app.state.mongodb)
+    app.state.index_manager = create_index_manager(app.state.mongodb, app.state.message_storage)
+    # Индексы строятся в фоне, чтобы запуск сервиса не ждал построения на больших коллекциях
+    index_task = asyncio.create_task(app.state.index_manager.reconcile()) \
+        if config.indexes.reconcile_on_startup else None
+    retention_task = asyncio.create_task(
+        app.state.message_storage.run_retention(config.retention.keep_months, config.retention.sweep_interval_s)
+    ) if app.state.message_storage.is_bucketed else None
+    webhooks_notifier = create_webhooks_notifier()
+    outbox_dispatcher = create_outbox_dispatcher(app.state.mongodb, webhooks_notifier)
+    try:
+        async with app.state.topic_service, webhooks_notifier:
+            await outbox_dispatcher.start()
+            try:
+                yield
+            finally:
+                await outbox_dispatcher.stop()
+    finally:
+        await app.state.message_feed.close()
+        for task in (index_task, retention_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if app.state.write_buffer is not None:
+            await app.state.write_buffer.close()
+        app.state.mongodb.close()
 
 
 def create_app() -> FastAPI:
@@ -12,8 +61,10 @@ def create_app() -> FastAPI:
     Returns:
         FastAPI: Настроенный экземпляр FastAPI.
     """
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(MetricsMiddleware)
     app.include_router(router=router)
+    app.include_router(router=metrics_router)
 
     return app
 
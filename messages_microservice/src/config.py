@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Literal, Dict
 from utils.config import BaseConfig
 
 
@@ -14,6 +14,9 @@ class LoggerConfig(BaseModel):
         logstash_host (Optional[str]): Хост Logstash.
         logstash_port (Optional[int]): Порт Logstash.
         log_level (str): Уровень логирования.
+        logstash_queue_size (int): Максимальное количество записей в очереди отправки в Logstash.
+        logstash_batch_size (int): Максимальное количество записей в одном запросе к Logstash.
+        logstash_flush_interval_s (float): Максимальное время ожидания записи в очереди отправки в секундах.
     """
     log_to_console: bool
     log_to_file: bool
@@ -22,6 +25,9 @@ class LoggerConfig(BaseModel):
     logstash_host: Optional[str]
     logstash_port: Optional[int]
     log_level: str
+    logstash_queue_size: int = 10000
+    logstash_batch_size: int = 500
+    logstash_flush_interval_s: float = 1.0
 
 
 class Server(BaseModel):
@@ -46,12 +52,226 @@ class Database(BaseModel):
         username (str): Имя пользователя базы данных.
         password (str): Пароль базы данных.
         name (str): Имя базы данных.
+        max_pool_size (int): Максимальный размер пула соединений.
+        min_pool_size (int): Минимальное количество соединений в пуле.
+        max_idle_time_ms (Optional[int]): Время простоя соединения до его закрытия в миллисекундах.
+        server_selection_timeout_ms (int): Время ожидания выбора сервера в миллисекундах.
+        replica_set (Optional[str]): Имя набора реплик. Нужен для записи сообщений вместе с очередью вебхуков
+            в одной транзакции и для потока новых сообщений /messages/stream.
     """
     host: str
     port: int
     username: Optional[str] = None
     password: Optional[str] = None
     name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    server_selection_timeout_ms: int = 30000
+    replica_set: Optional[str] = None
+
+
+class Webhooks(BaseModel):
+    """Конфигурация доставки вебхуков.
+
+    Attributes:
+        workers (int): Количество фоновых обработчиков, забирающих записи из очереди вебхуков.
+        max_concurrency (int): Максимальное количество одновременных доставок вебхуков в процессе.
+        poll_interval_ms (int): Пауза между опросами пустой очереди в миллисекундах.
+        lease_ms (int): Время, на которое запись очереди закрепляется за обработчиком, в миллисекундах.
+        max_attempts (int): Максимальное количество попыток доставки.
+        retry_base_delay_ms (int): Задержка перед первой повторной попыткой в миллисекундах.
+        retry_max_delay_ms (int): Максимальная задержка между попытками в миллисекундах.
+        delivered_ttl_s (int): Время хранения доставленных записей в секундах.
+        pool_limit (int): Максимальное количество одновременно открытых соединений с подписчиками.
+        pool_limit_per_host (int): Максимальное количество соединений с одним хостом подписчика.
+        keepalive_timeout_s (float): Время жизни неиспользуемого соединения в пуле в секундах.
+        dns_cache_ttl_s (int): Время хранения результатов DNS-запросов в секундах.
+        connect_timeout_s (float): Тайм-аут установки соединения в секундах.
+        read_timeout_s (float): Тайм-аут чтения ответа подписчика в секундах.
+    """
+    workers: int = 4
+    max_concurrency: int = 64
+    poll_interval_ms: int = 500
+    lease_ms: int = 30000
+    max_attempts: int = 8
+    retry_base_delay_ms: int = 1000
+    retry_max_delay_ms: int = 600000
+    delivered_ttl_s: int = 86400
+    pool_limit: int = 100
+    pool_limit_per_host: int = 10
+    keepalive_timeout_s: float = 30
+    dns_cache_ttl_s: int = 300
+    connect_timeout_s: float = 5
+    read_timeout_s: float = 10
+
+
+class Search(BaseModel):
+    """Конфигурация поиска сообщений.
+
+    Attributes:
+        stream_batch_size (int): Количество документов в одной порции курсора при потоковом поиске.
+        cache_enabled (bool): Кэшировать результаты поиска до записи в темы запроса.
+        cache_max_entries (int): Максимальное количество результатов в кэше.
+        cache_max_bytes (int): Максимальный объем результатов в кэше в байтах.
+        cache_max_age_s (float): Максимальный возраст результата в кэше в секундах. Ограничивает время, в течение
+            которого в кэше остаются сообщения, удаленные MongoDB по сроку хранения темы.
+    """
+    stream_batch_size: int = 500
+    cache_enabled: bool = True
+    cache_max_entries: int = 1000
+    cache_max_bytes: int = 67108864
+    cache_max_age_s: float = 60
+
+
+class Ingest(BaseModel):
+    """Конфигурация потоковой загрузки сообщений.
+
+    Attributes:
+        chunk_size (int): Количество сообщений в одной порции записи в базу данных.
+        max_line_bytes (int): Максимальная длина строки потока в байтах.
+        max_errors (int): Максимальное количество ошибок строк в ответе.
+    """
+    chunk_size: int = 1000
+    max_line_bytes: int = 1048576
+    max_errors: int = 1000
+
+
+class WriteBuffer(BaseModel):
+    """Конфигурация групповой записи отдельных сообщений.
+
+    Attributes:
+        enabled (bool): Объединять одновременные запросы /messages/send в одну запись.
+        max_batch_size (int): Максимальное количество сообщений в одной записи.
+        max_delay_ms (float): Максимальное время ожидания заполнения порции в миллисекундах.
+    """
+    enabled: bool = False
+    max_batch_size: int = 500
+    max_delay_ms: float = 5
+
+
+class Indexes(BaseModel):
+    """Конфигурация управления индексами.
+
+    Attributes:
+        reconcile_on_startup (bool): Создавать недостающие индексы при запуске сервиса.
+        drop_changed (bool): Пересоздавать индексы, параметры которых отличаются от объявленных.
+    """
+    reconcile_on_startup: bool = True
+    drop_changed: bool = False
+
+
+class Idempotency(BaseModel):
+    """Конфигурация отбрасывания повторной отправки сообщений.
+
+    Attributes:
+        key_ttl_s (int): Время хранения ключей идемпотентности в секундах. Должно быть не меньше
+            времени, в течение которого партнеры повторяют отправку сообщения.
+    """
+    key_ttl_s: int = 86400
+
+
+class TopicsCache(BaseModel):
+    """Конфигурация кэша ответов сервиса тем.
+
+    Attributes:
+        ttl_s (float): Время жизни записи в секундах.
+        negative_ttl_s (float): Время жизни отказа в доступе и пустых ответов в секундах.
+        max_size (int): Максимальное количество записей.
+    """
+    ttl_s: float = 30
+    negative_ttl_s: float = 5
+    max_size: int = 10000
+
+
+class QueryGuardConfig(BaseModel):
+    """Конфигурация проверки поисковых запросов.
+
+    Attributes:
+        mode (str): Обработка дорогих запросов: 'limit' - выполнять с ограниченной параллельностью,
+            'reject' - отклонять.
+        expensive_concurrency (int): Количество одновременно выполняющихся дорогих запросов в процессе.
+        max_depth (int): Максимальная вложенность условий.
+        max_elem_match_depth (int): Максимальная вложенность $elemMatch.
+        max_list_size (int): Максимальный размер списка значений в $in, $nin и $all.
+    """
+    mode: Literal['limit', 'reject'] = 'limit'
+    expensive_concurrency: int = 2
+    max_depth: int = 6
+    max_elem_match_depth: int = 2
+    max_list_size: int = 1000
+
+
+class TimeBudget(BaseModel):
+    """Время выполнения поисковых запросов на сервере MongoDB.
+
+    Attributes:
+        search_ms (int): Время выполнения запроса /messages/search в миллисекундах.
+        stream_ms (int): Суммарное время чтения курсора запроса /messages/search/stream в миллисекундах.
+    """
+    search_ms: int = 5000
+    stream_ms: int = 60000
+
+
+class TimeBudgets(TimeBudget):
+    """Конфигурация времени выполнения поисковых запросов.
+
+    Клиент может уменьшить время выполнения своего запроса, но не увеличить его.
+
+    Attributes:
+        partners (Dict[int, TimeBudget]): Время выполнения запросов отдельных партнеров
+            вместо общего по идентификатору партнера. Незаданные поля берутся из общих значений.
+    """
+    partners: Dict[int, TimeBudget] = {}
+
+
+class Retention(BaseModel):
+    """Конфигурация хранения сообщений.
+
+    Срок хранения темы задается в сервисе тем и применяется к сообщениям при записи.
+
+    Attributes:
+        default_days (Optional[int]): Срок хранения сообщений тем без собственного срока в днях.
+            None - хранить бессрочно.
+        layout (Literal['single', 'monthly']): Раскладка сообщений: одна коллекция 'messages'
+            или коллекции 'messages_ГГГГ_ММ' по месяцу создания.
+        keep_months (Optional[int]): Количество хранимых месячных коллекций, включая текущую.
+            None - не удалять коллекции.
+        sweep_interval_s (float): Интервал создания коллекции следующего месяца и удаления устаревших коллекций
+            в секундах.
+    """
+    default_days: Optional[int] = None
+    layout: Literal['single', 'monthly'] = 'single'
+    keep_months: Optional[int] = None
+    sweep_interval_s: float = 3600
+
+
+class Stats(BaseModel):
+    """Конфигурация статистики сообщений.
+
+    Attributes:
+        max_buckets (int): Максимальное количество интервалов в периоде одного запроса /messages/stats.
+    """
+    max_buckets: int = 2000
+
+
+class Stream(BaseModel):
+    """Конфигурация потока новых сообщений.
+
+    Attributes:
+        queue_size (int): Количество событий, ожидающих отправки одному клиенту. Клиент, отставший
+            больше, отключается и переподключается с токеном продолжения.
+        replay_size (int): Количество последних событий, хранимых для продолжения после переподключения.
+        heartbeat_s (float): Интервал отправки пустых событий для поддержания соединения в секундах.
+        retry_delay_s (float): Задержка перед повторным открытием потока изменений после ошибки в секундах.
+        max_resumed (int): Наибольшее количество собственных потоков изменений для клиентов, продолжающих
+            чтение с событий старше replay_size. Остальные клиенты получают ошибку 'resume_failed'.
+    """
+    queue_size: int = 1000
+    replay_size: int = 10000
+    heartbeat_s: float = 15
+    retry_delay_s: float = 1
+    max_resumed: int = 100
 
 
 class ServiceConfig(BaseModel):
@@ -61,10 +281,34 @@ class ServiceConfig(BaseModel):
         server (Server): Конфигурация сервера.
         database (Database): Конфигурация базы данных.
         logger (LoggerConfig): Конфигурация логирования.
+        webhooks (Webhooks): Конфигурация доставки вебхуков.
+        search (Search): Конфигурация поиска сообщений.
+        ingest (Ingest): Конфигурация потоковой загрузки сообщений.
+        write_buffer (WriteBuffer): Конфигурация групповой записи отдельных сообщений.
+        indexes (Indexes): Конфигурация управления индексами.
+        idempotency (Idempotency): Конфигурация отбрасывания повторной отправки сообщений.
+        topics_cache (TopicsCache): Конфигурация кэша ответов сервиса тем.
+        query_guard (QueryGuardConfig): Конфигурация проверки поисковых запросов.
+        time_budgets (TimeBudgets): Конфигурация времени выполнения поисковых запросов.
+        retention (Retention): Конфигурация хранения сообщений.
+        stats (Stats): Конфигурация статистики сообщений.
+        stream (Stream): Конфигурация потока новых сообщений.
     """
     server: Server
     database: Database
     logger: LoggerConfig
+    webhooks: Webhooks = Webhooks()
+    search: Search = Search()
+    ingest: Ingest = Ingest()
+    write_buffer: WriteBuffer = WriteBuffer()
+    indexes: Indexes = Indexes()
+    idempotency: Idempotency = Idempotency()
+    topics_cache: TopicsCache = TopicsCache()
+    query_guard: QueryGuardConfig = QueryGuardConfig()
+    time_budgets: TimeBudgets = TimeBudgets()
+    retention: Retention = Retention()
+    stats: Stats = Stats()
+    stream: Stream = Stream()
 
 
 def get_config_path() -> str:
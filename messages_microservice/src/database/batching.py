@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import WriteError
+
+from anika_metrics import metrics
+
+# Функция записи порции: принимает элементы и возвращает результат для каждого элемента
+# (None для незаписанных) и ошибки по индексу элемента в порции
+BatchWriter = Callable[[List[Any]], Awaitable[Tuple[List[Optional[Any]], Dict[int, str]]]]
+
+
+class GroupCommitBuffer:
+    """Объединяет одновременные записи в одну групповую запись.
+
+    Элементы копятся в буфере до заполнения порции или истечения задержки с момента появления
+    первого элемента, после чего записываются одним вызовом. Каждый вызывающий ожидает только
+    результат своего элемента: ошибка записи одного элемента не затрагивает остальные.
+
+    Атрибуты:
+        _name (str): Имя буфера в метриках.
+        _write (BatchWriter): Функция записи порции.
+        _max_batch_size (int): Максимальное количество элементов в порции.
+        _max_delay (float): Максимальное время ожидания заполнения порции в секундах.
+        _pending (List[Tuple[Any, asyncio.Future]]): Элементы, ожидающие записи, и их результаты.
+        _timer (Optional[asyncio.TimerHandle]): Отложенная запись неполной порции.
+        _first_added (float): Момент появления первого элемента накапливаемой порции по time.perf_counter().
+        _flushes (Set[asyncio.Task]): Выполняющиеся записи порций.
+    """
+
+    def __init__(self, name: str, write: BatchWriter, max_batch_size: int = 500, max_delay_ms: float = 5):
+        """Инициализирует экземпляр GroupCommitBuffer.
+
+        Args:
+            name (str): Имя буфера в метриках.
+            write (BatchWriter): Функция записи порции.
+            max_batch_size (int, optional): Максимальное количество элементов в порции. По умолчанию 500.
+            max_delay_ms (float, optional): Максимальное время ожидания заполнения порции в миллисекундах.
+                По умолчанию 5.
+        """
+        self._name = name
+        self._write = write
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay_ms / 1000
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._first_added = 0.0
+        self._flushes: Set[asyncio.Task] = set()
+        self._batch_size = metrics.histogram('write_buffer_batch_size', 'Количество элементов в групповой записи',
+                                             labels=('buffer',),
+                                             buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)).labels(buffer=name)
+        self._flush_time = metrics.histogram('write_buffer_flush_seconds', 'Время выполнения групповой записи',
+                                             labels=('buffer',)).labels(buffer=name)
+        self._wait_time = metrics.histogram('write_buffer_wait_seconds',
+                                            'Время от появления первого элемента порции до начала ее записи',
+                                            labels=('buffer',)).labels(buffer=name)
+
+    async def submit(self, item: Any) -> Any:
+        """Добавляет элемент в буфер и ожидает его записи.
+
+        Args:
+            item (Any): Элемент для записи.
+
+        Returns:
+            Any: Результат записи элемента.
+
+        Raises:
+            WriteError: Исключение, если элемент не был записан.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self._pending:
+            self._first_added = time.perf_counter()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self._max_delay, self._flush)
+
+        return await future
+
+    async def close(self) -> None:
+        """Записывает оставшиеся элементы и дожидается завершения всех записей."""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        """Запускает запись накопленных элементов отдельной задачей."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            started = time.perf_counter()
+            self._wait_time.observe(started - self._first_added)
+            task = asyncio.create_task(self._write_batch(batch, started))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write_batch(self, batch: List[Tuple[Any, asyncio.Future]], started: float) -> None:
+        """Записывает порцию элементов и передает результаты ожидающим.
+
+        Args:
+            batch (List[Tuple[Any, asyncio.Future]]): Элементы порции и их результаты.
+            started (float): Момент начала записи по time.perf_counter().
+        """
+        self._batch_size.observe(len(batch))
+        try:
+            results, errors = await self._write([item for item, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self._flush_time.observe(time.perf_counter() - started)
+
+        for index, (_, future) in enumerate(batch):
+            # Вызывающий мог отменить ожидание, элемент при этом все равно записан
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(WriteError(errors[index]))
+            else:
+                future.set_result(results[index])
@@ -0,0 +1,191 @@
+import logging
+from typing import List, Tuple, Dict, Any, Mapping, Sequence, Optional
+
+from pydantic import BaseModel, Field
+from anika_metrics import metrics
+
+from src.database.repository import MongoDBRepository
+
+logger = logging.getLogger(__name__)
+
+# Параметры индекса, которые учитываются при сравнении объявленного и существующего индекса
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+class IndexSpec(BaseModel):
+    """Объявление индекса коллекции.
+
+    Атрибуты:
+        name (str): Имя индекса.
+        keys (List[Tuple[str, int]]): Поля индекса и направление сортировки.
+        options (Dict[str, Any]): Дополнительные параметры индекса (unique, sparse, expireAfterSeconds и т.д.).
+        replaces (List[str]): Имена прежних индексов сервиса, которые заменяет этот индекс.
+    """
+    name: str
+    keys: List[Tuple[str, int]]
+    options: Dict[str, Any] = Field(default_factory=dict)
+    replaces: List[str] = Field(default_factory=list)
+
+    def matches(self, info: Mapping[str, Any]) -> bool:
+        """Проверяет, совпадает ли существующий индекс с объявлением.
+
+        Args:
+            info (Mapping[str, Any]): Описание индекса из index_information().
+
+        Returns:
+            bool: True, если поля и учитываемые параметры индекса совпадают.
+        """
+        keys = [(field, int(direction)) for field, direction in info['key']]
+        if keys != self.keys:
+            return False
+        return all(self.options.get(option) == info.get(option) for option in COMPARED_OPTIONS)
+
+
+class IndexDrift(BaseModel):
+    """Расхождение между объявленными и существующими индексами коллекции.
+
+    Атрибуты:
+        collection (str): Название коллекции.
+        missing (List[str]): Объявленные индексы, которых нет в базе данных.
+        changed (List[str]): Индексы, существующие с другими полями или параметрами.
+        extra (List[str]): Существующие индексы, которые не объявлены.
+        replaced (List[str]): Существующие прежние индексы сервиса, замененные объявленными.
+    """
+    collection: str
+    missing: List[str] = Field(default_factory=list)
+    changed: List[str] = Field(default_factory=list)
+    extra: List[str] = Field(default_factory=list)
+    replaced: List[str] = Field(default_factory=list)
+
+    @property
+    def has_drift(self) -> bool:
+        """Возвращает True, если есть хотя бы одно расхождение."""
+        return bool(self.missing or self.changed or self.extra or self.replaced)
+
+
+class IndexManager:
+    """Приводит индексы коллекций в соответствие с объявлениями.
+
+    Недостающие индексы создаются, индексы с изменившимися параметрами пересоздаются только
+    при включенном drop_changed. Прежние индексы сервиса, перечисленные в replaces объявлений,
+    удаляются после построения заменяющего индекса. Остальные необъявленные индексы никогда
+    не удаляются, о них только сообщается.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+        _declarations (Mapping[str, Sequence[IndexSpec]]): Объявленные индексы по названию коллекции.
+        _patterns (Mapping[str, Sequence[IndexSpec]]): Объявленные индексы всех существующих коллекций,
+            названия которых соответствуют регулярному выражению.
+        _drop_changed (bool): Пересоздавать индексы, параметры которых отличаются от объявления.
+    """
+
+    def __init__(self, repository: MongoDBRepository, declarations: Mapping[str, Sequence[IndexSpec]],
+                 patterns: Optional[Mapping[str, Sequence[IndexSpec]]] = None, drop_changed: bool = False):
+        """Инициализирует экземпляр IndexManager.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+            declarations (Mapping[str, Sequence[IndexSpec]]): Объявленные индексы по названию коллекции.
+            patterns (Optional[Mapping[str, Sequence[IndexSpec]]], optional): Объявленные индексы
+                по регулярному выражению для названия коллекции. По умолчанию нет.
+            drop_changed (bool, optional): Пересоздавать индексы с изменившимися параметрами. По умолчанию False.
+        """
+        self._repository = repository
+        self._declarations = declarations
+        self._patterns = patterns or {}
+        self._drop_changed = drop_changed
+        self._drift = metrics.gauge('mongodb_index_drift', 'Расхождения объявленных и существующих индексов MongoDB',
+                                    labels=('collection', 'kind'))
+
+    async def declarations(self) -> Dict[str, Sequence[IndexSpec]]:
+        """Возвращает объявленные индексы по названию коллекции, включая существующие коллекции по шаблонам.
+
+        Returns:
+            Dict[str, Sequence[IndexSpec]]: Объявленные индексы по названию коллекции.
+        """
+        declarations = dict(self._declarations)
+        for pattern, specs in self._patterns.items():
+            for collection in sorted(await self._repository.list_collections(pattern)):
+                declarations.setdefault(collection, specs)
+        return declarations
+
+    async def check(self) -> List[IndexDrift]:
+        """Сравнивает объявленные индексы с существующими.
+
+        Returns:
+            List[IndexDrift]: Расхождения по каждой коллекции.
+        """
+        return await self._check(await self.declarations())
+
+    async def _check(self, declarations: Mapping[str, Sequence[IndexSpec]]) -> List[IndexDrift]:
+        """Сравнивает указанные объявления индексов с существующими индексами.
+
+        Args:
+            declarations (Mapping[str, Sequence[IndexSpec]]): Объявленные индексы по названию коллекции.
+
+        Returns:
+            List[IndexDrift]: Расхождения по каждой коллекции.
+        """
+        report = []
+        for collection, specs in declarations.items():
+            existing = await self._repository.list_indexes(collection)
+            drift = IndexDrift(collection=collection)
+            for spec in specs:
+                if spec.name not in existing:
+                    drift.missing.append(spec.name)
+                elif not spec.matches(existing[spec.name]):
+                    drift.changed.append(spec.name)
+
+            declared = {spec.name for spec in specs}
+            replaced = {name for spec in specs for name in spec.replaces}
+            drift.replaced = [name for name in existing if name in replaced and name not in declared]
+            drift.extra = [name for name in existing
+                           if name != '_id_' and name not in declared and name not in replaced]
+
+            for kind in ('missing', 'changed', 'extra', 'replaced'):
+                self._drift.labels(collection=collection, kind=kind).set(len(getattr(drift, kind)))
+            report.append(drift)
+
+        return report
+
+    async def reconcile(self) -> List[IndexDrift]:
+        """Создает недостающие индексы, удаляет замененные и сообщает об оставшихся расхождениях.
+
+        Индексы строятся без блокировки коллекции, поэтому сервис продолжает обслуживать запросы
+        во время построения. Замененный индекс удаляется только после построения заменяющего,
+        поэтому запросы не остаются без подходящего индекса.
+
+        Returns:
+            List[IndexDrift]: Расхождения, оставшиеся после приведения индексов.
+        """
+        declarations = await self.declarations()
+        for drift in await self._check(declarations):
+            specs = {spec.name: spec for spec in declarations[drift.collection]}
+            to_create = list(drift.missing)
+            if self._drop_changed:
+                for name in drift.changed:
+                    await self._repository.drop_index(drift.collection, name)
+                to_create += drift.changed
+
+            for name in to_create:
+                spec = specs[name]
+                logger.info('Creating index %s on %s', name, drift.collection)
+                await self._repository.create_index(drift.collection, spec.keys, name=name, background=True,
+                                                    **spec.options)
+
+            if drift.replaced:
+                existing = await self._repository.list_indexes(drift.collection)
+                for spec in specs.values():
+                    if spec.name not in existing or not spec.matches(existing[spec.name]):
+                        continue
+                    for name in spec.replaces:
+                        if name in drift.replaced:
+                            logger.info('Dropping index %s on %s replaced by %s', name, drift.collection, spec.name)
+                            await self._repository.drop_index(drift.collection, name)
+
+        report = await self._check(declarations)
+        for drift in report:
+            if drift.has_drift:
+                logger.warning('Index drift on %s: changed=%s extra=%s missing=%s replaced=%s',
+                               drift.collection, drift.changed, drift.extra, drift.missing, drift.replaced)
+        return report
@@ -1,45 +1,609 @@
-from datetime import datetime
-from typing import List, Dict, Any
-from pymongo.errors import ExecutionTimeout
-from src.database.models import Message
+from collections import Counter
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Mapping, Sequence, AsyncIterator, Tuple, Iterable, Set
+from bson import ObjectId
+from pymongo import ASCENDING, InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout, WriteError
+from anika_metrics import metrics
+from src.database.batching import GroupCommitBuffer
+from src.database.indexes import IndexSpec
+from src.database.models import Message, OutboxStatus, Subscription
 from src.database.repository import MongoDBRepository
+from src.database.storage import MessageStorage
 from src.schemas.exceptions import TimeOutException
+from src.utils.encoding import encode_body
+
+# Поля, по которым повторная отправка сообщения с ключом идемпотентности считается дубликатом
+IDEMPOTENCY_FIELDS = ('topic_id', 'unique_id', 'idempotency_key')
+# Код ошибки MongoDB при нарушении уникального индекса
+DUPLICATE_KEY_ERROR = 11000
+
+
+class _PartialWrite(Exception):
+    """Отменяет транзакцию записи сообщений, если часть сообщений не записалась."""
+
+
+class OutboxManager:
+    """Класс для управления очередью исходящих вебхуков в коллекции 'webhooks_outbox'.
+
+    Каждая запись соответствует доставке одного сообщения на один URL подписчика. У записей подписок
+    с пакетной доставкой срок доставки есть только у ведущей записи URL: через batch_max_delay_ms
+    (или сразу после заполнения пакета) она забирает в свой пакет остальные ожидающие записи.
+
+    Ведущая запись отмечается полем leader. Частичный уникальный индекс по (url, leader) допускает
+    не больше одной ведущей записи на URL, в том числе пока ее пакет доставляется или повторяется,
+    поэтому одновременные записи не назначают двух ведущих. Записи, поступившие во время доставки
+    пакета, в него не попадают: они ждут, пока пакет будет доставлен или отброшен, и после этого
+    образуют следующий пакет.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+    """
+
+    collection = 'webhooks_outbox'
+
+    def __init__(self, repository: MongoDBRepository):
+        """Инициализирует экземпляр OutboxManager с указанным репозиторием.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+        """
+        self._repository = repository
+
+    async def ensure_indexes(self, delivered_ttl_s: int) -> None:
+        """Создает индексы, необходимые для выборки записей и очистки доставленных.
+
+        Args:
+            delivered_ttl_s (int): Время хранения доставленных записей в секундах.
+        """
+        await self._repository.create_index(self.collection, [('status', ASCENDING), ('due_date', ASCENDING)])
+        await self._repository.create_index(self.collection, [('url', ASCENDING), ('status', ASCENDING),
+                                                              ('due_date', ASCENDING)])
+        await self._repository.create_index(self.collection, [('batch_id', ASCENDING)], sparse=True)
+        await self._repository.create_index(self.collection, [('url', ASCENDING), ('leader', ASCENDING)],
+                                            unique=True, partialFilterExpression={'leader': True})
+        await self._repository.create_index(self.collection, [('delivered_date', ASCENDING)],
+                                            expireAfterSeconds=delivered_ttl_s)
+
+    async def enqueue(self, messages: Sequence[Message], message_ids: Sequence[str],
+                      subscriptions: Sequence[Sequence[Subscription]], session: Optional[Any] = None) -> int:
+        """Добавляет в очередь доставку каждого сообщения по каждой из подписок на его тему.
+
+        Записи пакетных подписок добавляются без срока доставки. Ведущая запись назначается после записи
+        вызовом schedule_batches: в транзакции нарушение уникального индекса ведущих записей отменило бы
+        запись сообщений.
+
+        Args:
+            messages (Sequence[Message]): Сохраненные сообщения.
+            message_ids (Sequence[str]): Идентификаторы сохраненных сообщений.
+            subscriptions (Sequence[Sequence[Subscription]]): Подписки на тему каждого сообщения.
+            session (Optional[Any], optional): Сессия транзакции, в которой записываются сообщения.
+                По умолчанию без транзакции.
+
+        Returns:
+            int: Количество добавленных записей.
+        """
+        now = datetime.now()
+        documents = []
+        for message, message_id, message_subscriptions in zip(messages, message_ids, subscriptions):
+            if not message_subscriptions:
+                continue
+
+            # Сообщение сериализуется один раз: тело используется для всех подписок, повторов и пакетов
+            body = encode_body(message.dict())
+            for subscription in message_subscriptions:
+                document = {
+                    'message_id': message_id,
+                    'topic_id': message.topic_id,
+                    'url': subscription.url,
+                    'body': body,
+                    'status': OutboxStatus.pending.value,
+                    'attempts': 0,
+                    'due_date': now,
+                    'created_date': now,
+                    'last_error': None,
+                    'batch': None
+                }
+                if subscription.batch_mode:
+                    # Срок доставки есть только у ведущей записи, остальные ждут попадания в ее пакет
+                    document['due_date'] = None
+                    document['batch'] = {'max_items': subscription.batch_max_items,
+                                         'max_bytes': subscription.batch_max_bytes,
+                                         'max_delay_ms': subscription.batch_max_delay_ms}
+                    document['size'] = len(body)
+                documents.append(document)
+
+        if documents:
+            await self._repository.create_all(self.collection, documents, session=session)
+        return len(documents)
+
+    async def schedule_batches(self, subscriptions: Iterable[Subscription]) -> None:
+        """Назначает ведущие записи пакетов и делает готовыми к отправке заполненные пакеты.
+
+        Args:
+            subscriptions (Iterable[Subscription]): Подписки, по которым добавлены записи.
+        """
+        for subscription in {subscription.url: subscription for subscription in subscriptions
+                             if subscription.batch_mode}.values():
+            await self.promote_leader(subscription.url)
+            await self._flush_full_batch(subscription)
+
+    async def _flush_full_batch(self, subscription: Subscription) -> None:
+        """Делает пакет готовым к отправке, не дожидаясь batch_max_delay_ms, если он уже заполнен.
+
+        Args:
+            subscription (Subscription): Подписка с пакетной доставкой.
+        """
+        query = {'url': subscription.url, 'status': OutboxStatus.pending.value, 'batch': {'$ne': None}}
+        if await self._repository.count(self.collection, query) >= subscription.batch_max_items:
+            await self._repository.update_all(self.collection,
+                                              {'url': subscription.url, 'leader': True,
+                                               'status': OutboxStatus.pending.value},
+                                              {'due_date': datetime.now()})
+
+    async def promote_leader(self, url: str) -> None:
+        """Назначает ведущей самую раннюю ожидающую запись пакетной подписки, если ведущей записи нет.
+
+        Вызывается после записи сообщений и после завершения обработки пакета, чтобы записи,
+        поступившие во время его доставки, образовали следующий пакет. Если ведущая запись уже
+        есть, уникальный индекс отклоняет назначение второй.
+
+        Args:
+            url (str): URL подписчика.
+        """
+        followers = await self._repository.find_all(
+            self.collection,
+            {'url': url, 'status': OutboxStatus.pending.value, 'batch': {'$ne': None}, 'due_date': None},
+            sort=[('created_date', ASCENDING)],
+            limit=1
+        )
+        if followers:
+            follower = followers[0]
+            due_date = follower['created_date'] + timedelta(milliseconds=follower['batch']['max_delay_ms'])
+            with suppress(DuplicateKeyError):
+                await self._repository.update(self.collection, {'_id': follower['_id'], 'due_date': None},
+                                              {'leader': True, 'due_date': max(due_date, datetime.now())})
+
+    async def promote_orphaned_leaders(self) -> None:
+        """Назначает ведущие записи пакетам, у которых их нет.
+
+        Ведущая запись назначается после записи сообщений, поэтому при остановке процесса между
+        ними ожидающие записи URL остаются без ведущей до следующего сообщения. Вызывается при запуске.
+        """
+        urls = await self._repository.aggregate(self.collection, [
+            {'$match': {'status': OutboxStatus.pending.value, 'batch': {'$ne': None}, 'due_date': None}},
+            {'$group': {'_id': '$url'}}
+        ])
+        for url in urls:
+            await self.promote_leader(url['_id'])
+
+    async def claim(self, lease: timedelta) -> Optional[Mapping[str, Any]]:
+        """Забирает в обработку самую раннюю из готовых к отправке записей.
+
+        Запись остается в состоянии 'processing' на время аренды. Если обработчик не завершит
+        доставку за это время (например, процесс упал), запись снова станет доступной.
+
+        Args:
+            lease (timedelta): Время аренды записи.
+
+        Returns:
+            Optional[Mapping[str, Any]]: Запись очереди или None, если готовых записей нет.
+        """
+        now = datetime.now()
+        return await self._repository.find_one_and_update(
+            self.collection,
+            {
+                'status': {'$in': [OutboxStatus.pending.value, OutboxStatus.processing.value]},
+                'due_date': {'$lte': now}
+            },
+            {'$set': {'status': OutboxStatus.processing.value, 'due_date': now + lease}},
+            sort=[('due_date', ASCENDING)]
+        )
+
+    async def collect_batch(self, leader: Mapping[str, Any]) -> List[Mapping[str, Any]]:
+        """Возвращает записи, доставляемые в одном пакете с ведущей записью.
+
+        При первой попытке в пакет забираются ожидающие записи для того же URL в пределах
+        лимитов пакета. При повторных попытках пакет не меняется, поэтому подписчик получает
+        тот же набор сообщений с тем же идентификатором пакета.
+
+        Args:
+            leader (Mapping[str, Any]): Ведущая запись пакета, забранная в обработку.
+
+        Returns:
+            List[Mapping[str, Any]]: Записи пакета без ведущей записи.
+        """
+        batch_id = leader['_id']
+        if leader['attempts'] == 0:
+            candidates = await self._repository.find_all(
+                self.collection,
+                {
+                    'url': leader['url'],
+                    'status': OutboxStatus.pending.value,
+                    'batch': {'$ne': None},
+                    '_id': {'$ne': batch_id}
+                },
+                sort=[('created_date', ASCENDING)],
+                limit=max(leader['batch']['max_items'] - 1, 1),
+                projection={'size': True}
+            )
+            entry_ids, size = [], leader['size']
+            for candidate in candidates[:leader['batch']['max_items'] - 1]:
+                size += candidate['size']
+                if size > leader['batch']['max_bytes']:
+                    break
+                entry_ids.append(candidate['_id'])
+
+            if entry_ids:
+                # Записи, которые успел забрать другой обработчик, не попадут под условие по статусу
+                await self._repository.update_all(
+                    self.collection,
+                    {'_id': {'$in': entry_ids}, 'status': OutboxStatus.pending.value},
+                    {'status': OutboxStatus.batched.value, 'batch_id': batch_id}
+                )
+
+        return await self._repository.find_all(self.collection,
+                                               {'batch_id': batch_id, 'status': OutboxStatus.batched.value},
+                                               sort=[('created_date', ASCENDING)])
+
+    async def mark_delivered(self, entry_ids: Sequence[ObjectId]) -> None:
+        """Отмечает записи как доставленные.
+
+        Ведущая запись пакета перестает быть ведущей.
+
+        Args:
+            entry_ids (Sequence[ObjectId]): Идентификаторы записей.
+        """
+        await self._repository.update_all(self.collection, {'_id': {'$in': list(entry_ids)}},
+                                          {'status': OutboxStatus.delivered.value, 'delivered_date': datetime.now(),
+                                           'leader': False})
+
+    async def reschedule(self, entry_id: ObjectId, attempts: int, delay: timedelta, error: str) -> None:
+        """Откладывает повторную попытку доставки записи.
+
+        Записи пакета остаются в состоянии 'batched' и повторяются вместе с ведущей записью.
+
+        Args:
+            entry_id (ObjectId): Идентификатор записи.
+            attempts (int): Количество выполненных попыток.
+            delay (timedelta): Задержка до следующей попытки.
+            error (str): Описание последней ошибки.
+        """
+        await self._repository.update(self.collection, {'_id': entry_id}, {
+            'status': OutboxStatus.pending.value,
+            'attempts': attempts,
+            'due_date': datetime.now() + delay,
+            'last_error': error
+        })
+
+    async def mark_dead(self, entry_ids: Sequence[ObjectId], attempts: int, error: str) -> None:
+        """Переводит записи в состояние 'dead' после исчерпания попыток доставки.
+
+        Ведущая запись пакета перестает быть ведущей.
+
+        Args:
+            entry_ids (Sequence[ObjectId]): Идентификаторы записей.
+            attempts (int): Количество выполненных попыток.
+            error (str): Описание последней ошибки.
+        """
+        await self._repository.update_all(self.collection, {'_id': {'$in': list(entry_ids)}}, {
+            'status': OutboxStatus.dead.value,
+            'attempts': attempts,
+            'last_error': error,
+            'leader': False
+        })
+
+
+class TopicVersionsManager:
+    """Класс для учета версий записи по темам в коллекции 'topic_versions'.
+
+    Версия темы увеличивается при каждой записи сообщений в тему. По неизменившимся версиям
+    кэши результатов поиска определяют, что их данные актуальны, в том числе при записи
+    из других процессов сервиса.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+    """
+
+    collection = 'topic_versions'
+
+    def __init__(self, repository: MongoDBRepository):
+        """Инициализирует экземпляр TopicVersionsManager с указанным репозиторием.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+        """
+        self._repository = repository
+
+    async def bump(self, topic_ids: Sequence[int]) -> None:
+        """Увеличивает версии указанных тем.
+
+        Args:
+            topic_ids (Sequence[int]): Идентификаторы тем, в которые записаны сообщения.
+        """
+        await self._repository.increment_all(self.collection, sorted(set(topic_ids)), 'version')
+
+    async def get(self, topic_ids: Sequence[int]) -> Dict[int, int]:
+        """Возвращает текущие версии указанных тем.
+
+        Args:
+            topic_ids (Sequence[int]): Идентификаторы тем.
+
+        Returns:
+            Dict[int, int]: Версии по идентификатору темы, для тем без записей версия равна 0.
+        """
+        documents = await self._repository.find_all(self.collection, {'_id': {'$in': list(topic_ids)}})
+        versions = {document['_id']: document['version'] for document in documents}
+        return {topic_id: versions.get(topic_id, 0) for topic_id in topic_ids}
+
+
+class MessageStatsManager:
+    """Класс для учета количества сообщений по темам и интервалам времени в коллекции 'message_stats'.
+
+    Счетчики увеличиваются при записи сообщений, поэтому статистика читается без обращения
+    к самим сообщениям. Каждое сообщение учитывается во всех интервалах GRANULARITIES по дате
+    создания. Сообщения, сохраненные до появления статистики, в ней не учитываются.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+        indexes (List[IndexSpec]): Индексы коллекции 'message_stats'.
+    """
+
+    collection = 'message_stats'
+    # Длительность интервала по названию
+    GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+    indexes = [
+        IndexSpec(name='topic_id_1_granularity_1_start_1',
+                  keys=[('topic_id', ASCENDING), ('granularity', ASCENDING), ('start', ASCENDING)],
+                  options={'unique': True}),
+    ]
+
+    def __init__(self, repository: MongoDBRepository):
+        """Инициализирует экземпляр MessageStatsManager с указанным репозиторием.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+        """
+        self._repository = repository
+
+    @staticmethod
+    def bucket_start(created_date: datetime, granularity: str) -> datetime:
+        """Возвращает начало интервала, в который попадает указанная дата.
+
+        Args:
+            created_date (datetime): Дата создания сообщения.
+            granularity (str): Название интервала из GRANULARITIES.
+
+        Returns:
+            datetime: Начало интервала.
+        """
+        start = created_date.replace(minute=0, second=0, microsecond=0)
+        if granularity == 'day':
+            start = start.replace(hour=0)
+        return start
+
+    async def record(self, messages: Sequence[Message]) -> None:
+        """Учитывает записанные сообщения в счетчиках их тем и интервалов.
+
+        Args:
+            messages (Sequence[Message]): Записанные сообщения.
+        """
+        counts = Counter((message.topic_id, granularity, self.bucket_start(message.created_date, granularity))
+                         for message in messages for granularity in self.GRANULARITIES)
+        operations = [UpdateOne({'topic_id': topic_id, 'granularity': granularity, 'start': start},
+                                {'$inc': {'count': count}}, upsert=True)
+                      for (topic_id, granularity, start), count in counts.items()]
+
+        _, errors = await self._repository.bulk_write_unordered(self.collection, operations)
+        # Одновременное создание счетчика другим процессом завершается ошибкой уникального индекса:
+        # повторное увеличение найдет уже созданный счетчик
+        retry = [operations[index] for index, (code, _) in errors.items() if code == DUPLICATE_KEY_ERROR]
+        if retry:
+            await self._repository.bulk_write_unordered(self.collection, retry)
+
+    async def get(self, topic_ids: Sequence[int], granularity: str, start: datetime,
+                  end: datetime) -> List[Mapping[str, Any]]:
+        """Возвращает счетчики указанных тем за период.
+
+        Args:
+            topic_ids (Sequence[int]): Идентификаторы тем.
+            granularity (str): Название интервала из GRANULARITIES.
+            start (datetime): Начало периода; интервал, в который оно попадает, включается целиком.
+            end (datetime): Конец периода, не включая.
+
+        Returns:
+            List[Mapping[str, Any]]: Счетчики с полями topic_id, start и count по возрастанию темы
+                и начала интервала. Интервалы без сообщений не возвращаются.
+        """
+        query = {'topic_id': {'$in': list(topic_ids)}, 'granularity': granularity,
+                 'start': {'$gte': self.bucket_start(start, granularity), '$lt': end}}
+        return await self._repository.find_all(self.collection, query,
+                                               sort=[('topic_id', ASCENDING), ('start', ASCENDING)],
+                                               projection={'_id': 0, 'topic_id': 1, 'start': 1, 'count': 1})
+
+
+class IdempotencyKeysManager:
+    """Класс для учета ключей идемпотентности сообщений в коллекции 'idempotency_keys'.
+
+    Коллекция не делится по месяцам, поэтому повтор находится, даже если он пришел уже в следующем
+    месяце. Ключ резервируется до записи сообщения и хранится key_ttl_s секунд: повтор, пришедший
+    позже, сохраняется как новое сообщение. Идентификатор записи ключа совпадает с идентификатором
+    сообщения.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+    """
+
+    collection = 'idempotency_keys'
+
+    def __init__(self, repository: MongoDBRepository):
+        """Инициализирует экземпляр IdempotencyKeysManager с указанным репозиторием.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+        """
+        self._repository = repository
+
+    @staticmethod
+    def indexes(key_ttl_s: int) -> List[IndexSpec]:
+        """Возвращает индексы коллекции ключей.
+
+        Args:
+            key_ttl_s (int): Время хранения ключей в секундах.
+
+        Returns:
+            List[IndexSpec]: Уникальный индекс ключа и TTL-индекс по дате резервирования.
+        """
+        return [
+            IndexSpec(name='topic_id_1_unique_id_1_idempotency_key_1',
+                      keys=[(field, ASCENDING) for field in IDEMPOTENCY_FIELDS], options={'unique': True}),
+            IndexSpec(name='created_date_1', keys=[('created_date', ASCENDING)],
+                      options={'expireAfterSeconds': key_ttl_s}),
+        ]
+
+    async def reserve(self, messages: Sequence[Message], message_ids: Sequence[ObjectId],
+                      session: Optional[Any] = None) -> Tuple[Set[int], Dict[int, Tuple[int, str]]]:
+        """Резервирует ключи идемпотентности сообщений.
+
+        Args:
+            messages (Sequence[Message]): Сообщения с ключом идемпотентности.
+            message_ids (Sequence[ObjectId]): Заранее назначенные идентификаторы сообщений.
+            session (Optional[Any], optional): Сессия транзакции. По умолчанию без транзакции.
+
+        Returns:
+            Tuple[Set[int], Dict[int, Tuple[int, str]]]: Индексы сообщений, ключи которых
+                зарезервированы этим вызовом, и ошибки (код, описание) по индексу сообщения.
+        """
+        if not messages:
+            return set(), {}
+
+        now = datetime.now()
+        operations = [UpdateOne({field: getattr(message, field) for field in IDEMPOTENCY_FIELDS},
+                                {'$setOnInsert': {'_id': message_id, 'created_date': now}},
+                                upsert=True)
+                      for message, message_id in zip(messages, message_ids)]
+        upserted, errors = await self._repository.bulk_write_unordered(self.collection, operations, session=session)
+        return {index for index, message_id in enumerate(message_ids) if message_id in upserted}, errors
+
+    async def release(self, message_ids: Sequence[ObjectId]) -> None:
+        """Освобождает ключи несохраненных сообщений, чтобы их повторная отправка была записана.
+
+        Args:
+            message_ids (Sequence[ObjectId]): Идентификаторы несохраненных сообщений.
+        """
+        await self._repository.delete_all(self.collection, {'_id': {'$in': list(message_ids)}})
+
 
 class MessagesManager:
     """Класс для управления сообщениями в базе данных MongoDB.
 
     Атрибуты:
         _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+        _outbox (OutboxManager): Очередь исходящих вебхуков.
+        _topic_versions (TopicVersionsManager): Версии записи по темам.
+        _stats (MessageStatsManager): Количество сообщений по темам и интервалам времени.
+        _idempotency_keys (IdempotencyKeysManager): Ключи идемпотентности сообщений.
+        _write_buffer (Optional[GroupCommitBuffer]): Общий для процесса буфер групповой записи сообщений.
+        _storage (MessageStorage): Раскладка сообщений по коллекциям.
+        indexes (List[IndexSpec]): Индексы коллекций сообщений.
     """
 
-    def __init__(self, repository: MongoDBRepository):
+    indexes = [
+        IndexSpec(name='topic_id_1__id_1', keys=[('topic_id', ASCENDING), ('_id', ASCENDING)]),
+        # Индексы с _id в конце заменили созданные раньше индексы без него
+        # Уникальность ключей идемпотентности перенесена в коллекцию ключей, а поиск по теме
+        # и уникальному идентификатору обслуживает этот индекс
+        IndexSpec(name='topic_id_1_unique_id_1__id_1',
+                  keys=[('topic_id', ASCENDING), ('unique_id', ASCENDING), ('_id', ASCENDING)],
+                  replaces=['topic_id_1_unique_id_1', 'topic_id_1_unique_id_1_idempotency_key_1']),
+        IndexSpec(name='topic_id_1_created_date_1__id_1',
+                  keys=[('topic_id', ASCENDING), ('created_date', ASCENDING), ('_id', ASCENDING)],
+                  replaces=['topic_id_1_created_date_1']),
+        # Сообщения тем со сроком хранения удаляются MongoDB по наступлении expire_at
+        IndexSpec(name='expire_at_1', keys=[('expire_at', ASCENDING)], options={'expireAfterSeconds': 0}),
+    ]
+
+    def __init__(self, repository: MongoDBRepository, write_buffer: Optional[GroupCommitBuffer] = None,
+                 storage: Optional[MessageStorage] = None):
         """Инициализирует экземпляр MessagesManager с указанным репозиторием.
 
         Args:
             repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+            write_buffer (Optional[GroupCommitBuffer], optional): Буфер, объединяющий одновременные
+                create_message в одну запись. По умолчанию каждое сообщение записывается отдельно.
+            storage (Optional[MessageStorage], optional): Раскладка сообщений по коллекциям.
+                По умолчанию все сообщения хранятся в коллекции 'messages'.
         """
         self._repository = repository
+        self._outbox = OutboxManager(repository)
+        self._topic_versions = TopicVersionsManager(repository)
+        self._stats = MessageStatsManager(repository)
+        self._idempotency_keys = IdempotencyKeysManager(repository)
+        self._write_buffer = write_buffer
+        self._storage = storage or MessageStorage(repository)
+        self._duplicates = metrics.counter('messages_duplicates_total',
+                                           'Повторно отправленные сообщения, отброшенные по ключу идемпотентности')
 
-    async def create_message(self, message: Message) -> str:
-        """Создает новое сообщение в коллекции 'messages'.
+    async def create_message(self, message: Message, subscriptions: Sequence[Subscription] = ()) -> Optional[str]:
+        """Создает новое сообщение в хранилище сообщений и ставит в очередь его доставку подписчикам.
+
+        Если задан буфер групповой записи, сообщение записывается вместе с сообщениями
+        одновременных запросов, а версия темы обновляется один раз для всей порции.
+        Повтор сообщения с уже сохраненным ключом идемпотентности не сохраняется и не доставляется.
 
         Args:
             message (Message): Сообщение для добавления в базу данных.
+            subscriptions (Sequence[Subscription], optional): Подписки для уведомления. По умолчанию пусто.
 
         Returns:
-            str: Идентификатор созданного сообщения.
+            Optional[str]: Идентификатор созданного сообщения или None, если сообщение является повтором.
+
+        Raises:
+            WriteError: Исключение, если сообщение не было записано.
         """
         if not message.payload.get('created_date'):
             message.payload['created_date'] = datetime.now()
-            
-        document = message.dict(by_alias=True)
-        return await self._repository.create('messages', document)
 
-    async def aggregate_messages(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self._write_buffer is not None:
+            return await self._write_buffer.submit((message, subscriptions))
+        return (await self.create_all_messages([message], subscriptions))[0]
+
+    async def get_topic_versions(self, topic_ids: Sequence[int]) -> Dict[int, int]:
+        """Возвращает текущие версии записи указанных тем.
+
+        Args:
+            topic_ids (Sequence[int]): Идентификаторы тем.
+
+        Returns:
+            Dict[int, int]: Версии по идентификатору темы.
+        """
+        return await self._topic_versions.get(topic_ids)
+
+    async def get_stats(self, topic_ids: Sequence[int], granularity: str, start: datetime,
+                        end: datetime) -> List[Mapping[str, Any]]:
+        """Возвращает количество сообщений указанных тем по интервалам времени.
+
+        Args:
+            topic_ids (Sequence[int]): Идентификаторы тем.
+            granularity (str): Название интервала: 'hour' или 'day'.
+            start (datetime): Начало периода.
+            end (datetime): Конец периода, не включая.
+
+        Returns:
+            List[Mapping[str, Any]]: Счетчики с полями topic_id, start и count.
+        """
+        return await self._stats.get(topic_ids, granularity, start, end)
+
+    async def aggregate_messages(self, pipeline: List[Dict[str, Any]],
+                                 max_time_ms: Optional[int] = None) -> List[Dict[str, Any]]:
         """Выполняет агрегацию сообщений с использованием указанного конвейера.
 
         Args:
             pipeline (List[Dict[str, Any]]): Конвейер агрегации для выполнения.
+            max_time_ms (Optional[int], optional): Время выполнения запроса на сервере в миллисекундах,
+                после которого он прерывается. По умолчанию без ограничения.
 
         Returns:
             List[Dict[str, Any]]: Результат агрегации.
@@ -47,19 +611,182 @@ class MessagesManager:
         Raises:
             TimeOutException: Исключение, если выполнение запроса превышает установленное время ожидания.
         """
+        collections = await self._storage.collections()
+        if not collections:
+            return []
+
         try:
-            return await self._repository.aggregate('messages', pipeline)
+            return await self._repository.aggregate(collections[0], MessageStorage.union_pipeline(pipeline, collections),
+                                                    max_time_ms=max_time_ms)
         except ExecutionTimeout:
             raise TimeOutException
 
-    async def create_all_messages(self, messages: List[Message]) -> List[str]:
-        """Создает несколько сообщений в коллекции 'messages'.
+    async def iterate_messages(self, pipeline: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                               max_time_ms: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Выполняет агрегацию сообщений и возвращает документы по мере чтения курсора.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации для выполнения.
+            batch_size (Optional[int], optional): Количество документов в одной порции курсора. По умолчанию None.
+            max_time_ms (Optional[int], optional): Суммарное время выполнения курсора на сервере в миллисекундах,
+                после которого он прерывается. По умолчанию без ограничения.
+
+        Yields:
+            Dict[str, Any]: Документы результата агрегации.
+
+        Raises:
+            TimeOutException: Исключение, если выполнение запроса превышает установленное время ожидания.
+        """
+        collections = await self._storage.collections()
+        if not collections:
+            return
+
+        try:
+            async for document in self._repository.aggregate_iter(collections[0],
+                                                                  MessageStorage.union_pipeline(pipeline, collections),
+                                                                  batch_size=batch_size, max_time_ms=max_time_ms):
+                yield document
+        except ExecutionTimeout:
+            raise TimeOutException
+
+    async def create_all_messages(self, messages: List[Message],
+                                  subscriptions: Sequence[Subscription] = ()) -> List[Optional[str]]:
+        """Создает несколько сообщений в хранилище сообщений и ставит в очередь их доставку подписчикам.
+
+        Args:
+            messages (List[Message]): Список сообщений для добавления в базу данных.
+            subscriptions (Sequence[Subscription], optional): Подписки для уведомления. По умолчанию пусто.
+
+        Returns:
+            List[Optional[str]]: Список идентификаторов созданных сообщений, None для повторов.
+
+        Raises:
+            WriteError: Исключение, если хотя бы одно сообщение не было записано. Остальные сообщения
+                при этом сохраняются и доставляются.
+        """
+        message_ids, errors = await self.create_messages_unordered(messages, subscriptions)
+        if errors:
+            raise WriteError(errors[min(errors)])
+        return message_ids
+
+    async def create_messages_unordered(self, messages: List[Message],
+                                        subscriptions: Sequence[Subscription] = ()) -> \
+            Tuple[List[Optional[str]], Dict[int, str]]:
+        """Создает сообщения в хранилище сообщений, сохраняя все корректные даже при ошибках в отдельных.
+
+        Повтор сообщения с уже зарезервированным ключом идемпотентности не записывается. Доставка
+        подписчикам ставится в очередь только для впервые сохраненных сообщений.
 
         Args:
             messages (List[Message]): Список сообщений для добавления в базу данных.
+            subscriptions (Sequence[Subscription], optional): Подписки для уведомления. По умолчанию пусто.
 
         Returns:
-            List[str]: Список идентификаторов созданных сообщений.
+            Tuple[List[Optional[str]], Dict[int, str]]: Идентификаторы сообщений в порядке списка
+                (None для повторов и несохраненных) и ошибки по индексу сообщения в списке.
         """
-        documents = [message.dict() for message in messages]
-        return await self._repository.create_all('messages', documents)
+        return await self._create_unordered(messages, [subscriptions] * len(messages))
+
+    async def create_buffered(self, items: List[Tuple[Message, Sequence[Subscription]]]) -> \
+            Tuple[List[Optional[str]], Dict[int, str]]:
+        """Записывает порцию буфера групповой записи: сообщения одновременных запросов и их подписки.
+
+        Args:
+            items (List[Tuple[Message, Sequence[Subscription]]]): Сообщения и подписки на их темы.
+
+        Returns:
+            Tuple[List[Optional[str]], Dict[int, str]]: Идентификаторы сообщений в порядке порции
+                (None для повторов и несохраненных) и ошибки по индексу в порции.
+        """
+        return await self._create_unordered([message for message, _ in items],
+                                            [subscriptions for _, subscriptions in items])
+
+    async def _create_unordered(self, messages: List[Message], subscriptions: List[Sequence[Subscription]]) -> \
+            Tuple[List[Optional[str]], Dict[int, str]]:
+        """Записывает сообщения вместе с записями очереди вебхуков.
+
+        Ключи идемпотентности резервируются до записи сообщений, поэтому повтор не попадает
+        ни в одну из месячных коллекций.
+
+        При подключении к набору реплик ключи, сообщения и записи очереди их доставки записываются
+        в одной транзакции: сохраненное сообщение всегда будет доставлено подписчикам. Если
+        в транзакции не записалось хотя бы одно сообщение, она отменяется, и порция записывается
+        без транзакции, чтобы сохранить остальные сообщения.
+
+        Без транзакции ключи несохраненных сообщений освобождаются, а записи очереди добавляются
+        сразу после записи сообщений. Если процесс завершится между этими шагами, сохраненные
+        сообщения не будут доставлены, а повтор сообщения с зарезервированным ключом будет отброшен.
+
+        Версии тем и статистика обновляются после записи: они не влияют на доставку.
+
+        Args:
+            messages (List[Message]): Сообщения для записи.
+            subscriptions (List[Sequence[Subscription]]): Подписки на тему каждого сообщения.
+
+        Returns:
+            Tuple[List[Optional[str]], Dict[int, str]]: Идентификаторы сообщений в порядке списка
+                (None для повторов и несохраненных) и ошибки по индексу сообщения в списке.
+        """
+        # Идентификаторы назначаются заранее: по ним записи ключей связываются с сообщениями
+        documents = [dict(message.dict(), _id=ObjectId()) for message in messages]
+        keyed = [index for index, message in enumerate(messages) if message.idempotency_key is not None]
+
+        # Сообщения записываются в коллекции по месяцу создания
+        by_collection: Dict[str, List[int]] = {}
+        for index, message in enumerate(messages):
+            by_collection.setdefault(self._storage.collection_for(message.created_date), []).append(index)
+        # Индексы новых коллекций создаются до транзакции
+        for collection in by_collection:
+            await self._storage.prepare(collection)
+
+        async def write(session: Optional[Any]) -> Tuple[List[Optional[str]], Dict[int, str], int]:
+            reserved, key_errors = await self._idempotency_keys.reserve(
+                [messages[index] for index in keyed], [documents[index]['_id'] for index in keyed], session=session)
+            duplicates, write_errors = set(), {}
+            for position, index in enumerate(keyed):
+                code, error = key_errors.get(position, (None, None))
+                # Ошибка уникального индекса означает, что одновременная отправка того же ключа успела первой
+                if position not in reserved and code in (None, DUPLICATE_KEY_ERROR):
+                    duplicates.add(index)
+                elif code is not None:
+                    write_errors[index] = (code, error)
+
+            for collection, indexes in by_collection.items():
+                indexes = [index for index in indexes if index not in duplicates and index not in write_errors]
+                if not indexes:
+                    continue
+                _, collection_errors = await self._repository.bulk_write_unordered(
+                    collection, [InsertOne(documents[index]) for index in indexes], session=session)
+                # Ошибки приводятся к индексам в общем списке
+                write_errors.update({indexes[index]: error for index, error in collection_errors.items()})
+            if session is not None and (key_errors or write_errors):
+                raise _PartialWrite()
+
+            ids = [None if index in duplicates or index in write_errors else str(document['_id'])
+                   for index, document in enumerate(documents)]
+            errors = {index: error for index, (_, error) in write_errors.items()}
+            if session is None:
+                unsaved = [documents[index]['_id'] for index in keyed if index in write_errors]
+                if unsaved:
+                    await self._idempotency_keys.release(unsaved)
+
+            saved = [index for index, message_id in enumerate(ids) if message_id is not None]
+            await self._outbox.enqueue([messages[index] for index in saved], [ids[index] for index in saved],
+                                       [subscriptions[index] for index in saved], session=session)
+            return ids, errors, len(duplicates)
+
+        result = None
+        if self._repository.supports_transactions:
+            with suppress(_PartialWrite):
+                result = await self._repository.run_in_transaction(write)
+        ids, errors, duplicates = result or await write(None)
+        if duplicates:
+            self._duplicates.inc(duplicates)
+
+        saved_messages = [message for message, message_id in zip(messages, ids) if message_id is not None]
+        if saved_messages:
+            await self._outbox.schedule_batches(subscription for index, message_id in enumerate(ids)
+                                                if message_id is not None for subscription in subscriptions[index])
+            await self._topic_versions.bump([message.topic_id for message in saved_messages])
+            await self._stats.record(saved_messages)
+        return ids, errors
@@ -1,10 +1,44 @@
+from datetime import datetime
+from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Message(BaseModel):
     _id: Optional[int] = None
     unique_id: Optional[int]
     topic_id: int
-    payload: dict
\ No newline at end of file
+    payload: dict
+    created_date: datetime = Field(default_factory=datetime.now)
+    idempotency_key: Optional[str] = None
+    expire_at: Optional[datetime] = None
+
+
+class Subscription(BaseModel):
+    """Подписка партнера на тему, полученная из сервиса тем.
+
+    Атрибуты:
+        url (str): URL-адрес для доставки сообщений.
+        batch_mode (bool): Доставлять сообщения пакетами в одном POST-запросе.
+        batch_max_items (int): Максимальное количество сообщений в пакете.
+        batch_max_bytes (int): Максимальный размер пакета в байтах.
+        batch_max_delay_ms (int): Максимальное время накопления пакета в миллисекундах.
+    """
+    url: str
+    batch_mode: bool = False
+    batch_max_items: int = 100
+    batch_max_bytes: int = 1048576
+    batch_max_delay_ms: int = 1000
+
+
+class OutboxStatus(str, Enum):
+    """Состояние записи в очереди исходящих вебхуков.
+
+    Запись в состоянии 'batched' входит в пакет другой записи и доставляется вместе с ней.
+    """
+    pending = 'pending'
+    processing = 'processing'
+    batched = 'batched'
+    delivered = 'delivered'
+    dead = 'dead'
@@ -0,0 +1,96 @@
+import time
+from typing import Dict, Tuple, Any
+
+from pymongo import monitoring
+
+from anika_metrics import metrics
+
+# Границы корзин для времени ожидания и удержания соединений (в секундах)
+POOL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Слушатель событий пула соединений MongoDB, собирающий метрики пула.
+
+    Атрибуты:
+        _checked_out_at (Dict[Tuple[Any, int], float]): Время выдачи соединений, которые сейчас используются.
+    """
+
+    def __init__(self):
+        """Инициализирует слушатель и регистрирует метрики пула."""
+        self._checked_out_at: Dict[Tuple[Any, int], float] = {}
+        self._connections = metrics.gauge('mongodb_pool_connections', 'Открытые соединения в пуле MongoDB')
+        self._in_use = metrics.gauge('mongodb_pool_connections_in_use', 'Соединения MongoDB, выданные из пула')
+        self._wait_time = metrics.histogram('mongodb_pool_wait_seconds',
+                                            'Время ожидания выдачи соединения из пула MongoDB',
+                                            buckets=POOL_BUCKETS)
+        self._checkout_time = metrics.histogram('mongodb_pool_checkout_seconds',
+                                                'Время удержания соединения MongoDB до возврата в пул',
+                                                buckets=POOL_BUCKETS)
+        self._failures = metrics.counter('mongodb_pool_checkout_failures_total',
+                                         'Неудачные попытки получить соединение из пула MongoDB', labels=('reason',))
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        pass
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self._connections.inc()
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self._connections.dec()
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        pass
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self._failures.labels(reason=event.reason).inc()
+        if event.duration is not None:
+            self._wait_time.observe(event.duration)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self._in_use.inc()
+        self._checked_out_at[(event.address, event.connection_id)] = time.monotonic()
+        if event.duration is not None:
+            self._wait_time.observe(event.duration)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self._in_use.dec()
+        checked_out_at = self._checked_out_at.pop((event.address, event.connection_id), None)
+        if checked_out_at is not None:
+            self._checkout_time.observe(time.monotonic() - checked_out_at)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Слушатель команд MongoDB, собирающий время выполнения запросов.
+
+    Время берется из событий драйвера, поэтому слушателю не нужно хранить состояние выполняющихся команд.
+    """
+
+    def __init__(self):
+        """Инициализирует слушатель и регистрирует метрики команд."""
+        self._duration = metrics.histogram('mongodb_command_seconds', 'Время выполнения команд MongoDB',
+                                           labels=('command',))
+        self._failures = metrics.counter('mongodb_command_failures_total', 'Команды MongoDB, завершившиеся ошибкой',
+                                         labels=('command',))
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._duration.labels(command=event.command_name).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._duration.labels(command=event.command_name).observe(event.duration_micros / 1_000_000)
+        self._failures.labels(command=event.command_name).inc()
@@ -1,5 +1,12 @@
 import motor.motor_asyncio
-from typing import List, Any, Dict, Optional, Mapping
+from typing import List, Any, Dict, Optional, Mapping, Sequence, Set, Tuple, AsyncIterator, Awaitable, Callable, \
+    TypeVar
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+T = TypeVar('T')
+
 
 class MongoDBRepository:
     """Репозиторий для взаимодействия с базой данных MongoDB.
@@ -10,11 +17,18 @@ class MongoDBRepository:
         _db_name (str): Имя базы данных.
         _username (Optional[str]): Имя пользователя для подключения к MongoDB.
         _password (Optional[str]): Пароль для подключения к MongoDB.
+        _replica_set (Optional[str]): Имя набора реплик MongoDB.
         _client (AsyncIOMotorClient): Асинхронный клиент MongoDB.
         _db (AsyncIOMotorDatabase): База данных MongoDB.
+
+    Клиент держит собственный пул соединений, поэтому экземпляр создаётся один раз на процесс
+    и разделяется между всеми запросами.
     """
 
-    def __init__(self, host: str, port: int, db_name: str, username: Optional[str] = None, password: Optional[str] = None):
+    def __init__(self, host: str, port: int, db_name: str, username: Optional[str] = None, password: Optional[str] = None,
+                 max_pool_size: int = 100, min_pool_size: int = 0, max_idle_time_ms: Optional[int] = None,
+                 server_selection_timeout_ms: int = 30000, event_listeners: Sequence[Any] = (),
+                 replica_set: Optional[str] = None):
         """Инициализирует экземпляр MongoDBRepository с указанными параметрами.
 
         Args:
@@ -23,15 +37,35 @@ class MongoDBRepository:
             db_name (str): Имя базы данных.
             username (Optional[str], optional): Имя пользователя для подключения к MongoDB. По умолчанию None.
             password (Optional[str], optional): Пароль для подключения к MongoDB. По умолчанию None.
+            max_pool_size (int, optional): Максимальный размер пула соединений. По умолчанию 100.
+            min_pool_size (int, optional): Минимальное количество соединений в пуле. По умолчанию 0.
+            max_idle_time_ms (Optional[int], optional): Время простоя, после которого соединение закрывается.
+                По умолчанию None (без ограничения).
+            server_selection_timeout_ms (int, optional): Время ожидания выбора сервера. По умолчанию 30000.
+            event_listeners (Sequence[Any], optional): Слушатели событий драйвера. По умолчанию пусто.
+            replica_set (Optional[str], optional): Имя набора реплик, необходимого для транзакций
+                и потоков изменений. По умолчанию None.
         """
         self._host = host
         self._port = port
         self._db_name = db_name
         self._username = username
         self._password = password
-        self._client = motor.motor_asyncio.AsyncIOMotorClient(self.url)
+        self._replica_set = replica_set
+        self._client = motor.motor_asyncio.AsyncIOMotorClient(
+            self.url,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms,
+            serverSelectionTimeoutMS=server_selection_timeout_ms,
+            event_listeners=list(event_listeners)
+        )
         self._db = self._client[self._db_name]
 
+    def close(self) -> None:
+        """Закрывает клиент MongoDB и все соединения пула."""
+        self._client.close()
+
     @property
     def url(self) -> str:
         """Формирует URL для подключения к MongoDB.
@@ -39,9 +73,35 @@ class MongoDBRepository:
         Returns:
             str: URL для подключения к MongoDB.
         """
+        url = f'mongodb://{self._host}:{self._port}'
         if self._username and self._password:
-            return f'mongodb://{self._username}:{self._password}@{self._host}:{self._port}'
-        return f'mongodb://{self._host}:{self._port}'
+            url = f'mongodb://{self._username}:{self._password}@{self._host}:{self._port}'
+        if self._replica_set:
+            url += f'/?replicaSet={self._replica_set}'
+        return url
+
+    @property
+    def supports_transactions(self) -> bool:
+        """Возвращает True, если подключение к набору реплик позволяет выполнять транзакции."""
+        return self._replica_set is not None
+
+    async def run_in_transaction(self, callback: Callable[[motor.motor_asyncio.AsyncIOMotorClientSession],
+                                                          Awaitable[T]]) -> T:
+        """Выполняет функцию в транзакции MongoDB.
+
+        При временных ошибках (например, конфликте записи с другой транзакцией) функция выполняется
+        повторно, поэтому она не должна иметь побочных эффектов вне базы данных. Исключение функции
+        отменяет транзакцию и передается вызывающему.
+
+        Args:
+            callback (Callable[[AsyncIOMotorClientSession], Awaitable[T]]): Функция, выполняющая операции
+                с переданной ей сессией.
+
+        Returns:
+            T: Результат функции.
+        """
+        async with await self._client.start_session() as session:
+            return await session.with_transaction(callback)
 
     async def create(self, collection: str, document: Dict[str, Any]) -> str:
         """Создает документ в указанной коллекции.
@@ -56,18 +116,45 @@ class MongoDBRepository:
         result = await self._db[collection].insert_one(document)
         return str(result.inserted_id)
 
-    async def create_all(self, collection: str, documents: List[Dict[str, Any]]) -> List[str]:
+    async def create_all(self, collection: str, documents: List[Dict[str, Any]],
+                         session: Optional[Any] = None) -> List[str]:
         """Создает несколько документов в указанной коллекции.
 
         Args:
             collection (str): Название коллекции.
             documents (List[Dict[str, Any]]): Список документов для добавления.
+            session (Optional[Any], optional): Сессия транзакции. По умолчанию без транзакции.
 
         Returns:
             List[str]: Список идентификаторов созданных документов.
         """
-        result = await self._db[collection].insert_many(documents)
-        return result.inserted_ids
+        result = await self._db[collection].insert_many(documents, session=session)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    async def bulk_write_unordered(self, collection: str, operations: Sequence[Any],
+                                   session: Optional[Any] = None) -> Tuple[Set[Any], Dict[int, Tuple[int, str]]]:
+        """Выполняет операции записи одним запросом, не прерываясь на ошибочных операциях.
+
+        Внутри транзакции ошибка любой операции отменяет всю транзакцию.
+
+        Args:
+            collection (str): Название коллекции.
+            operations (Sequence[Any]): Операции InsertOne, UpdateOne и т.д.
+            session (Optional[Any], optional): Сессия транзакции. По умолчанию без транзакции.
+
+        Returns:
+            Tuple[Set[Any], Dict[int, Tuple[int, str]]]: Идентификаторы документов, созданных
+                upsert-операциями, и ошибки (код, описание) по индексу операции.
+        """
+        try:
+            result = (await self._db[collection].bulk_write(operations, ordered=False,
+                                                            session=session)).bulk_api_result
+        except BulkWriteError as exc:
+            result = exc.details
+
+        upserted = {item['_id'] for item in result.get('upserted', [])}
+        errors = {error['index']: (error['code'], error['errmsg']) for error in result.get('writeErrors', [])}
+        return upserted, errors
 
     async def aggregate(self, collection: str, pipeline: List[Dict[str, Any]], max_time_ms: int = None) -> List[Dict[str, Any]]:
         """Выполняет агрегацию в указанной коллекции.
@@ -80,11 +167,54 @@ class MongoDBRepository:
         Returns:
             List[Dict[str, Any]]: Результат агрегации.
         """
-        cursor = self._db[collection].aggregate(pipeline, max_time_ms=max_time_ms)
-        result = []
-        async for document in cursor:
-            result.append(document)
-        return result
+        return [document async for document in self.aggregate_iter(collection, pipeline, max_time_ms=max_time_ms)]
+
+    async def aggregate_iter(self, collection: str, pipeline: List[Dict[str, Any]], max_time_ms: Optional[int] = None,
+                             batch_size: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Выполняет агрегацию в указанной коллекции и возвращает документы по мере чтения курсора.
+
+        В памяти одновременно находится не больше одной порции курсора.
+
+        Args:
+            collection (str): Название коллекции.
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации.
+            max_time_ms (Optional[int], optional): Максимальное время выполнения в миллисекундах. По умолчанию None.
+            batch_size (Optional[int], optional): Количество документов в одной порции курсора.
+                По умолчанию размер порции сервера.
+
+        Yields:
+            Dict[str, Any]: Документы результата агрегации.
+        """
+        options = {}
+        if max_time_ms is not None:
+            options['maxTimeMS'] = max_time_ms
+        if batch_size is not None:
+            options['batchSize'] = batch_size
+
+        cursor = self._db[collection].aggregate(pipeline, **options)
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            await cursor.close()
+
+    async def watch(self, pipeline: List[Dict[str, Any]],
+                    resume_after: Optional[Mapping[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Читает поток изменений всей базы данных.
+
+        Потоки изменений доступны только на наборе реплик или шардированном кластере.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации для отбора событий.
+            resume_after (Optional[Mapping[str, Any]], optional): Токен события, после которого
+                нужно продолжить чтение. По умолчанию чтение начинается с текущего момента.
+
+        Yields:
+            Dict[str, Any]: События изменений; поле _id содержит токен продолжения.
+        """
+        async with self._db.watch(pipeline, resume_after=resume_after) as stream:
+            async for change in stream:
+                yield change
 
     async def find(self, collection: str, query: Dict[str, Any]) -> Optional[Mapping[str, Any]]:
         """Находит один документ в указанной коллекции по заданному запросу.
@@ -101,6 +231,117 @@ class MongoDBRepository:
             return document
         return None
 
+    async def find_all(self, collection: str, query: Dict[str, Any], sort: Optional[List[Tuple[str, int]]] = None,
+                       limit: int = 0, projection: Optional[Dict[str, Any]] = None) -> List[Mapping[str, Any]]:
+        """Находит документы в указанной коллекции по заданному запросу.
+
+        Args:
+            collection (str): Название коллекции.
+            query (Dict[str, Any]): Запрос для поиска документов.
+            sort (Optional[List[Tuple[str, int]]], optional): Порядок сортировки. По умолчанию None.
+            limit (int, optional): Максимальное количество документов, 0 - без ограничения. По умолчанию 0.
+            projection (Optional[Dict[str, Any]], optional): Возвращаемые поля. По умолчанию все поля.
+
+        Returns:
+            List[Mapping[str, Any]]: Найденные документы.
+        """
+        cursor = self._db[collection].find(query, projection=projection, sort=sort, limit=limit)
+        return await cursor.to_list(length=None)
+
+    async def count(self, collection: str, query: Dict[str, Any]) -> int:
+        """Подсчитывает документы в указанной коллекции по заданному запросу.
+
+        Args:
+            collection (str): Название коллекции.
+            query (Dict[str, Any]): Запрос для поиска документов.
+
+        Returns:
+            int: Количество документов.
+        """
+        return await self._db[collection].count_documents(query)
+
+    async def find_one_and_update(self, collection: str, query: Dict[str, Any], update: Dict[str, Any],
+                                  sort: Optional[List[Tuple[str, int]]] = None) -> Optional[Mapping[str, Any]]:
+        """Атомарно находит и обновляет один документ в указанной коллекции.
+
+        Args:
+            collection (str): Название коллекции.
+            query (Dict[str, Any]): Запрос для поиска документа.
+            update (Dict[str, Any]): Операторы обновления.
+            sort (Optional[List[Tuple[str, int]]], optional): Порядок выбора документа, если подходят несколько.
+                По умолчанию None.
+
+        Returns:
+            Optional[Mapping[str, Any]]: Обновленный документ или None, если документ не найден.
+        """
+        return await self._db[collection].find_one_and_update(query, update, sort=sort,
+                                                              return_document=ReturnDocument.AFTER)
+
+    async def increment_all(self, collection: str, ids: Sequence[Any], field: str, amount: int = 1) -> None:
+        """Увеличивает числовое поле документов с указанными идентификаторами, создавая недостающие документы.
+
+        Args:
+            collection (str): Название коллекции.
+            ids (Sequence[Any]): Идентификаторы документов.
+            field (str): Имя увеличиваемого поля.
+            amount (int, optional): Величина увеличения. По умолчанию 1.
+        """
+        operations = [UpdateOne({'_id': _id}, {'$inc': {field: amount}}, upsert=True) for _id in ids]
+        if operations:
+            await self._db[collection].bulk_write(operations, ordered=False)
+
+    async def create_index(self, collection: str, keys: List[Tuple[str, int]], **kwargs: Any) -> str:
+        """Создает индекс в указанной коллекции, если он еще не существует.
+
+        Args:
+            collection (str): Название коллекции.
+            keys (List[Tuple[str, int]]): Поля индекса и направление сортировки.
+            **kwargs: Дополнительные параметры индекса (name, unique, expireAfterSeconds и т.д.).
+
+        Returns:
+            str: Имя индекса.
+        """
+        return await self._db[collection].create_index(keys, **kwargs)
+
+    async def list_indexes(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        """Возвращает описание существующих индексов коллекции.
+
+        Args:
+            collection (str): Название коллекции.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Параметры индексов по имени индекса.
+        """
+        return await self._db[collection].index_information()
+
+    async def list_collections(self, pattern: str) -> List[str]:
+        """Возвращает названия коллекций, соответствующих регулярному выражению.
+
+        Args:
+            pattern (str): Регулярное выражение для названия коллекции.
+
+        Returns:
+            List[str]: Названия коллекций.
+        """
+        return await self._db.list_collection_names(filter={'name': {'$regex': pattern}})
+
+    async def drop_collection(self, collection: str) -> None:
+        """Удаляет коллекцию вместе с ее документами и индексами.
+
+        Args:
+            collection (str): Название коллекции.
+        """
+        await self._db.drop_collection(collection)
+
+    async def drop_index(self, collection: str, name: str) -> None:
+        """Удаляет индекс коллекции.
+
+        Args:
+            collection (str): Название коллекции.
+            name (str): Имя индекса.
+        """
+        await self._db[collection].drop_index(name)
+
     async def update(self, collection: str, query: Dict[str, Any], update: Dict[str, Any]) -> int:
         """Обновляет один документ в указанной коллекции по заданному запросу.
 
@@ -115,6 +356,20 @@ class MongoDBRepository:
         result = await self._db[collection].update_one(query, {'$set': update})
         return result.modified_count
 
+    async def update_all(self, collection: str, query: Dict[str, Any], update: Dict[str, Any]) -> int:
+        """Обновляет все документы в указанной коллекции по заданному запросу.
+
+        Args:
+            collection (str): Название коллекции.
+            query (Dict[str, Any]): Запрос для поиска документов.
+            update (Dict[str, Any]): Обновляемые данные.
+
+        Returns:
+            int: Количество обновленных документов.
+        """
+        result = await self._db[collection].update_many(query, {'$set': update})
+        return result.modified_count
+
     async def delete(self, collection: str, query: Dict[str, Any]) -> int:
         """Удаляет один документ в указанной коллекции по заданному запросу.
 
@@ -127,3 +382,16 @@ class MongoDBRepository:
         """
         result = await self._db[collection].delete_one(query)
         return result.deleted_count
+
+    async def delete_all(self, collection: str, query: Dict[str, Any]) -> int:
+        """Удаляет все документы в указанной коллекции, соответствующие запросу.
+
+        Args:
+            collection (str): Название коллекции.
+            query (Dict[str, Any]): Запрос для поиска документов.
+
+        Returns:
+            int: Количество удаленных документов.
+        """
+        result = await self._db[collection].delete_many(query)
+        return result.deleted_count
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Set, TYPE_CHECKING
+
+from src.database.indexes import IndexSpec
+from src.database.repository import MongoDBRepository
+
+if TYPE_CHECKING:
+    from src.database.managers import TopicVersionsManager
+
+logger = logging.getLogger(__name__)
+
+
+class MessageStorage:
+    """Раскладка сообщений по коллекциям.
+
+    В раскладке 'single' все сообщения хранятся в коллекции 'messages'. В раскладке 'monthly'
+    сообщения хранятся в коллекциях 'messages_ГГГГ_ММ' по месяцу создания, поэтому устаревшие
+    сообщения удаляются целой коллекцией, а не по одному документу.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+        _layout (str): Раскладка сообщений: 'single' или 'monthly'.
+        _indexes (Sequence[IndexSpec]): Индексы, создаваемые в каждой коллекции помесячной раскладки.
+        _topic_versions (Optional[TopicVersionsManager]): Версии тем, увеличиваемые при удалении коллекций.
+        _prepared (Set[str]): Коллекции, индексы которых уже созданы в этом процессе.
+    """
+
+    collection = 'messages'
+
+    def __init__(self, repository: MongoDBRepository, layout: str = 'single', indexes: Sequence[IndexSpec] = (),
+                 topic_versions: Optional['TopicVersionsManager'] = None):
+        """Инициализирует экземпляр MessageStorage.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+            layout (str, optional): Раскладка сообщений: 'single' или 'monthly'. По умолчанию 'single'.
+            indexes (Sequence[IndexSpec], optional): Индексы коллекций помесячной раскладки. По умолчанию пусто.
+            topic_versions (Optional[TopicVersionsManager], optional): Версии тем для сброса кэшей
+                результатов поиска при удалении коллекций. По умолчанию версии не изменяются.
+        """
+        self._repository = repository
+        self._layout = layout
+        self._indexes = indexes
+        self._topic_versions = topic_versions
+        self._prepared: Set[str] = set()
+
+    @property
+    def is_bucketed(self) -> bool:
+        """Возвращает True для помесячной раскладки."""
+        return self._layout == 'monthly'
+
+    @property
+    def pattern(self) -> str:
+        """Возвращает регулярное выражение для названий коллекций помесячной раскладки."""
+        return f'^{self.collection}_\\d{{4}}_\\d{{2}}$'
+
+    def collection_for(self, created_date: datetime) -> str:
+        """Возвращает коллекцию, в которой хранится сообщение с указанной датой создания.
+
+        Args:
+            created_date (datetime): Дата создания сообщения.
+
+        Returns:
+            str: Название коллекции.
+        """
+        if not self.is_bucketed:
+            return self.collection
+        return f'{self.collection}_{created_date.year:04d}_{created_date.month:02d}'
+
+    async def prepare(self, collection: str) -> None:
+        """Создает индексы коллекции помесячной раскладки перед первой записью в нее.
+
+        Args:
+            collection (str): Название коллекции.
+        """
+        if not self.is_bucketed or collection in self._prepared:
+            return
+
+        for spec in self._indexes:
+            await self._repository.create_index(collection, spec.keys, name=spec.name, **spec.options)
+        self._prepared.add(collection)
+
+    async def collections(self) -> List[str]:
+        """Возвращает коллекции, из которых читаются сообщения, от новых к старым.
+
+        Заранее созданные коллекции следующих месяцев пусты и не возвращаются.
+
+        Returns:
+            List[str]: Названия коллекций.
+        """
+        if not self.is_bucketed:
+            return [self.collection]
+        current = self.collection_for(datetime.now())
+        return sorted((collection for collection in await self._repository.list_collections(self.pattern)
+                       if collection <= current), reverse=True)
+
+    @staticmethod
+    def union_pipeline(pipeline: List[Dict[str, Any]], collections: Sequence[str]) -> List[Dict[str, Any]]:
+        """Распространяет конвейер агрегации на несколько коллекций.
+
+        Начальные стадии $match выполняются в каждой коллекции по ее индексам. Если за ними следуют
+        $sort и $limit, они тоже выполняются в каждой коллекции, чтобы из каждой читалось не больше
+        limit документов. Остальные стадии применяются к объединенному результату.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации для одной коллекции.
+            collections (Sequence[str]): Коллекции; конвейер выполняется в первой из них.
+
+        Returns:
+            List[Dict[str, Any]]: Конвейер агрегации с $unionWith для остальных коллекций.
+        """
+        if len(collections) < 2:
+            return pipeline
+
+        split = next((index for index, stage in enumerate(pipeline) if '$match' not in stage), len(pipeline))
+        per_collection = pipeline[:split]
+        if [next(iter(stage)) for stage in pipeline[split:split + 2]] == ['$sort', '$limit']:
+            per_collection = pipeline[:split + 2]
+
+        unions = [{'$unionWith': {'coll': collection, 'pipeline': per_collection}} for collection in collections[1:]]
+        return per_collection + unions + pipeline[split:]
+
+    async def prepare_ahead(self, now: Optional[datetime] = None) -> List[str]:
+        """Создает коллекции текущего и следующего месяцев вместе с индексами.
+
+        Коллекция следующего месяца создается заранее, поэтому первые записи месяца не ждут
+        построения индексов.
+
+        Args:
+            now (Optional[datetime], optional): Текущее время. По умолчанию datetime.now().
+
+        Returns:
+            List[str]: Названия подготовленных коллекций.
+        """
+        if not self.is_bucketed:
+            return []
+
+        now = now or datetime.now()
+        months = now.year * 12 + now.month
+        collections = [self.collection_for(now), self.collection_for(datetime(months // 12, months % 12 + 1, 1))]
+        for collection in collections:
+            await self.prepare(collection)
+        return collections
+
+    async def drop_expired(self, keep_months: int, now: Optional[datetime] = None) -> List[str]:
+        """Удаляет коллекции помесячной раскладки старше указанного количества месяцев.
+
+        После удаления коллекции увеличиваются версии тем, сообщения которых в ней хранились, чтобы
+        кэшированные результаты поиска с этими сообщениями перестали считаться актуальными.
+
+        Args:
+            keep_months (int): Количество хранимых месяцев, включая текущий.
+            now (Optional[datetime], optional): Текущее время. По умолчанию datetime.now().
+
+        Returns:
+            List[str]: Названия удаленных коллекций.
+        """
+        if not self.is_bucketed:
+            return []
+
+        now = now or datetime.now()
+        months = now.year * 12 + now.month - 1 - (keep_months - 1)
+        oldest_kept = self.collection_for(datetime(months // 12, months % 12 + 1, 1))
+
+        dropped = [collection for collection in await self.collections() if collection < oldest_kept]
+        for collection in dropped:
+            logger.info('Dropping expired messages collection %s', collection)
+            topics = await self._repository.aggregate(collection, [{'$group': {'_id': '$topic_id'}}]) \
+                if self._topic_versions is not None else []
+            await self._repository.drop_collection(collection)
+            self._prepared.discard(collection)
+            # Версии увеличиваются после удаления: поиск, прочитавший новую версию, уже не найдет сообщений коллекции
+            if topics:
+                await self._topic_versions.bump([topic['_id'] for topic in topics])
+        return dropped
+
+    async def run_retention(self, keep_months: Optional[int], interval_s: float) -> None:
+        """Периодически создает коллекцию следующего месяца и удаляет устаревшие коллекции помесячной раскладки.
+
+        Args:
+            keep_months (Optional[int]): Количество хранимых месяцев, включая текущий. None - не удалять коллекции.
+            interval_s (float): Интервал между проверками в секундах.
+        """
+        while True:
+            try:
+                await self.prepare_ahead()
+            except Exception:
+                logger.exception('Failed to prepare messages collections ahead')
+            if keep_months:
+                try:
+                    await self.drop_expired(keep_months)
+                except Exception:
+                    logger.exception('Failed to drop expired messages collections')
+            await asyncio.sleep(interval_s)
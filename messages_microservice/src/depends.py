@@ -1,15 +1,27 @@
-from typing import Annotated
+from datetime import timedelta
+from typing import Annotated, Optional, Literal
 
+from aiohttp import TCPConnector, ClientTimeout
 from fastapi import Depends
 from pydantic import BaseModel
-from starlette.requests import Request
+from starlette.requests import Request, HTTPConnection
 
 from src.config import config
-from src.database.managers import MessagesManager
+from src.database.batching import GroupCommitBuffer
+from src.database.indexes import IndexManager
+from src.database.managers import MessagesManager, OutboxManager, MessageStatsManager, IdempotencyKeysManager, \
+    TopicVersionsManager
+from src.database.monitoring import PoolMetricsListener, CommandMetricsListener
 from src.database.repository import MongoDBRepository
+from src.database.storage import MessageStorage
 from src.schemas.exceptions import HeadersNotFound
+from src.utils.outbox import OutboxDispatcher
+from src.utils.cache import TTLCache, VersionedCache
+from src.utils.feed import MessageFeed
+from src.utils.ingest import MessagesIngestor
+from src.utils.query_guard import QueryGuard
 from src.utils.search import SearchEngine
-from src.utils.topics import TopicService, MockedTopicService
+from src.utils.topics import TopicService, MockedTopicService, CachedTopicService
 from src.utils.webhooks import WebhooksNotifier
 
 
@@ -26,11 +38,11 @@ class HeadersInput(BaseModel):
     user_id: int
 
 
-def get_headers(request: Request) -> HeadersInput:
+def get_headers(request: HTTPConnection) -> HeadersInput:
     """Извлекает и возвращает заголовки из запроса в виде объекта HeadersInput.
 
     Args:
-        request (Request): Объект запроса FastAPI.
+        request (HTTPConnection): Объект запроса или WebSocket-соединения FastAPI.
 
     Returns:
         HeadersInput: Объект, содержащий заголовки запроса.
@@ -51,35 +63,93 @@ def get_headers(request: Request) -> HeadersInput:
     return input_header
 
 
-def get_topic_service(headers: Annotated[HeadersInput, Depends(get_headers)]) -> TopicService:
-    """Создает и возвращает экземпляр TopicService.
+def create_topics_cache() -> TTLCache:
+    """Создает общий для процесса кэш ответов сервиса тем.
+
+    Returns:
+        TTLCache: Экземпляр TTLCache с параметрами из конфигурации.
+    """
+    return TTLCache(name='topics', max_size=config.topics_cache.max_size, ttl_s=config.topics_cache.ttl_s,
+                    negative_ttl_s=config.topics_cache.negative_ttl_s)
+
+
+def create_search_cache() -> Optional[VersionedCache]:
+    """Создает общий для процесса кэш результатов поиска.
+
+    Returns:
+        Optional[VersionedCache]: Экземпляр VersionedCache с параметрами из конфигурации
+            или None, если кэширование выключено.
+    """
+    if not config.search.cache_enabled:
+        return None
+    return VersionedCache(name='search', max_entries=config.search.cache_max_entries,
+                          max_bytes=config.search.cache_max_bytes, max_age_s=config.search.cache_max_age_s)
+
+
+def create_query_guard() -> QueryGuard:
+    """Создает общую для процесса проверку поисковых запросов.
+
+    Returns:
+        QueryGuard: Экземпляр QueryGuard с индексами коллекции 'messages' и параметрами из конфигурации.
+    """
+    return QueryGuard(indexes=MessagesManager.indexes, **config.query_guard.dict())
+
+
+def resolve_time_budget(endpoint: Literal['search', 'stream'], partner_id: int,
+                        requested_ms: Optional[int] = None) -> int:
+    """Определяет время выполнения поискового запроса на сервере MongoDB.
 
     Аргументы:
-        headers (HeadersInput): Заголовки запроса, полученные из зависимости get_headers.
+        endpoint (str): Вид поиска: 'search' или 'stream'.
+        partner_id (int): Идентификатор партнера.
+        requested_ms (Optional[int], optional): Время, запрошенное клиентом. По умолчанию None.
+
+    Returns:
+        int: Время выполнения в миллисекундах: установленное для партнера или общее,
+            уменьшенное до запрошенного клиентом.
+    """
+    field = f'{endpoint}_ms'
+    max_time_ms = getattr(config.time_budgets, field)
+    # Незаданное для партнера поле берется из общих значений, а не из значения по умолчанию TimeBudget
+    override = config.time_budgets.partners.get(partner_id)
+    if override is not None and field in override.model_fields_set:
+        max_time_ms = getattr(override, field)
+    if requested_ms is not None:
+        max_time_ms = min(max_time_ms, requested_ms)
+    return max_time_ms
+
+
+def create_topic_service() -> TopicService:
+    """Создает общий для процесса экземпляр TopicService.
+
+    Сессия сервиса открывается при запуске приложения и закрывается при его остановке,
+    поэтому промахи кэша тем из разных запросов загружаются через одну сессию. Запросы
+    выполняются с токеном партнера, переданным в CachedTopicService, а не с токеном сервиса.
 
     Returns:
         TopicService: Экземпляр TopicService, используется MockedTopicService на время разработки.
     """
     # На время разработки передаём мок-апи
-    topic_service = MockedTopicService()
-    return topic_service
+    return MockedTopicService()
 
 
-def get_webhooks_notifier(request: Request) -> WebhooksNotifier:
-    """Создает и возвращает экземпляр WebhooksNotifier.
+def get_topic_service(request: HTTPConnection,
+                      headers: Annotated[HeadersInput, Depends(get_headers)]) -> TopicService:
+    """Создает и возвращает экземпляр TopicService.
 
     Аргументы:
-        request (Request): Объект запроса FastAPI (не используется в текущей реализации).
+        request (HTTPConnection): Объект запроса или WebSocket-соединения FastAPI.
+        headers (HeadersInput): Заголовки запроса, полученные из зависимости get_headers.
 
     Returns:
-        WebhooksNotifier: Экземпляр WebhooksNotifier.
+        TopicService: Кэширующая обертка над общим для процесса TopicService.
     """
-    web_hooks_notifier = WebhooksNotifier()
-    return web_hooks_notifier
+    return CachedTopicService(service=request.app.state.topic_service, cache=request.app.state.topics_cache,
+                              partner_id=headers.partner_id, token=headers.token)
 
 
-def get_mongodb() -> MongoDBRepository:
-    """Создает и возвращает экземпляр MongoDBRepository.
+def create_mongodb() -> MongoDBRepository:
+    """Создает экземпляр MongoDBRepository с пулом соединений, общим для всего процесса.
 
     Returns:
         MongoDBRepository: Экземпляр MongoDBRepository с параметрами подключения из конфигурации.
@@ -89,29 +159,221 @@ def get_mongodb() -> MongoDBRepository:
         port=config.database.port,
         username=config.database.username,
         password=config.database.password,
-        db_name=config.database.name
+        db_name=config.database.name,
+        max_pool_size=config.database.max_pool_size,
+        min_pool_size=config.database.min_pool_size,
+        max_idle_time_ms=config.database.max_idle_time_ms,
+        server_selection_timeout_ms=config.database.server_selection_timeout_ms,
+        event_listeners=[PoolMetricsListener(), CommandMetricsListener()],
+        replica_set=config.database.replica_set
     )
 
 
-def get_messages_manager(mongodb: Annotated[MongoDBRepository, Depends(get_mongodb)]) -> MessagesManager:
+def get_mongodb(request: Request) -> MongoDBRepository:
+    """Возвращает экземпляр MongoDBRepository, созданный при запуске приложения.
+
+    Аргументы:
+        request (Request): Объект запроса FastAPI.
+
+    Returns:
+        MongoDBRepository: Общий для процесса экземпляр MongoDBRepository.
+    """
+    return request.app.state.mongodb
+
+
+def create_message_storage(mongodb: MongoDBRepository) -> MessageStorage:
+    """Создает общую для процесса раскладку сообщений по коллекциям.
+
+    Аргументы:
+        mongodb (MongoDBRepository): Общий для процесса экземпляр MongoDBRepository.
+
+    Returns:
+        MessageStorage: Экземпляр MessageStorage с раскладкой из конфигурации.
+    """
+    return MessageStorage(repository=mongodb, layout=config.retention.layout, indexes=MessagesManager.indexes,
+                          topic_versions=TopicVersionsManager(mongodb))
+
+
+def resolve_retention(retention_days: Optional[int]) -> Optional[timedelta]:
+    """Определяет срок хранения сообщений темы.
+
+    Аргументы:
+        retention_days (Optional[int]): Срок хранения сообщений темы в днях из сервиса тем.
+
+    Returns:
+        Optional[timedelta]: Срок хранения темы или общий срок из конфигурации,
+            None, если сообщения хранятся бессрочно.
+    """
+    days = retention_days if retention_days is not None else config.retention.default_days
+    if days is None:
+        return None
+    return timedelta(days=days)
+
+
+def create_index_manager(mongodb: MongoDBRepository, storage: MessageStorage) -> IndexManager:
+    """Создает менеджер индексов коллекций сервиса.
+
+    В помесячной раскладке индексы объявляются для всех существующих коллекций сообщений.
+
+    Аргументы:
+        mongodb (MongoDBRepository): Общий для процесса экземпляр MongoDBRepository.
+        storage (MessageStorage): Общий для процесса экземпляр MessageStorage.
+
+    Returns:
+        IndexManager: Экземпляр IndexManager с объявленными индексами коллекций сообщений,
+            статистики сообщений и ключей идемпотентности.
+    """
+    declarations = {MessageStatsManager.collection: MessageStatsManager.indexes,
+                    IdempotencyKeysManager.collection: IdempotencyKeysManager.indexes(config.idempotency.key_ttl_s)}
+    patterns = {}
+    if storage.is_bucketed:
+        patterns[storage.pattern] = MessagesManager.indexes
+    else:
+        declarations[storage.collection] = MessagesManager.indexes
+    return IndexManager(repository=mongodb, declarations=declarations, patterns=patterns,
+                        drop_changed=config.indexes.drop_changed)
+
+
+def get_index_manager(request: Request) -> IndexManager:
+    """Возвращает менеджер индексов, созданный при запуске приложения.
+
+    Аргументы:
+        request (Request): Объект запроса FastAPI.
+
+    Returns:
+        IndexManager: Общий для процесса экземпляр IndexManager.
+    """
+    return request.app.state.index_manager
+
+
+def create_webhooks_notifier() -> WebhooksNotifier:
+    """Создает экземпляр WebhooksNotifier с пулом соединений, общим для всего процесса.
+
+    Должна вызываться внутри работающего цикла событий.
+
+    Returns:
+        WebhooksNotifier: Экземпляр WebhooksNotifier с параметрами пула из конфигурации.
+    """
+    connector = TCPConnector(
+        limit=config.webhooks.pool_limit,
+        limit_per_host=config.webhooks.pool_limit_per_host,
+        keepalive_timeout=config.webhooks.keepalive_timeout_s,
+        use_dns_cache=True,
+        ttl_dns_cache=config.webhooks.dns_cache_ttl_s
+    )
+    timeout = ClientTimeout(sock_connect=config.webhooks.connect_timeout_s, sock_read=config.webhooks.read_timeout_s)
+    return WebhooksNotifier(connector=connector, timeout=timeout)
+
+
+def create_outbox_dispatcher(mongodb: MongoDBRepository, notifier: WebhooksNotifier) -> OutboxDispatcher:
+    """Создает пул фоновых обработчиков очереди вебхуков.
+
+    Аргументы:
+        mongodb (MongoDBRepository): Общий для процесса экземпляр MongoDBRepository.
+        notifier (WebhooksNotifier): Общий для процесса экземпляр WebhooksNotifier.
+
+    Returns:
+        OutboxDispatcher: Экземпляр OutboxDispatcher с параметрами из конфигурации.
+    """
+    return OutboxDispatcher(
+        outbox=OutboxManager(repository=mongodb),
+        notifier=notifier,
+        workers=config.webhooks.workers,
+        max_concurrency=config.webhooks.max_concurrency,
+        poll_interval_ms=config.webhooks.poll_interval_ms,
+        lease_ms=config.webhooks.lease_ms,
+        max_attempts=config.webhooks.max_attempts,
+        retry_base_delay_ms=config.webhooks.retry_base_delay_ms,
+        retry_max_delay_ms=config.webhooks.retry_max_delay_ms,
+        delivered_ttl_s=config.webhooks.delivered_ttl_s
+    )
+
+
+def create_write_buffer(mongodb: MongoDBRepository, storage: MessageStorage) -> Optional[GroupCommitBuffer]:
+    """Создает общий для процесса буфер групповой записи сообщений.
+
+    Аргументы:
+        mongodb (MongoDBRepository): Общий для процесса экземпляр MongoDBRepository.
+        storage (MessageStorage): Общий для процесса экземпляр MessageStorage.
+
+    Returns:
+        Optional[GroupCommitBuffer]: Экземпляр GroupCommitBuffer с параметрами из конфигурации
+            или None, если групповая запись выключена.
+    """
+    if not config.write_buffer.enabled:
+        return None
+    messages_manager = MessagesManager(repository=mongodb, storage=storage)
+    return GroupCommitBuffer(name='messages', write=messages_manager.create_buffered,
+                             max_batch_size=config.write_buffer.max_batch_size,
+                             max_delay_ms=config.write_buffer.max_delay_ms)
+
+
+def get_messages_manager(request: Request,
+                         mongodb: Annotated[MongoDBRepository, Depends(get_mongodb)]) -> MessagesManager:
     """Создает и возвращает экземпляр MessagesManager.
 
     Аргументы:
+        request (Request): Объект запроса FastAPI.
         mongodb (MongoDBRepository): Экземпляр MongoDBRepository, полученный из зависимости get_mongodb.
 
     Returns:
-        MessagesManager: Экземпляр MessagesManager.
+        MessagesManager: Экземпляр MessagesManager с общими для процесса буфером групповой записи
+            и раскладкой сообщений.
     """
-    return MessagesManager(repository=mongodb)
+    return MessagesManager(repository=mongodb, write_buffer=request.app.state.write_buffer,
+                           storage=request.app.state.message_storage)
 
 
-def get_search_engine(message_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> SearchEngine:
+def get_search_engine(request: Request,
+                      message_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> SearchEngine:
     """Создает и возвращает экземпляр SearchEngine.
 
+    Аргументы:
+        request (Request): Объект запроса FastAPI.
+        message_manager (MessagesManager): Экземпляр MessagesManager, полученный из зависимости get_messages_manager.
+
+    Returns:
+        SearchEngine: Экземпляр SearchEngine с общими для процесса кэшем результатов и проверкой запросов.
+    """
+    return SearchEngine(messages_manager=message_manager, stream_batch_size=config.search.stream_batch_size,
+                        cache=request.app.state.search_cache, guard=request.app.state.query_guard)
+
+
+def get_messages_ingestor(
+        message_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> MessagesIngestor:
+    """Создает и возвращает экземпляр MessagesIngestor.
+
     Аргументы:
         message_manager (MessagesManager): Экземпляр MessagesManager, полученный из зависимости get_messages_manager.
 
     Returns:
-        SearchEngine: Экземпляр SearchEngine.
+        MessagesIngestor: Экземпляр MessagesIngestor с параметрами из конфигурации.
+    """
+    return MessagesIngestor(messages_manager=message_manager, chunk_size=config.ingest.chunk_size,
+                            max_line_bytes=config.ingest.max_line_bytes, max_errors=config.ingest.max_errors)
+
+
+def create_message_feed(mongodb: MongoDBRepository) -> MessageFeed:
+    """Создает общий для процесса поток новых сообщений.
+
+    Аргументы:
+        mongodb (MongoDBRepository): Общий для процесса экземпляр MongoDBRepository.
+
+    Returns:
+        MessageFeed: Экземпляр MessageFeed с параметрами из конфигурации.
+    """
+    return MessageFeed(repository=mongodb, queue_size=config.stream.queue_size,
+                       replay_size=config.stream.replay_size, retry_delay_s=config.stream.retry_delay_s,
+                       max_resumed=config.stream.max_resumed)
+
+
+def get_message_feed(connection: HTTPConnection) -> MessageFeed:
+    """Возвращает поток новых сообщений, созданный при запуске приложения.
+
+    Аргументы:
+        connection (HTTPConnection): Объект запроса или WebSocket-соединения FastAPI.
+
+    Returns:
+        MessageFeed: Общий для процесса экземпляр MessageFeed.
     """
-    return SearchEngine(messages_manager=message_manager)
+    return connection.app.state.message_feed
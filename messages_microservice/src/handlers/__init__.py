@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from .base import router as base_router
+from .base import router as base_router, metrics_router
 from .messages import router as messages_router
 
 router = APIRouter(prefix='/api')
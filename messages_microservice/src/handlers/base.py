@@ -1,9 +1,18 @@
-from typing import Dict
-from fastapi import APIRouter
+from typing import Dict, Any, List, Annotated
+
+from anika_metrics import CONTENT_TYPE_LATEST, metrics
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+
+from src.database.indexes import IndexManager, IndexDrift
+from src.depends import get_index_manager
 
 # Создание роутера с префиксом '/base'
 router = APIRouter(prefix='/base', tags=['Основное'])
 
+# Роутер для сбора метрик Prometheus по стандартному пути '/metrics'
+metrics_router = APIRouter(tags=['Основное'])
+
 
 @router.get('/ping')
 async def pong() -> Dict[str, str]:
@@ -15,3 +24,40 @@ async def pong() -> Dict[str, str]:
         Dict[str, str]: Ответ в формате JSON с результатом 'pong'.
     """
     return {'result': 'pong'}
+
+
+@router.get('/metrics')
+async def get_metrics() -> Dict[str, Dict[str, Any]]:
+    """Обработчик GET-запросов на маршрут '/metrics'.
+
+    Возвращает текущие значения метрик процесса, в том числе метрики пула соединений MongoDB.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Снимок метрик по имени.
+    """
+    return metrics.snapshot()
+
+
+@metrics_router.get('/metrics', response_class=Response)
+async def get_prometheus_metrics() -> Response:
+    """Обработчик GET-запросов на маршрут '/metrics' для Prometheus.
+
+    Returns:
+        Response: Метрики процесса в текстовом формате Prometheus.
+    """
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get('/indexes')
+async def get_index_drift(index_manager: Annotated[IndexManager, Depends(get_index_manager)]) -> List[IndexDrift]:
+    """Обработчик GET-запросов на маршрут '/indexes'.
+
+    Сравнивает объявленные индексы с существующими в базе данных.
+
+    Args:
+        index_manager (IndexManager): Зависимость для менеджера индексов.
+
+    Returns:
+        List[IndexDrift]: Недостающие, измененные, замененные и необъявленные индексы по коллекциям.
+    """
+    return await index_manager.check()
@@ -1,70 +1,289 @@
+import asyncio
+from datetime import datetime
 from http.client import responses
-from typing import Annotated
+from typing import Annotated, List, AsyncIterator, Optional
 
-from aiohttp.web_response import Response
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Header, Query, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from fastapi.params import Depends
 
-from src.database.managers import MessagesManager
+from src.config import config
+from src.database.managers import MessagesManager, MessageStatsManager
 from src.database.models import Message
-from src.depends import get_topic_service, get_webhooks_notifier, get_messages_manager, get_search_engine
-from src.schemas.bodies import SearchQuery, SendQuery, SendAllQuery
-from src.schemas.exceptions import PermissionsError, TooManyNotifier, TimeOutException
-from src.schemas.responses import SearchOutput, SendOutput
+from src.depends import (get_topic_service, get_messages_manager, get_search_engine, get_headers, HeadersInput,
+                         resolve_time_budget, get_messages_ingestor, resolve_retention, get_message_feed)
+from src.schemas.bodies import SearchQuery, SendQuery, SendAllQuery, StatsQuery
+from src.schemas.exceptions import PermissionsError, InvalidCursor, QueryRejected, TooManyNotifier, TimeOutException, \
+    StatsRangeTooLarge, InvalidResumeToken
+from src.schemas.responses import SearchOutput, SendOutput, IngestOutput, StatsOutput, StatsBucket
 from src.utils.topics import TopicService
+from src.utils.feed import MessageFeed, encode_sse
+from src.utils.ingest import MessagesIngestor
 from src.utils.search import SearchEngine
-from src.utils.webhooks import WebhooksNotifier
 
 router = APIRouter(prefix="/messages", tags=["Сообщения"])
 
-@router.post("/search", responses={403: {"description": PermissionsError.detail}, 504: {"description": TimeOutException.detail}})
+async def resolve_topic_ids(requested: Optional[List[int]], topic_service: TopicService) -> List[int]:
+    """Определяет темы, по которым выполняется поиск.
+
+    Запрошенные темы ограничиваются темами, доступными пользователю. Если темы не указаны,
+    поиск выполняется по всем доступным темам.
+
+    Args:
+        requested (Optional[List[int]]): Идентификаторы тем из запроса.
+        topic_service (TopicService): Сервис тем.
+
+    Returns:
+        List[int]: Идентификаторы тем для поиска.
+
+    Raises:
+        PermissionsError: Исключение, если у пользователя нет разрешений ни на одну из указанных тем.
+    """
+    async with topic_service:
+        my_topics = await topic_service.get_my_topics()
+
+    if not requested:
+        return my_topics
+
+    topic_ids = [topic_id for topic_id in requested if topic_id in my_topics]
+    if len(topic_ids) == 0:
+        raise PermissionsError
+
+    return topic_ids
+
+
+@router.post("/search", response_model=SearchOutput,
+             responses={400: {"description": InvalidCursor.detail},
+                        403: {"description": PermissionsError.detail},
+                        422: {"description": QueryRejected.detail}, 504: {"description": TimeOutException.detail}})
 async def get_messages(data: SearchQuery,
                        search_engine: Annotated[SearchEngine, Depends(get_search_engine)],
-                       topic_service: Annotated[TopicService, Depends(get_topic_service)]) -> SearchOutput:
+                       topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                       headers: Annotated[HeadersInput, Depends(get_headers)]) -> Response:
     """Получает сообщения по заданным критериям поиска.
 
+    Ответ сериализуется поисковым движком напрямую из документов и возвращается без повторной
+    проверки моделью SearchOutput, которая описывает его формат.
+
     Args:
         data (SearchQuery): Данные запроса поиска.
         search_engine (SearchEngine): Зависимость для поискового движка.
         topic_service (TopicService): Зависимость для сервиса тем.
+        headers (HeadersInput): Заголовки запроса.
 
     Returns:
-        SearchOutput: Результат поиска с найденными сообщениями и уникальными идентификаторами.
+        Response: JSON модели SearchOutput с найденными сообщениями, уникальными идентификаторами
+            и токеном следующей страницы.
 
     Raises:
         PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанным темам.
+        InvalidCursor: Исключение, если токен продолжения поврежден или не подходит к сортировке.
+        QueryRejected: Исключение, если запрос использует неподдерживаемые операторы или слишком дорог.
+        TimeOutException: Исключение, если запрос не уложился в отведенное время.
     """
-    async with topic_service:
-        my_topics = await topic_service.get_my_topics()
+    topic_ids = await resolve_topic_ids(data.topic_ids, topic_service)
+
+    body = await search_engine.search(topic_ids=topic_ids, unique_ids=data.unique_ids,
+                                      match=data.match, sort=data.sort, limit=data.limit,
+                                      cursor=data.cursor, explain=data.explain, fields=data.fields,
+                                      max_time_ms=resolve_time_budget('search', headers.partner_id,
+                                                                      data.max_time_ms))
+
+    return Response(content=body, media_type='application/json')
+
+
+@router.post("/search/stream", response_class=StreamingResponse,
+             responses={200: {"content": {"application/x-ndjson": {}}},
+                        400: {"description": InvalidCursor.detail},
+                        403: {"description": PermissionsError.detail},
+                        422: {"description": QueryRejected.detail},
+                        504: {"description": TimeOutException.detail}})
+async def stream_messages(data: SearchQuery,
+                          search_engine: Annotated[SearchEngine, Depends(get_search_engine)],
+                          topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                          headers: Annotated[HeadersInput, Depends(get_headers)]) -> StreamingResponse:
+    """Получает сообщения по заданным критериям поиска в потоковом режиме.
+
+    Ответ передается в формате NDJSON: по одному сообщению в строке, последняя строка
+    содержит объект с ключом "unique_ids". Сообщения отправляются клиенту по мере чтения
+    из базы данных, поэтому большие выборки не накапливаются в памяти сервиса. Если время
+    выполнения истекает после начала ответа, последняя строка содержит ключ "error" и токен
+    для продолжения чтения.
+
+    Args:
+        data (SearchQuery): Данные запроса поиска.
+        search_engine (SearchEngine): Зависимость для поискового движка.
+        topic_service (TopicService): Зависимость для сервиса тем.
+        headers (HeadersInput): Заголовки запроса.
+
+    Returns:
+        StreamingResponse: Потоковый ответ с найденными сообщениями.
+
+    Raises:
+        PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанным темам
+            или в запросе используются небезопасные операторы.
+        InvalidCursor: Исключение, если токен продолжения поврежден или не подходит к сортировке.
+        QueryRejected: Исключение, если запрос использует неподдерживаемые операторы или слишком дорог.
+        TimeOutException: Исключение, если время выполнения истекло до отправки первого сообщения.
+    """
+    topic_ids = await resolve_topic_ids(data.topic_ids, topic_service)
+
+    lines = search_engine.stream(topic_ids=topic_ids, unique_ids=data.unique_ids,
+                                 match=data.match, sort=data.sort, limit=data.limit,
+                                 cursor=data.cursor, explain=data.explain, fields=data.fields,
+                                 max_time_ms=resolve_time_budget('stream', headers.partner_id, data.max_time_ms))
+    # Получаем первую строку до начала ответа, чтобы ошибки запроса вернулись с корректным статусом
+    first_line = await anext(lines)
+
+    async def body() -> AsyncIterator[bytes]:
+        yield first_line
+        async for line in lines:
+            yield line
+
+    return StreamingResponse(body(), media_type='application/x-ndjson')
+
+
+@router.post("/stats", responses={403: {"description": PermissionsError.detail},
+                                  422: {"description": StatsRangeTooLarge.detail}})
+async def get_stats(data: StatsQuery,
+                    topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                    messages_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> StatsOutput:
+    """Получает количество сообщений по темам и интервалам времени.
+
+    Счетчики ведутся при записи сообщений, поэтому запрос не читает сами сообщения.
+    Интервалы без сообщений в ответ не включаются.
+
+    Args:
+        data (StatsQuery): Данные запроса статистики.
+        topic_service (TopicService): Зависимость для сервиса тем.
+        messages_manager (MessagesManager): Зависимость для менеджера сообщений.
+
+    Returns:
+        StatsOutput: Количество сообщений по темам и интервалам.
+
+    Raises:
+        PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанным темам.
+        StatsRangeTooLarge: Исключение, если период содержит больше интервалов, чем разрешено сервисом.
+    """
+    if (data.end - data.start) / MessageStatsManager.GRANULARITIES[data.granularity] > config.stats.max_buckets:
+        raise StatsRangeTooLarge
+
+    topic_ids = await resolve_topic_ids(data.topic_ids, topic_service)
+    buckets = await messages_manager.get_stats(topic_ids, data.granularity, data.start, data.end)
+
+    return StatsOutput(granularity=data.granularity, buckets=[StatsBucket(**bucket) for bucket in buckets])
+
+
+@router.get("/stream", response_class=StreamingResponse,
+            responses={200: {"content": {"text/event-stream": {}}},
+                       400: {"description": InvalidResumeToken.detail},
+                       403: {"description": PermissionsError.detail}})
+async def stream_new_messages(topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                              feed: Annotated[MessageFeed, Depends(get_message_feed)],
+                              topic_ids: Annotated[Optional[List[int]], Query()] = None,
+                              resume_token: Optional[str] = None,
+                              last_event_id: Annotated[Optional[str], Header()] = None) -> StreamingResponse:
+    """Передает новые сообщения доступных тем по мере их записи в формате Server-Sent Events.
+
+    Каждое событие "message" содержит сообщение и идентификатор события. После переподключения
+    с заголовком Last-Event-ID или параметром resume_token клиент получает пропущенные сообщения.
+    Событие "error" завершает поток: "lagged" означает, что клиент не успевал читать сообщения
+    и должен переподключиться с идентификатором последнего полученного события. "resume_failed"
+    означает, что продолжить с указанного события нельзя: пропущенные сообщения нужно получить
+    через /messages/search и переподключиться без идентификатора.
+
+    Args:
+        topic_service (TopicService): Зависимость для сервиса тем.
+        feed (MessageFeed): Зависимость для потока новых сообщений.
+        topic_ids (Optional[List[int]], optional): Темы. По умолчанию все доступные темы.
+        resume_token (Optional[str], optional): Идентификатор последнего полученного события. По умолчанию None.
+        last_event_id (Optional[str], optional): Заголовок Last-Event-ID, который браузер передает
+            при переподключении. По умолчанию None.
+
+    Returns:
+        StreamingResponse: Потоковый ответ с новыми сообщениями.
+
+    Raises:
+        PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанным темам.
+        InvalidResumeToken: Исключение, если идентификатор события поврежден.
+    """
+    topic_ids = await resolve_topic_ids(topic_ids, topic_service)
+    listener = feed.listen(topic_ids, resume_token or last_event_id)
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            async for event in listener.events(config.stream.heartbeat_s):
+                yield encode_sse(event)
+            if listener.error != 'closed':
+                yield encode_sse(error=listener.error)
+        finally:
+            listener.close()
 
-        if data.topic_ids:
-            for topic_id in data.topic_ids:
-                if topic_id not in data.topic_ids:
-                    data.remove(topic_id)
+    return StreamingResponse(body(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-            if len(data.topic_ids) == 0:
-                raise PermissionsError
-        else:
-            data.topic_ids = my_topics
 
-    messages, unique_ids = await search_engine.search(topic_ids=data.topic_ids, unique_ids=data.unique_ids,
-                                                      match=data.match, sort=data.sort, limit=data.limit)
-    search_output = SearchOutput(messages=messages, unique_ids=unique_ids)
+@router.websocket("/stream/ws")
+async def stream_new_messages_ws(websocket: WebSocket,
+                                 topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                                 feed: Annotated[MessageFeed, Depends(get_message_feed)],
+                                 topic_ids: Annotated[Optional[List[int]], Query()] = None,
+                                 resume_token: Optional[str] = None) -> None:
+    """Передает новые сообщения доступных тем по мере их записи через WebSocket.
+
+    Каждое сообщение WebSocket содержит объект StreamEvent. Соединение закрывается с кодом 1008,
+    если запрос отклонен, и с кодом 1013 и причиной завершения, если сервис завершил поток.
+
+    Args:
+        websocket (WebSocket): WebSocket-соединение.
+        topic_service (TopicService): Зависимость для сервиса тем.
+        feed (MessageFeed): Зависимость для потока новых сообщений.
+        topic_ids (Optional[List[int]], optional): Темы. По умолчанию все доступные темы.
+        resume_token (Optional[str], optional): Идентификатор последнего полученного события. По умолчанию None.
+    """
+    try:
+        topic_ids = await resolve_topic_ids(topic_ids, topic_service)
+        listener = feed.listen(topic_ids, resume_token)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+
+    await websocket.accept()
+
+    async def wait_disconnect() -> None:
+        # Клиент ничего не отправляет: чтение нужно только для обнаружения отключения
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            listener.close()
+
+    receiver = asyncio.create_task(wait_disconnect())
+    try:
+        async for event in listener.events():
+            await websocket.send_text(event.model_dump_json())
+        if listener.error != 'closed':
+            await websocket.close(code=1013, reason=listener.error)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        listener.close()
 
-    return search_output
 
 @router.post('/send_all', responses={403: {"detail": PermissionsError.detail}, 429: {"detail": TooManyNotifier.detail}})
 async def send_all(data: SendAllQuery,
                    topic_service: Annotated[TopicService, Depends(get_topic_service)],
-                   messages_manager: Annotated[MessagesManager, Depends(get_messages_manager)],
-                   webhooks_notifier: Annotated[WebhooksNotifier, Depends(get_webhooks_notifier)]) -> SendOutput:
-    """Отправляет несколько сообщений и уведомляет через вебхуки, если требуется.
+                   messages_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> SendOutput:
+    """Сохраняет несколько сообщений и ставит в очередь уведомления через вебхуки, если требуется.
 
     Args:
         data (SendAllQuery): Данные запроса для отправки нескольких сообщений.
         topic_service (TopicService): Зависимость для сервиса тем.
         messages_manager (MessagesManager): Зависимость для менеджера сообщений.
-        webhooks_notifier (WebhooksNotifier): Зависимость для уведомителя вебхуков.
+
+    Returns:
+        SendOutput: Количество вебхуков, поставленных в очередь на доставку, и отброшенных повторов.
 
     Raises:
         TooManyNotifier: Исключение, если количество уведомлений превышает лимит.
@@ -74,54 +293,96 @@ async def send_all(data: SendAllQuery,
         raise TooManyNotifier
 
     async with topic_service:
-        if not topic_service.has_permission(data.topic_id):
+        if not await topic_service.has_permission(data.topic_id):
             raise PermissionsError
 
-        urls = await topic_service.get_urls(topic_id=data.topic_id)
+        subscriptions = await topic_service.get_subscriptions(topic_id=data.topic_id) if data.is_notify else []
+        retention = resolve_retention(await topic_service.get_retention_days(data.topic_id))
 
+    created_date = datetime.now()
     messages = [Message(unique_id=message.unique_id,
                         topic_id=data.topic_id,
-                        payload=message.payload) for message in data.payloads]
+                        payload=message.payload,
+                        idempotency_key=message.idempotency_key,
+                        created_date=created_date,
+                        expire_at=created_date + retention if retention else None) for message in data.payloads]
+
+    message_ids = await messages_manager.create_all_messages(messages, subscriptions)
+    saved = sum(message_id is not None for message_id in message_ids)
+
+    return SendOutput(webhooks_count=saved * len(subscriptions), duplicates=len(messages) - saved)
 
-    await messages_manager.create_all_messages(messages)
 
-    webhooks_count = 0
-    if data.is_notify:
-        for message in messages:
-            async with webhooks_notifier:
+@router.post('/ingest', responses={403: {"description": PermissionsError.detail}},
+             openapi_extra={"requestBody": {"required": True,
+                                            "content": {"application/x-ndjson": {"schema": {"type": "string"}}}}})
+async def ingest_messages(request: Request, topic_id: int,
+                          topic_service: Annotated[TopicService, Depends(get_topic_service)],
+                          ingestor: Annotated[MessagesIngestor, Depends(get_messages_ingestor)],
+                          is_notify: bool = False) -> IngestOutput:
+    """Сохраняет сообщения из тела запроса в формате NDJSON и ставит в очередь уведомления, если требуется.
+
+    Каждая строка тела содержит объект Payload. Тело разбирается по мере получения и записывается
+    порциями, поэтому размер загрузки не ограничен памятью сервиса. Некорректные строки
+    не прерывают загрузку и возвращаются в ответе с номерами строк.
+
+    Args:
+        request (Request): Объект запроса FastAPI.
+        topic_id (int): Идентификатор темы.
+        topic_service (TopicService): Зависимость для сервиса тем.
+        ingestor (MessagesIngestor): Зависимость для загрузчика сообщений.
+        is_notify (bool, optional): Ставить ли в очередь уведомления через вебхуки. По умолчанию False.
+
+    Returns:
+        IngestOutput: Количество сохраненных и отклоненных строк, ошибки по номерам строк
+            и количество вебхуков, поставленных в очередь на доставку.
+
+    Raises:
+        PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанной теме.
+    """
+    async with topic_service:
+        if not await topic_service.has_permission(topic_id):
+            raise PermissionsError
+
+        subscriptions = await topic_service.get_subscriptions(topic_id=topic_id) if is_notify else []
+        retention = resolve_retention(await topic_service.get_retention_days(topic_id))
+
+    return await ingestor.ingest(topic_id, request.stream(), subscriptions, retention)
+
 
-                webhooks_count += await webhooks_notifier.notify(message, *urls)
-    return SendOutput(webhooks_count=webhooks_count)
 @router.post('/send', responses={403: {"description": PermissionsError.detail}})
 async def send_message(data: SendQuery,
                        topic_service: Annotated[TopicService, Depends(get_topic_service)],
-                       messages_manager: Annotated[MessagesManager, Depends(get_messages_manager)],
-                       webhooks_notifier: Annotated[WebhooksNotifier, Depends(get_webhooks_notifier)]) -> SearchOutput:
-    """Отправляет одно сообщение и уведомляет через вебхуки, если требуется.
+                       messages_manager: Annotated[MessagesManager, Depends(get_messages_manager)]) -> SendOutput:
+    """Сохраняет одно сообщение и ставит в очередь уведомления через вебхуки, если требуется.
 
     Args:
         data (SendQuery): Данные запроса для отправки сообщения.
         topic_service (TopicService): Зависимость для сервиса тем.
         messages_manager (MessagesManager): Зависимость для менеджера сообщений.
-        webhooks_notifier (WebhooksNotifier): Зависимость для уведомителя вебхуков.
+
+    Returns:
+        SendOutput: Количество вебхуков, поставленных в очередь на доставку, и отброшенных повторов.
 
     Raises:
         PermissionsError: Исключение, если у пользователя нет разрешений на доступ к указанной теме.
     """
     async with topic_service:
-        if not topic_service.has_permission(data.topic_id):
+        if not await topic_service.has_permission(data.topic_id):
             raise PermissionsError
 
-        urls = await topic_service.get_urls(topic_id=data.topic_id)
+        subscriptions = await topic_service.get_subscriptions(topic_id=data.topic_id) if data.is_notify else []
+        retention = resolve_retention(await topic_service.get_retention_days(data.topic_id))
 
+    created_date = datetime.now()
     message = Message(unique_id=data.unique_id,
                       topic_id=data.topic_id,
-                      payload=data.payload)
+                      payload=data.payload,
+                      idempotency_key=data.idempotency_key,
+                      created_date=created_date,
+                      expire_at=created_date + retention if retention else None)
 
-    await messages_manager.create_message(message)
+    if await messages_manager.create_message(message, subscriptions) is None:
+        return SendOutput(webhooks_count=0, duplicates=1)
 
-    webhooks_count = 0
-    if data.is_notify:
-        async with webhooks_notifier:
-            webhooks_count = await webhooks_notifier.notify(message, *urls)
-    return SearchOutput(webhooks_count=webhooks_count)
+    return SendOutput(webhooks_count=len(subscriptions))
@@ -1,7 +1,8 @@
-from typing import Any, Optional, List
+from datetime import datetime
+from typing import Any, Optional, List, Literal
 
 from fastapi import Body
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class SearchQuery(BaseModel):
@@ -13,12 +14,41 @@ class SearchQuery(BaseModel):
         unique_ids (Optional[List[int]]): Список уникальных идентификаторов сообщений для поиска.
         match (Optional[dict]): Критерии для сопоставления.
         sort (Optional[dict]): Параметры сортировки.
+        cursor (Optional[str]): Токен продолжения из поля next_cursor предыдущей страницы.
+        explain (bool): Только проверить запрос и вернуть оценку его выполнения, не выполняя поиск.
+        max_time_ms (Optional[int]): Время выполнения запроса в миллисекундах, если клиенту нужно меньше
+            установленного сервисом.
+        fields (Optional[List[str]]): Поля payload, которые нужно вернуть, через точку для вложенных полей.
+            По умолчанию возвращается весь payload.
     """
     limit: Optional[int] = None
     topic_ids: Optional[List[int]] = None
     unique_ids: Optional[List[int]] = None
     match: Optional[dict] = None
     sort: Optional[dict] = None
+    cursor: Optional[str] = None
+    explain: bool = False
+    max_time_ms: Optional[int] = Field(default=None, gt=0)
+    fields: Optional[List[str]] = Field(default=None, min_length=1, max_length=100)
+
+    @field_validator('fields')
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        """Проверяет, что поля payload указаны непустыми путями без операторов.
+
+        Args:
+            fields (Optional[List[str]]): Поля payload.
+
+        Returns:
+            Optional[List[str]]: Поля payload без изменений.
+
+        Raises:
+            ValueError: Если путь к полю пустой или содержит оператор.
+        """
+        for field in fields or []:
+            if any(not part or part.startswith('$') for part in field.split('.')):
+                raise ValueError(f'Invalid payload field path: {field!r}')
+        return fields
 
 class SendQuery(BaseModel):
     """Модель для запроса отправки одного сообщения.
@@ -28,11 +58,14 @@ class SendQuery(BaseModel):
         unique_id (Optional[int]): Уникальный идентификатор сообщения.
         payload (Any): Содержимое сообщения.
         is_notify (Optional[bool]): Флаг, указывающий, нужно ли отправлять уведомление.
+        idempotency_key (Optional[str]): Ключ события. Повторная отправка сообщения с тем же ключом,
+            темой и уникальным идентификатором не сохраняется и не доставляется подписчикам.
     """
     topic_id: int
     unique_id: Optional[int] = None
     payload: Any = Body(None)
     is_notify: Optional[bool] = None
+    idempotency_key: Optional[str] = Field(default=None, min_length=1, max_length=256)
 
 class Payload(BaseModel):
     """Модель для описания полезной нагрузки сообщения.
@@ -40,9 +73,11 @@ class Payload(BaseModel):
     Атрибуты:
         payload (dict): Содержимое сообщения.
         unique_id (Optional[int]): Уникальный идентификатор сообщения.
+        idempotency_key (Optional[str]): Ключ события для отбрасывания повторной отправки.
     """
     payload: dict
     unique_id: Optional[int] = None
+    idempotency_key: Optional[str] = Field(default=None, min_length=1, max_length=256)
 
 class SendAllQuery(BaseModel):
     """Модель для запроса отправки нескольких сообщений.
@@ -55,3 +90,31 @@ class SendAllQuery(BaseModel):
     topic_id: int
     payloads: List[Payload]
     is_notify: Optional[bool] = None
+
+class StatsQuery(BaseModel):
+    """Модель для запроса количества сообщений по интервалам времени.
+
+    Атрибуты:
+        topic_ids (Optional[List[int]]): Список идентификаторов тем. По умолчанию все доступные темы.
+        granularity (Literal['hour', 'day']): Длительность интервала.
+        start (datetime): Начало периода.
+        end (datetime): Конец периода, не включая.
+    """
+    topic_ids: Optional[List[int]] = None
+    granularity: Literal['hour', 'day'] = 'hour'
+    start: datetime
+    end: datetime
+
+    @model_validator(mode='after')
+    def check_period(self) -> 'StatsQuery':
+        """Проверяет, что конец периода позже его начала.
+
+        Returns:
+            StatsQuery: Запрос без изменений.
+
+        Raises:
+            ValueError: Если конец периода не позже начала.
+        """
+        if self.end <= self.start:
+            raise ValueError('end must be later than start')
+        return self
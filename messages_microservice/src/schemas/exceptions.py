@@ -16,3 +16,23 @@ TimeOutException = HTTPException(
     status_code=504,
     detail="The request timed out. Please try again later."
 )
+
+InvalidCursor = HTTPException(
+    status_code=400,
+    detail="Invalid pagination cursor."
+)
+
+QueryRejected = HTTPException(
+    status_code=422,
+    detail="The query uses unsupported operators or is too expensive. Send it with explain=true to see why."
+)
+
+StatsRangeTooLarge = HTTPException(
+    status_code=422,
+    detail="The requested period contains too many intervals. Narrow the period or use a coarser granularity."
+)
+
+InvalidResumeToken = HTTPException(
+    status_code=400,
+    detail="Invalid resume token."
+)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional, List
 
 from pydantic import BaseModel, Field
@@ -16,15 +17,75 @@ class MessageOutput(BaseModel):
     unique_id: Optional[int] = None
 
 
+class StreamEvent(BaseModel):
+    """Модель для представления нового сообщения в потоке /messages/stream.
+
+    Атрибуты:
+        id (str): Идентификатор события для продолжения потока после переподключения.
+        message (MessageOutput): Новое сообщение.
+    """
+    id: str
+    message: MessageOutput
+
+
+class QueryExplanation(BaseModel):
+    """Модель для представления результата проверки поискового запроса.
+
+    Атрибуты:
+        accepted (bool): Будет ли запрос выполнен.
+        expensive (bool): Требует ли запрос просмотра всех сообщений тем или сортировки в памяти.
+        index (Optional[str]): Индекс, который ожидается использовать для запроса.
+        blocking_sort (bool): Требуется ли сортировка в памяти.
+        reasons (List[str]): Причины отклонения запроса и высокой оценки стоимости.
+    """
+    accepted: bool = True
+    expensive: bool = False
+    index: Optional[str] = None
+    blocking_sort: bool = False
+    reasons: List[str] = Field(default_factory=list)
+
+
 class SearchOutput(BaseModel):
     """Модель для представления результатов поиска сообщений.
 
     Атрибуты:
         messages (List[MessageOutput]): Список сообщений, соответствующих критериям поиска.
         unique_ids (List[int]): Список уникальных идентификаторов сообщений, соответствующих критериям поиска.
+        next_cursor (Optional[str]): Токен для получения следующей страницы или None, если страница последняя.
+        explain (Optional[QueryExplanation]): Результат проверки запроса, если запрошен пробный запуск.
     """
     messages: List[MessageOutput] = Field(default_factory=list)
     unique_ids: List[int] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
+    explain: Optional[QueryExplanation] = None
+
+
+class IngestError(BaseModel):
+    """Модель для представления ошибки в строке загружаемого потока.
+
+    Атрибуты:
+        line (int): Номер строки, начиная с 1.
+        error (str): Описание ошибки.
+    """
+    line: int
+    error: str
+
+
+class IngestOutput(BaseModel):
+    """Модель для представления результатов загрузки сообщений.
+
+    Атрибуты:
+        accepted (int): Количество сохраненных сообщений.
+        failed (int): Количество отклоненных строк.
+        duplicates (int): Количество строк, отброшенных как повторы по ключу идемпотентности.
+        errors (List[IngestError]): Ошибки по номерам строк, не больше установленного сервисом количества.
+        webhooks_count (int): Количество вебхуков, поставленных в очередь на доставку.
+    """
+    accepted: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    errors: List[IngestError] = Field(default_factory=list)
+    webhooks_count: int = 0
 
 
 class SendOutput(BaseModel):
@@ -32,5 +93,31 @@ class SendOutput(BaseModel):
 
         Атрибуты:
             messages (List[MessageOutput]): Количество вебхуков, которые были вызваны.
+            duplicates (int): Количество сообщений, отброшенных как повторы по ключу идемпотентности.
         """
-    webhooks_count: int
\ No newline at end of file
+    webhooks_count: int
+    duplicates: int = 0
+
+
+class StatsBucket(BaseModel):
+    """Модель для представления количества сообщений темы за интервал времени.
+
+    Атрибуты:
+        topic_id (int): Идентификатор темы.
+        start (datetime): Начало интервала.
+        count (int): Количество сообщений.
+    """
+    topic_id: int
+    start: datetime
+    count: int
+
+
+class StatsOutput(BaseModel):
+    """Модель для представления количества сообщений по интервалам времени.
+
+    Атрибуты:
+        granularity (str): Длительность интервала.
+        buckets (List[StatsBucket]): Интервалы с сообщениями по возрастанию темы и начала интервала.
+    """
+    granularity: str
+    buckets: List[StatsBucket] = Field(default_factory=list)
@@ -0,0 +1,275 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Callable, Awaitable, Dict, Optional, Tuple
+
+from anika_metrics import metrics
+
+
+class TTLCache:
+    """Кэш в памяти процесса с ограниченным временем жизни записей и вытеснением по LRU.
+
+    Отрицательные результаты (например, отсутствие прав) хранятся отдельно заданное, обычно
+    более короткое время. Одновременные промахи по одному ключу выполняют загрузку один раз.
+
+    Атрибуты:
+        _name (str): Имя кэша в метриках.
+        _max_size (int): Максимальное количество записей.
+        _ttl (float): Время жизни записи в секундах.
+        _negative_ttl (float): Время жизни отрицательной записи в секундах.
+        _entries (OrderedDict[Hashable, Tuple[float, Any]]): Записи в порядке последнего обращения.
+        _loading (Dict[Hashable, asyncio.Future]): Выполняющиеся загрузки по ключу.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_s: float, negative_ttl_s: float):
+        """Инициализирует экземпляр TTLCache.
+
+        Args:
+            name (str): Имя кэша в метриках.
+            max_size (int): Максимальное количество записей.
+            ttl_s (float): Время жизни записи в секундах.
+            negative_ttl_s (float): Время жизни отрицательной записи в секундах.
+        """
+        self._name = name
+        self._max_size = max_size
+        self._ttl = ttl_s
+        self._negative_ttl = negative_ttl_s
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._hits = metrics.counter('cache_hits_total', 'Попадания в кэш', labels=('cache',)).labels(cache=name)
+        self._misses = metrics.counter('cache_misses_total', 'Промахи кэша', labels=('cache',)).labels(cache=name)
+        self._evictions = metrics.counter('cache_evictions_total', 'Записи, вытесненные из кэша по размеру',
+                                          labels=('cache',)).labels(cache=name)
+        self._size = metrics.gauge('cache_size', 'Количество записей в кэше', labels=('cache',)).labels(cache=name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Возвращает значение из кэша, если оно есть и не устарело.
+
+        Args:
+            key (Hashable): Ключ записи.
+
+        Returns:
+            Tuple[bool, Any]: Признак наличия записи и ее значение.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._size.set(len(self._entries))
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, negative: bool = False) -> None:
+        """Сохраняет значение в кэш, вытесняя давно не использованные записи при переполнении.
+
+        Args:
+            key (Hashable): Ключ записи.
+            value (Any): Значение.
+            negative (bool, optional): Хранить запись как отрицательную. По умолчанию False.
+        """
+        ttl = self._negative_ttl if negative else self._ttl
+        if ttl <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions.inc()
+        self._size.set(len(self._entries))
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удаляет запись из кэша.
+
+        Args:
+            key (Hashable): Ключ записи.
+        """
+        if self._entries.pop(key, None) is not None:
+            self._size.set(len(self._entries))
+
+    def clear(self) -> None:
+        """Удаляет все записи из кэша."""
+        self._entries.clear()
+        self._size.set(0)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          is_negative: Callable[[Any], bool] = lambda value: not value) -> Any:
+        """Возвращает значение из кэша или загружает его и сохраняет в кэш.
+
+        Ошибки загрузки не кэшируются и передаются всем ожидающим этот ключ.
+
+        Args:
+            key (Hashable): Ключ записи.
+            loader (Callable[[], Awaitable[Any]]): Функция загрузки значения при промахе.
+            is_negative (Callable[[Any], bool], optional): Определяет, является ли значение отрицательным.
+                По умолчанию отрицательными считаются пустые и ложные значения.
+
+        Returns:
+            Any: Значение из кэша или загруженное значение.
+        """
+        found, value = self.get(key)
+        if found:
+            self._hits.inc()
+            return value
+
+        self._misses.inc()
+        task = self._loading.get(key)
+        if task is None:
+            # Загрузка выполняется отдельной задачей, чтобы отмена одного запроса не прерывала ее для остальных
+            task = asyncio.ensure_future(loader())
+            self._loading[key] = task
+            task.add_done_callback(lambda done: self._on_loaded(key, done, is_negative))
+
+        return await asyncio.shield(task)
+
+    def _on_loaded(self, key: Hashable, task: asyncio.Future, is_negative: Callable[[Any], bool]) -> None:
+        """Сохраняет результат завершившейся загрузки в кэш.
+
+        Args:
+            key (Hashable): Ключ записи.
+            task (asyncio.Future): Завершившаяся загрузка.
+            is_negative (Callable[[Any], bool]): Определяет, является ли значение отрицательным.
+        """
+        del self._loading[key]
+        if not task.cancelled() and task.exception() is None:
+            self.set(key, task.result(), negative=is_negative(task.result()))
+
+
+class VersionedCache:
+    """LRU-кэш значений, которые действительны, пока не изменились версии их источников.
+
+    Вместо времени жизни каждая запись хранит версии данных, из которых она получена. При чтении
+    записи с устаревшими версиями считаются промахом и удаляются. Размер кэша ограничен
+    как количеством записей, так и суммарным объемом значений. Данные могут исчезать и без изменения
+    версий (например, удаляться MongoDB по TTL-индексу), поэтому возраст записей дополнительно
+    ограничивается max_age_s.
+
+    Атрибуты:
+        _name (str): Имя кэша в метриках.
+        _max_entries (int): Максимальное количество записей.
+        _max_bytes (int): Максимальный суммарный объем значений в байтах.
+        _max_age (Optional[float]): Максимальный возраст записи в секундах.
+        _entries (OrderedDict[Hashable, Tuple[Any, Any, int, float]]): Версии, значение, объем и время
+            сохранения записей в порядке последнего обращения.
+        _bytes (int): Текущий суммарный объем значений в байтах.
+    """
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, max_age_s: Optional[float] = None):
+        """Инициализирует экземпляр VersionedCache.
+
+        Args:
+            name (str): Имя кэша в метриках.
+            max_entries (int): Максимальное количество записей.
+            max_bytes (int): Максимальный суммарный объем значений в байтах.
+            max_age_s (Optional[float], optional): Максимальный возраст записи в секундах.
+                По умолчанию записи действительны до изменения версий.
+        """
+        self._name = name
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._max_age = max_age_s
+        self._entries: OrderedDict[Hashable, Tuple[Any, Any, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lookups = 0
+        self._hit_count = 0
+        self._hits = metrics.counter('cache_hits_total', 'Попадания в кэш', labels=('cache',)).labels(cache=name)
+        self._misses = metrics.counter('cache_misses_total', 'Промахи кэша', labels=('cache',)).labels(cache=name)
+        self._evictions = metrics.counter('cache_evictions_total', 'Записи, вытесненные из кэша по размеру',
+                                          labels=('cache',)).labels(cache=name)
+        self._size = metrics.gauge('cache_size', 'Количество записей в кэше', labels=('cache',)).labels(cache=name)
+        self._size_bytes = metrics.gauge('cache_bytes', 'Объем значений в кэше в байтах',
+                                         labels=('cache',)).labels(cache=name)
+        self._hit_ratio = metrics.gauge('cache_hit_ratio', 'Доля попаданий в кэш с момента запуска',
+                                        labels=('cache',)).labels(cache=name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        """Возвращает суммарный объем значений в кэше в байтах."""
+        return self._bytes
+
+    def get(self, key: Hashable, versions: Any) -> Tuple[bool, Any]:
+        """Возвращает значение из кэша, если оно получено из данных указанных версий и не старше max_age_s.
+
+        Args:
+            key (Hashable): Ключ записи.
+            versions (Any): Текущие версии источников значения.
+
+        Returns:
+            Tuple[bool, Any]: Признак попадания и значение.
+        """
+        self._lookups += 1
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] != versions or self._is_expired(entry[3])):
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            self._misses.inc()
+            self._update_gauges()
+            return False, None
+
+        self._hit_count += 1
+        self._hits.inc()
+        self._entries.move_to_end(key)
+        self._update_gauges()
+        return True, entry[1]
+
+    def set(self, key: Hashable, versions: Any, value: Any, size: int) -> None:
+        """Сохраняет значение в кэш, вытесняя давно не использованные записи при переполнении.
+
+        Значения больше допустимого объема кэша не сохраняются.
+
+        Args:
+            key (Hashable): Ключ записи.
+            versions (Any): Версии источников, из которых получено значение.
+            value (Any): Значение.
+            size (int): Объем значения в байтах.
+        """
+        if key in self._entries:
+            self._remove(key)
+        if size > self._max_bytes:
+            return
+
+        self._entries[key] = (versions, value, size, time.monotonic())
+        self._bytes += size
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._evictions.inc()
+        self._update_gauges()
+
+    def _remove(self, key: Hashable) -> None:
+        """Удаляет запись из кэша.
+
+        Args:
+            key (Hashable): Ключ записи.
+        """
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _is_expired(self, stored_at: float) -> bool:
+        """Проверяет, превысила ли запись максимальный возраст.
+
+        Args:
+            stored_at (float): Время сохранения записи по time.monotonic().
+
+        Returns:
+            bool: True, если запись старше max_age_s.
+        """
+        return self._max_age is not None and time.monotonic() - stored_at >= self._max_age
+
+    def _update_gauges(self) -> None:
+        """Обновляет метрики размера кэша и доли попаданий."""
+        self._size.set(len(self._entries))
+        self._size_bytes.set(self._bytes)
+        self._hit_ratio.set(self._hit_count / self._lookups if self._lookups else 0)
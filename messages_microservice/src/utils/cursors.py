@@ -0,0 +1,141 @@
+import base64
+import binascii
+from typing import List, Tuple, Any, Dict, Optional, Mapping
+
+from bson import json_util
+
+from src.schemas.exceptions import InvalidCursor
+
+SortSpec = List[Tuple[str, int]]
+
+
+def keyset_sort(sort: Optional[dict]) -> Optional[SortSpec]:
+    """Формирует порядок сортировки для постраничного вывода по ключу.
+
+    К пользовательской сортировке добавляется поле _id, чтобы порядок документов был
+    однозначным и каждую страницу можно было продолжить с последнего документа.
+
+    Args:
+        sort (Optional[dict]): Параметры сортировки из запроса.
+
+    Returns:
+        Optional[SortSpec]: Порядок сортировки или None, если сортировка не поддерживает продолжение
+            (например, используется сортировка по $meta).
+    """
+    spec = list((sort or {}).items())
+    if any(direction not in (1, -1) for _, direction in spec):
+        return None
+
+    if not any(field == '_id' for field, _ in spec):
+        spec.append(('_id', spec[-1][1] if spec else 1))
+
+    return spec
+
+
+def encode_cursor(sort: SortSpec, document: Mapping[str, Any]) -> str:
+    """Кодирует позицию документа в непрозрачный токен продолжения.
+
+    Args:
+        sort (SortSpec): Порядок сортировки страницы.
+        document (Mapping[str, Any]): Последний документ страницы.
+
+    Returns:
+        str: Токен продолжения.
+    """
+    values = [_get_field(document, field) for field, _ in sort]
+    data = json_util.dumps({'s': sort, 'v': values})
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    """Декодирует токен продолжения и проверяет, что он выдан для того же порядка сортировки.
+
+    Args:
+        cursor (str): Токен продолжения.
+        sort (SortSpec): Порядок сортировки текущего запроса.
+
+    Returns:
+        List[Any]: Значения полей сортировки последнего документа предыдущей страницы.
+
+    Raises:
+        InvalidCursor: Исключение, если токен поврежден или выдан для другой сортировки.
+    """
+    try:
+        data = json_util.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        cursor_sort = [(field, direction) for field, direction in data['s']]
+        values = data['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor
+
+    if cursor_sort != sort or len(values) != len(sort):
+        raise InvalidCursor
+
+    return values
+
+
+def keyset_match(sort: SortSpec, values: List[Any]) -> Dict[str, Any]:
+    """Формирует условие выбора документов, следующих за позицией токена.
+
+    Для сортировки (a, b, _id) условие имеет вид
+    a > va или (a = va и b > vb) или (a = va и b = vb и _id > v_id),
+    что позволяет MongoDB начать чтение индекса сразу с нужной позиции вместо пропуска документов.
+
+    Отсутствующие поля и null учитываются по порядку сортировки BSON, в котором они идут раньше
+    любых других значений. Сравнения $gt и $lt не находят null, поэтому для них строятся отдельные
+    условия, иначе страница, закончившаяся на null, была бы последней.
+
+    Args:
+        sort (SortSpec): Порядок сортировки.
+        values (List[Any]): Значения полей сортировки последнего документа предыдущей страницы.
+
+    Returns:
+        Dict[str, Any]: Условие для этапа $match.
+    """
+    conditions = []
+    for i, (field, direction) in enumerate(sort):
+        following = _following(field, direction, values[i])
+        if following is None:
+            continue
+        condition = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        condition.update(following)
+        conditions.append(condition)
+
+    return conditions[0] if len(conditions) == 1 else {'$or': conditions}
+
+
+def _following(field: str, direction: int, value: Any) -> Optional[Dict[str, Any]]:
+    """Формирует условие на поле, значение которого следует за значением токена.
+
+    Args:
+        field (str): Поле сортировки.
+        direction (int): Направление сортировки: 1 или -1.
+        value (Any): Значение поля в последнем документе предыдущей страницы.
+
+    Returns:
+        Optional[Dict[str, Any]]: Условие на поле или None, если за значением ничего не следует.
+    """
+    if value is None:
+        # По возрастанию после null идут все заданные значения, по убыванию после null ничего нет
+        return {field: {'$ne': None}} if direction == 1 else None
+    if direction == 1 or field == '_id':
+        return {field: {'$gt' if direction == 1 else '$lt': value}}
+    # По убыванию после всех заданных значений идут документы с null и без поля; _id задан всегда
+    return {'$or': [{field: {'$lt': value}}, {field: None}]}
+
+
+def _get_field(document: Mapping[str, Any], path: str) -> Any:
+    """Возвращает значение поля документа по пути с точками.
+
+    Args:
+        document (Mapping[str, Any]): Документ.
+        path (str): Путь к полю, например 'payload.created'.
+
+    Returns:
+        Any: Значение поля или None, если поле отсутствует.
+    """
+    value: Any = document
+    for key in path.split('.'):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(key)
+    return value
@@ -0,0 +1,47 @@
+from typing import Any, List
+
+import orjson
+
+# Даты передаются через default=str, как при сериализации модулем json
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def encode_body(body: Any) -> bytes:
+    """Сериализует тело вебхука в JSON.
+
+    Значения, которые не поддерживаются JSON (даты, ObjectId), передаются строками.
+
+    Args:
+        body (Any): Сообщение для отправки.
+
+    Returns:
+        bytes: JSON в кодировке UTF-8.
+    """
+    return orjson.dumps(body, default=str, option=ORJSON_OPTIONS)
+
+
+def encode_response(body: Any) -> bytes:
+    """Сериализует тело ответа API в JSON без построения моделей Pydantic.
+
+    Даты записываются в формате ISO 8601, как при сериализации моделей ответа,
+    поэтому ответ совпадает с ответом, собранным через модели.
+
+    Args:
+        body (Any): Тело ответа из словарей, списков и простых значений.
+
+    Returns:
+        bytes: JSON в кодировке UTF-8.
+    """
+    return orjson.dumps(body, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def join_bodies(bodies: List[bytes]) -> bytes:
+    """Собирает JSON-массив из уже сериализованных элементов без повторной сериализации.
+
+    Args:
+        bodies (List[bytes]): Сериализованные элементы.
+
+    Returns:
+        bytes: JSON-массив.
+    """
+    return b'[' + b','.join(bodies) + b']'
@@ -0,0 +1,388 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Any, List, Mapping, Optional, Sequence, Set, Tuple
+
+from pymongo.errors import OperationFailure
+from anika_metrics import metrics
+
+from src.database.repository import MongoDBRepository
+from src.schemas.exceptions import InvalidResumeToken
+from src.schemas.responses import MessageOutput, StreamEvent
+
+logger = logging.getLogger(__name__)
+
+# Отбирает вставки сообщений в коллекции 'messages' и в месячные коллекции
+CHANGES_PIPELINE = [{'$match': {'operationType': 'insert', 'ns.coll': {'$regex': r'^messages(_\d{4}_\d{2})?$'}}}]
+# Коды ошибок MongoDB, после которых поток нельзя продолжить с сохраненного токена
+RESUME_FAILED_ERRORS = (260, 280, 286)
+RESUME_TOKEN_PATTERN = re.compile(r'^[0-9A-Fa-f]{1,1024}$')
+
+
+def decode_resume_token(resume_token: str) -> Dict[str, Any]:
+    """Преобразует токен продолжения клиента в токен потока изменений MongoDB.
+
+    Args:
+        resume_token (str): Идентификатор последнего полученного клиентом события.
+
+    Returns:
+        Dict[str, Any]: Токен потока изменений.
+
+    Raises:
+        InvalidResumeToken: Исключение, если токен поврежден.
+    """
+    if not RESUME_TOKEN_PATTERN.match(resume_token):
+        raise InvalidResumeToken
+    return {'_data': resume_token}
+
+
+def encode_sse(event: Optional[StreamEvent] = None, error: Optional[str] = None) -> bytes:
+    """Формирует событие Server-Sent Events.
+
+    Args:
+        event (Optional[StreamEvent], optional): Новое сообщение. По умолчанию None.
+        error (Optional[str], optional): Причина завершения потока. По умолчанию None.
+
+    Returns:
+        bytes: Событие с сообщением, событие ошибки или комментарий для поддержания соединения,
+            если не передано ни сообщение, ни ошибка.
+    """
+    if event is not None:
+        return f'id: {event.id}\nevent: message\ndata: {event.message.model_dump_json()}\n\n'.encode()
+    if error is not None:
+        return f'event: error\ndata: {{"error": "{error}"}}\n\n'.encode()
+    return b': keepalive\n\n'
+
+
+class FeedListener:
+    """Подписка клиента на новые сообщения тем.
+
+    События копятся в ограниченной очереди. Если клиент не успевает их читать, подписка
+    завершается с ошибкой 'lagged', и клиент переподключается с идентификатором последнего
+    полученного события.
+
+    Атрибуты:
+        topic_ids (Set[int]): Темы, сообщения которых получает клиент.
+        error (Optional[str]): Причина завершения подписки.
+        task (Optional[asyncio.Task]): Собственный поток изменений, если подписка продолжается
+            с события, которого уже нет в памяти процесса.
+        _feed (MessageFeed): Поток, к которому подключена подписка.
+        _backlog (Deque[StreamEvent]): События, пропущенные клиентом до переподключения.
+        _queue (asyncio.Queue): Новые события; None завершает подписку.
+    """
+
+    def __init__(self, feed: 'MessageFeed', topic_ids: Set[int], queue_size: int,
+                 backlog: Sequence[StreamEvent] = ()):
+        """Инициализирует экземпляр FeedListener.
+
+        Args:
+            feed (MessageFeed): Поток, к которому подключена подписка.
+            topic_ids (Set[int]): Темы, сообщения которых получает клиент.
+            queue_size (int): Количество событий, ожидающих отправки клиенту.
+            backlog (Sequence[StreamEvent], optional): События, пропущенные клиентом. По умолчанию пусто.
+        """
+        self.topic_ids = topic_ids
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._feed = feed
+        self._backlog = deque(backlog)
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+
+    def offer(self, event: StreamEvent) -> bool:
+        """Добавляет событие в очередь клиента.
+
+        Args:
+            event (StreamEvent): Новое сообщение.
+
+        Returns:
+            bool: False, если очередь клиента заполнена.
+        """
+        if self.error is not None:
+            return True
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, event: StreamEvent) -> None:
+        """Добавляет событие в очередь клиента, ожидая освобождения места.
+
+        Используется собственным потоком подписки: пока клиент не прочитает события,
+        чтение потока изменений приостанавливается.
+
+        Args:
+            event (StreamEvent): Новое сообщение.
+        """
+        if self.error is None:
+            await self._queue.put(event)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """Завершает подписку после отправки уже полученных событий.
+
+        Args:
+            error (Optional[str], optional): Причина завершения. По умолчанию None.
+        """
+        if self.error is not None:
+            return
+        self.error = error or 'closed'
+        # Место для завершающего None освобождается за счет событий, которые клиент получит при переподключении
+        while self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def events(self, heartbeat_s: Optional[float] = None) -> AsyncIterator[Optional[StreamEvent]]:
+        """Возвращает события подписки по мере поступления.
+
+        Args:
+            heartbeat_s (Optional[float], optional): Интервал, после которого при отсутствии событий
+                возвращается None. По умолчанию события ожидаются без ограничения.
+
+        Yields:
+            Optional[StreamEvent]: Новое сообщение или None для поддержания соединения.
+        """
+        while self._backlog:
+            yield self._backlog.popleft()
+
+        while True:
+            try:
+                event = await asyncio.wait_for(self._queue.get(), heartbeat_s)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                return
+            yield event
+
+    def close(self) -> None:
+        """Отключает подписку от потока."""
+        self.finish()
+        if self.task is not None:
+            self.task.cancel()
+        self._feed.remove(self)
+
+
+class MessageFeed:
+    """Общий для процесса поток новых сообщений.
+
+    Один поток изменений MongoDB раздается в памяти всем подключенным клиентам, поэтому
+    количество клиентов не увеличивает нагрузку на базу данных. Поток открывается при
+    подключении первого клиента и после ошибок переоткрывается с последнего полученного события.
+
+    Последние replay_size событий хранятся в памяти: клиент, переподключившийся с идентификатором
+    одного из них, получает пропущенные события без обращения к базе данных. Для более старых
+    идентификаторов клиенту открывается собственный поток изменений. Таких потоков открывается
+    не больше max_resumed: остальные клиенты получают ошибку 'resume_failed'.
+
+    Атрибуты:
+        _repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных MongoDB.
+        _queue_size (int): Количество событий, ожидающих отправки одному клиенту.
+        _retry_delay (float): Задержка перед повторным открытием потока после ошибки в секундах.
+        _max_resumed (int): Наибольшее количество собственных потоков изменений.
+        _replay (Deque[StreamEvent]): Последние события.
+        _listeners (Set[FeedListener]): Подключенные клиенты.
+        _resumed (Set[FeedListener]): Клиенты с собственным потоком изменений.
+        _resume_after (Optional[Mapping[str, Any]]): Токен последнего полученного события.
+        _task (Optional[asyncio.Task]): Чтение общего потока изменений.
+    """
+
+    def __init__(self, repository: MongoDBRepository, queue_size: int = 1000, replay_size: int = 10000,
+                 retry_delay_s: float = 1, max_resumed: int = 100):
+        """Инициализирует экземпляр MessageFeed.
+
+        Args:
+            repository (MongoDBRepository): Репозиторий для взаимодействия с базой данных.
+            queue_size (int, optional): Количество событий, ожидающих отправки одному клиенту. По умолчанию 1000.
+            replay_size (int, optional): Количество последних событий в памяти. По умолчанию 10000.
+            retry_delay_s (float, optional): Задержка перед повторным открытием потока после ошибки
+                в секундах. По умолчанию 1.
+            max_resumed (int, optional): Наибольшее количество собственных потоков изменений клиентов,
+                продолжающих чтение с событий, которых уже нет в памяти. По умолчанию 100.
+        """
+        self._repository = repository
+        self._queue_size = queue_size
+        self._retry_delay = retry_delay_s
+        self._max_resumed = max_resumed
+        self._replay: Deque[StreamEvent] = deque(maxlen=replay_size)
+        self._listeners: Set[FeedListener] = set()
+        self._resumed: Set[FeedListener] = set()
+        self._resume_after: Optional[Mapping[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners_gauge = metrics.gauge('stream_listeners', 'Клиенты, подключенные к потоку новых сообщений')
+        self._events = metrics.counter('stream_events_total', 'События потока изменений сообщений')
+        self._finished = metrics.counter('stream_listeners_finished_total',
+                                         'Подписки на поток новых сообщений, завершенные сервисом', labels=('reason',))
+        self._errors = metrics.counter('stream_errors_total', 'Ошибки чтения потока изменений сообщений',
+                                       labels=('stream',))
+
+    def listen(self, topic_ids: Sequence[int], resume_token: Optional[str] = None) -> FeedListener:
+        """Подключает клиента к потоку новых сообщений указанных тем.
+
+        Args:
+            topic_ids (Sequence[int]): Темы, сообщения которых получает клиент.
+            resume_token (Optional[str], optional): Идентификатор последнего полученного события.
+                По умолчанию клиент получает только сообщения, записанные после подключения.
+
+        Returns:
+            FeedListener: Подписка клиента.
+
+        Raises:
+            InvalidResumeToken: Исключение, если идентификатор события поврежден.
+        """
+        topics = set(topic_ids)
+        backlog: List[StreamEvent] = []
+        if resume_token is not None:
+            token = decode_resume_token(resume_token)
+            found, backlog = self._replay_after(resume_token, topics)
+            if not found:
+                return self._listen_from(topics, token)
+
+        listener = FeedListener(self, topics, self._queue_size, backlog)
+        self._add(listener)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return listener
+
+    def remove(self, listener: FeedListener) -> None:
+        """Отключает клиента от потока.
+
+        Args:
+            listener (FeedListener): Подписка клиента.
+        """
+        self._resumed.discard(listener)
+        if listener in self._listeners:
+            self._listeners.discard(listener)
+            self._listeners_gauge.dec()
+
+    async def close(self) -> None:
+        """Останавливает чтение потока изменений и завершает все подписки."""
+        for listener in list(self._listeners):
+            listener.close()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _add(self, listener: FeedListener) -> None:
+        """Подключает подписку к раздаче событий.
+
+        Args:
+            listener (FeedListener): Подписка клиента.
+        """
+        self._listeners.add(listener)
+        self._listeners_gauge.inc()
+
+    def _replay_after(self, resume_token: str, topic_ids: Set[int]) -> Tuple[bool, List[StreamEvent]]:
+        """Находит в памяти события тем клиента, следующие за указанным.
+
+        Args:
+            resume_token (str): Идентификатор последнего полученного клиентом события.
+            topic_ids (Set[int]): Темы клиента.
+
+        Returns:
+            Tuple[bool, List[StreamEvent]]: Найдено ли событие и следующие за ним события тем клиента.
+        """
+        events = list(self._replay)
+        for index, event in enumerate(events):
+            if event.id == resume_token:
+                return True, [event for event in events[index + 1:] if event.message.topic_id in topic_ids]
+        return False, []
+
+    def _listen_from(self, topic_ids: Set[int], token: Mapping[str, Any]) -> FeedListener:
+        """Подключает клиента к собственному потоку изменений, продолженному с указанного события.
+
+        Каждый такой поток - отдельный курсор на сервере MongoDB, поэтому при max_resumed открытых
+        потоках подписка сразу завершается с ошибкой 'resume_failed', как если бы событие уже
+        нельзя было найти.
+
+        Args:
+            topic_ids (Set[int]): Темы клиента.
+            token (Mapping[str, Any]): Токен последнего полученного клиентом события.
+
+        Returns:
+            FeedListener: Подписка клиента.
+        """
+        listener = FeedListener(self, topic_ids, self._queue_size)
+        self._add(listener)
+        if len(self._resumed) >= self._max_resumed:
+            self._finish(listener, 'resume_failed')
+            return listener
+        self._resumed.add(listener)
+
+        async def run() -> None:
+            try:
+                async for change in self._repository.watch(CHANGES_PIPELINE, resume_after=token):
+                    event = self._to_event(change)
+                    if event.message.topic_id in topic_ids:
+                        await listener.put(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning('Failed to resume messages change stream', exc_info=True)
+                self._errors.labels(stream='resumed').inc()
+            self._resumed.discard(listener)
+            self._finish(listener, 'resume_failed')
+
+        listener.task = asyncio.create_task(run())
+        return listener
+
+    @staticmethod
+    def _to_event(change: Mapping[str, Any]) -> StreamEvent:
+        """Преобразует событие потока изменений в событие клиента.
+
+        Args:
+            change (Mapping[str, Any]): Событие потока изменений.
+
+        Returns:
+            StreamEvent: Новое сообщение с идентификатором события.
+        """
+        return StreamEvent(id=change['_id']['_data'], message=MessageOutput(**change['fullDocument']))
+
+    def _finish(self, listener: FeedListener, error: str) -> None:
+        """Завершает подписку клиента по инициативе сервиса.
+
+        Args:
+            listener (FeedListener): Подписка клиента.
+            error (str): Причина завершения.
+        """
+        if listener.error is None:
+            self._finished.labels(reason=error).inc()
+        listener.finish(error)
+
+    def _publish(self, change: Mapping[str, Any]) -> None:
+        """Раздает событие подключенным клиентам тем и сохраняет его в памяти.
+
+        Args:
+            change (Mapping[str, Any]): Событие потока изменений.
+        """
+        self._resume_after = change['_id']
+        event = self._to_event(change)
+        self._events.inc()
+        self._replay.append(event)
+        for listener in list(self._listeners):
+            if listener.task is None and event.message.topic_id in listener.topic_ids \
+                    and not listener.offer(event):
+                self._finish(listener, 'lagged')
+
+    async def _run(self) -> None:
+        """Читает общий поток изменений, переоткрывая его после ошибок."""
+        while True:
+            try:
+                async for change in self._repository.watch(CHANGES_PIPELINE, resume_after=self._resume_after):
+                    self._publish(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                logger.exception('Messages change stream failed')
+                self._errors.labels(stream='shared').inc()
+                if exc.code in RESUME_FAILED_ERRORS:
+                    # Продолжить с последнего события нельзя: клиенты могли пропустить сообщения
+                    self._resume_after = None
+                    for listener in list(self._listeners):
+                        if listener.task is None:
+                            self._finish(listener, 'lagged')
+            except Exception:
+                logger.exception('Messages change stream failed')
+                self._errors.labels(stream='shared').inc()
+            await asyncio.sleep(self._retry_delay)
@@ -0,0 +1,189 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+
+from src.database.managers import MessagesManager
+from src.database.models import Message, Subscription
+from src.schemas.bodies import Payload
+from src.schemas.responses import IngestError, IngestOutput
+
+
+async def iter_lines(chunks: AsyncIterator[bytes],
+                     max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Разбивает поток байтов на строки по мере поступления.
+
+    В памяти находится не больше одной строки. Строки длиннее max_line_bytes не накапливаются:
+    вместо них возвращается None, а остаток строки пропускается до следующего перевода строки.
+
+    Args:
+        chunks (AsyncIterator[bytes]): Части тела запроса.
+        max_line_bytes (int): Максимальная длина строки в байтах.
+
+    Yields:
+        Tuple[int, Optional[bytes]]: Номер строки, начиная с 1, и ее содержимое или None, если строка слишком длинная.
+    """
+    buffer = bytearray()
+    line_number = 0
+    too_long = False
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b'\n', start)
+            if end == -1:
+                break
+
+            line_number += 1
+            if too_long or len(buffer) + end - start > max_line_bytes:
+                yield line_number, None
+            else:
+                buffer += chunk[start:end]
+                yield line_number, bytes(buffer)
+            buffer.clear()
+            too_long = False
+            start = end + 1
+
+        if not too_long:
+            buffer += chunk[start:]
+            if len(buffer) > max_line_bytes:
+                buffer.clear()
+                too_long = True
+
+    if buffer or too_long:
+        yield line_number + 1, None if too_long else bytes(buffer)
+
+
+def describe_validation_error(exc: ValidationError) -> str:
+    """Формирует краткое описание ошибок проверки строки.
+
+    Args:
+        exc (ValidationError): Ошибка проверки модели.
+
+    Returns:
+        str: Описание ошибок в виде "поле: сообщение" через точку с запятой.
+    """
+    return '; '.join(
+        f"{'.'.join(map(str, error['loc']))}: {error['msg']}" if error['loc'] else error['msg']
+        for error in exc.errors()
+    )
+
+
+class MessagesIngestor:
+    """Загружает сообщения из потока NDJSON порциями, не накапливая весь поток в памяти.
+
+    Каждая непустая строка проверяется как Payload. Корректные строки записываются порциями
+    insert_many(ordered=False): ошибка в одном документе не прерывает запись остальных.
+    Запись порции выполняется одновременно с разбором следующей, поэтому в памяти находится
+    не больше двух порций.
+
+    Атрибуты:
+        _messages_manager (MessagesManager): Менеджер сообщений для взаимодействия с базой данных.
+        _chunk_size (int): Количество сообщений в одной порции записи.
+        _max_line_bytes (int): Максимальная длина строки в байтах.
+        _max_errors (int): Максимальное количество ошибок, возвращаемых в ответе.
+    """
+
+    def __init__(self, messages_manager: MessagesManager, chunk_size: int = 1000,
+                 max_line_bytes: int = 1048576, max_errors: int = 1000):
+        """Инициализирует экземпляр MessagesIngestor.
+
+        Args:
+            messages_manager (MessagesManager): Менеджер сообщений для выполнения запросов к базе данных.
+            chunk_size (int, optional): Количество сообщений в одной порции записи. По умолчанию 1000.
+            max_line_bytes (int, optional): Максимальная длина строки в байтах. По умолчанию 1 МиБ.
+            max_errors (int, optional): Максимальное количество ошибок в ответе. По умолчанию 1000.
+        """
+        self._messages_manager = messages_manager
+        self._chunk_size = chunk_size
+        self._max_line_bytes = max_line_bytes
+        self._max_errors = max_errors
+
+    async def ingest(self, topic_id: int, chunks: AsyncIterator[bytes],
+                     subscriptions: Sequence[Subscription] = (),
+                     retention: Optional[timedelta] = None) -> IngestOutput:
+        """Сохраняет сообщения из потока NDJSON в указанную тему.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            chunks (AsyncIterator[bytes]): Части тела запроса.
+            subscriptions (Sequence[Subscription], optional): Подписки для уведомления. По умолчанию пусто.
+            retention (Optional[timedelta], optional): Срок хранения сообщений темы. По умолчанию бессрочно.
+
+        Returns:
+            IngestOutput: Количество сохраненных и отклоненных строк и ошибки по номерам строк.
+        """
+        output = IngestOutput()
+        messages: List[Message] = []
+        line_numbers: List[int] = []
+        pending: Optional[asyncio.Task] = None
+
+        try:
+            async for line_number, line in iter_lines(chunks, self._max_line_bytes):
+                if line is None:
+                    self._add_error(output, line_number, f'Line exceeds {self._max_line_bytes} bytes')
+                    continue
+                if not line.strip():
+                    continue
+
+                try:
+                    payload = Payload.model_validate_json(line)
+                except ValidationError as exc:
+                    self._add_error(output, line_number, describe_validation_error(exc))
+                    continue
+
+                created_date = datetime.now()
+                messages.append(Message(unique_id=payload.unique_id, topic_id=topic_id, payload=payload.payload,
+                                        idempotency_key=payload.idempotency_key, created_date=created_date,
+                                        expire_at=created_date + retention if retention else None))
+                line_numbers.append(line_number)
+                if len(messages) >= self._chunk_size:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.create_task(self._write(output, messages, line_numbers, subscriptions))
+                    messages, line_numbers = [], []
+
+            if pending is not None:
+                await pending
+                pending = None
+            if messages:
+                await self._write(output, messages, line_numbers, subscriptions)
+        finally:
+            # Клиент мог оборвать загрузку: запись уже принятой порции доводится до конца
+            if pending is not None:
+                await asyncio.shield(pending)
+
+        # Ошибки записи порции добавляются после ошибок разбора следующих строк
+        output.errors.sort(key=lambda error: error.line)
+        return output
+
+    async def _write(self, output: IngestOutput, messages: List[Message], line_numbers: List[int],
+                     subscriptions: Sequence[Subscription]) -> None:
+        """Записывает порцию сообщений и учитывает результат в ответе.
+
+        Args:
+            output (IngestOutput): Накапливаемый результат загрузки.
+            messages (List[Message]): Сообщения порции.
+            line_numbers (List[int]): Номера строк сообщений порции.
+            subscriptions (Sequence[Subscription]): Подписки для уведомления.
+        """
+        message_ids, errors = await self._messages_manager.create_messages_unordered(messages, subscriptions)
+        accepted = sum(message_id is not None for message_id in message_ids)
+        output.accepted += accepted
+        output.duplicates += len(messages) - accepted - len(errors)
+        output.webhooks_count += accepted * len(subscriptions)
+        for index, error in sorted(errors.items()):
+            self._add_error(output, line_numbers[index], error)
+
+    def _add_error(self, output: IngestOutput, line_number: int, error: str) -> None:
+        """Учитывает отклоненную строку, сохраняя описание первых max_errors ошибок.
+
+        Args:
+            output (IngestOutput): Накапливаемый результат загрузки.
+            line_number (int): Номер строки.
+            error (str): Описание ошибки.
+        """
+        output.failed += 1
+        if len(output.errors) < self._max_errors:
+            output.errors.append(IngestError(line=line_number, error=error))
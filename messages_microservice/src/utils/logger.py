@@ -1,38 +1,182 @@
+import atexit
+import http.client
 import logging
 import logging.config
 import logging.handlers
 import json
+import queue
+import sys
+import threading
 import uuid
-from typing import Any, Optional
-from aiohttp import ClientSession
+from collections import deque
+from typing import Any, Deque, List, Optional
 
+from anika_metrics import metrics
 
-class AsyncLogstashHandler(logging.Handler):
-    """Асинхронный обработчик для отправки логов в Logstash.
 
-    Args:
+class LogstashHandler(logging.Handler):
+    """Обработчик, отправляющий логи в Logstash пачками в фоновом потоке.
+
+    emit только кладет отформатированную запись в ограниченную очередь в памяти и не выполняет
+    сетевых операций, поэтому логирование не задерживает обработку запросов. Фоновый поток
+    забирает записи пачками и отправляет их одним POST-запросом в формате NDJSON через постоянное
+    соединение. При переполнении очереди отбрасываются самые старые записи. При закрытии обработчика
+    оставшиеся записи отправляются до завершения потока.
+
+    Атрибуты:
         host (str): Хост Logstash.
         port (int): Порт Logstash.
+        batch_size (int): Максимальное количество записей в одном запросе.
+        flush_interval_s (float): Максимальное время ожидания записи в очереди перед отправкой в секундах.
+        timeout_s (float): Время ожидания ответа Logstash в секундах.
+        _queue (Deque[bytes]): Очередь отформатированных записей.
+        _lock (threading.Lock): Блокировка очереди.
+        _wakeup (threading.Event): Событие, пробуждающее фоновый поток.
+        _stopping (threading.Event): Событие остановки фонового потока.
+        _connection (Optional[http.client.HTTPConnection]): Постоянное соединение с Logstash.
+        _thread (threading.Thread): Фоновый поток отправки.
     """
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval_s: float = 1.0, timeout_s: float = 5.0):
+        """Инициализирует обработчик и запускает фоновый поток отправки.
+
+        Args:
+            host (str): Хост Logstash.
+            port (int): Порт Logstash.
+            queue_size (int, optional): Максимальное количество записей в очереди. По умолчанию 10000.
+            batch_size (int, optional): Максимальное количество записей в одном запросе. По умолчанию 500.
+            flush_interval_s (float, optional): Максимальное время ожидания записи в очереди в секундах.
+                По умолчанию 1.0.
+            timeout_s (float, optional): Время ожидания ответа Logstash в секундах. По умолчанию 5.0.
+        """
         super().__init__()
         self.host = host
         self.port = port
-
-    async def emit(self, record):
-        """Отправляет лог-запись в Logstash.
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.timeout_s = timeout_s
+        self._queue: Deque[bytes] = deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._sent = metrics.counter('logstash_records_sent_total', 'Записи логов, отправленные в Logstash')
+        self._dropped = metrics.counter('logstash_records_dropped_total', 'Записи логов, не отправленные в Logstash',
+                                        labels=('reason',))
+        self._thread = threading.Thread(target=self._run, name='logstash-shipper', daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Ставит лог-запись в очередь отправки.
 
         Args:
             record (logging.LogRecord): Лог-запись.
         """
-        log_entry = self.format(record)
-        async with ClientSession() as session:
+        try:
+            entry = self.format(record).encode()
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self._dropped.labels(reason='overflow').inc()
+            self._queue.append(entry)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Пробуждает фоновый поток, не дожидаясь отправки."""
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """Отправляет оставшиеся записи и останавливает фоновый поток."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        super().close()
+
+    def _take_batch(self) -> List[bytes]:
+        """Забирает из очереди очередную пачку записей.
+
+        Returns:
+            List[bytes]: Записи в порядке поступления.
+        """
+        with self._lock:
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self) -> None:
+        """Отправляет записи из очереди, пока обработчик не закрыт, затем отправляет остаток."""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+        if self._connection is not None:
+            self._connection.close()
+
+    def _drain(self) -> None:
+        """Отправляет все записи, накопившиеся в очереди."""
+        while batch := self._take_batch():
             try:
-                await session.post(f'http://{self.host}:{self.port}', data=log_entry)
+                self._send(b'\n'.join(batch) + b'\n')
             except Exception as e:
-                # Локальное логирование ошибки отправки
-                print(f"Failed to send log to Logstash: {e}")
+                self._dropped.labels(reason='send_failed').inc(len(batch))
+                # Логирование через logging могло бы снова попасть в этот обработчик
+                print(f'Failed to send {len(batch)} log records to Logstash: {e}', file=sys.stderr)
+                return
+            self._sent.inc(len(batch))
+
+    def _send(self, body: bytes) -> None:
+        """Отправляет пачку записей через постоянное соединение.
+
+        Если сервер закрыл простаивавшее соединение, запрос повторяется один раз через новое.
+
+        Args:
+            body (bytes): Записи в формате NDJSON.
+
+        Raises:
+            ConnectionError: Если Logstash ответил кодом ошибки.
+        """
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_s)
+            try:
+                self._connection.request('POST', '/', body=body, headers={'Content-Type': 'application/x-ndjson'})
+                response = self._connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+                continue
+            if response.status >= 400:
+                raise ConnectionError(f'Logstash responded with {response.status}')
+            return
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler для очереди внутри процесса.
+
+    Стандартный QueueHandler.prepare форматирует запись перед постановкой в очередь, чтобы ее можно
+    было сериализовать. Очередь в памяти этого не требует, поэтому запись передается как есть и
+    форматируется только обработчиками в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Возвращает запись без форматирования.
+
+        Args:
+            record (logging.LogRecord): Лог-запись.
+
+        Returns:
+            logging.LogRecord: Та же лог-запись.
+        """
+        return record
 
 
 class AsyncLogger:
@@ -46,32 +190,49 @@ class AsyncLogger:
         logstash_host (Optional[str]): Хост Logstash.
         logstash_port (Optional[int]): Порт Logstash.
         log_level (str): Уровень логирования.
+        logstash_queue_size (int): Максимальное количество записей в очереди отправки в Logstash.
+        logstash_batch_size (int): Максимальное количество записей в одном запросе к Logstash.
+        logstash_flush_interval_s (float): Максимальное время ожидания записи в очереди в секундах.
     """
 
     def __init__(self, log_to_console: bool, log_to_file: bool, log_to_logstash: bool,
-                 file_path: Optional[str], logstash_host: Optional[str], logstash_port: Optional[int], log_level: str):
+                 file_path: Optional[str], logstash_host: Optional[str], logstash_port: Optional[int], log_level: str,
+                 logstash_queue_size: int = 10000, logstash_batch_size: int = 500,
+                 logstash_flush_interval_s: float = 1.0):
         self.log_to_logstash = log_to_logstash
         self.logstash_host: Optional[str] = logstash_host
-        self.logstash_port: Optional[str] = logstash_port
+        self.logstash_port: Optional[int] = logstash_port
 
         self.logger = logging.getLogger("Service logger")
         self.logger.setLevel(getattr(logging, log_level))
         self.logger.propagate = False
 
+        handlers: List[logging.Handler] = []
         if log_to_console:
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-            self.logger.addHandler(console_handler)
+            handlers.append(console_handler)
 
         if log_to_file and file_path:
             file_handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=10485760, backupCount=5)
             file_handler.setFormatter(self._json_formatter())
-            self.logger.addHandler(file_handler)
+            handlers.append(file_handler)
 
         if log_to_logstash and logstash_host and logstash_port:
-            logstash_handler = AsyncLogstashHandler(logstash_host, logstash_port)
+            logstash_handler = LogstashHandler(logstash_host, logstash_port, queue_size=logstash_queue_size,
+                                               batch_size=logstash_batch_size,
+                                               flush_interval_s=logstash_flush_interval_s)
             logstash_handler.setFormatter(self._json_formatter())
-            self.logger.addHandler(logstash_handler)
+            handlers.append(logstash_handler)
+
+        # Обработчики выполняют ввод-вывод и форматирование в потоке QueueListener, а в потоке
+        # цикла событий запись только кладется в очередь
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self._queue, *handlers, respect_handler_level=True)
+        self.logger.addHandler(LocalQueueHandler(self._queue))
+        self._listener.start()
+        self._closed = False
+        atexit.register(self.close)
 
     def _json_formatter(self):
         """Создает JSON форматтер для логов.
@@ -95,7 +256,7 @@ class AsyncLogger:
                     "level": record.levelname,
                     "message": record.getMessage(),
                     "custom_data": record.__dict__.get('custom_data', {}),
-                    "trace_id": record.__dict__.get('trace_id', str(uuid.uuid4()))
+                    "trace_id": record.__dict__.get('trace_id') or str(uuid.uuid4())
                 }
                 return json.dumps(log_record)
 
@@ -160,30 +321,26 @@ class AsyncLogger:
             trace_id (Optional[str]): Идентификатор трассировки.
             **kwargs: Дополнительные параметры.
         """
-        log_method = getattr(self.logger, level.lower(), None)
+        levelno = logging.getLevelName(level)
+        if not isinstance(levelno, int) or not self.logger.isEnabledFor(levelno):
+            return
+
         extra = {'custom_data': kwargs}
         if trace_id:
             extra['trace_id'] = trace_id
-        if log_method:
-            log_method(message, extra=extra)
+        self.logger.log(levelno, message, extra=extra)
 
-        if self.log_to_logstash and self.logstash_host and self.logstash_port:
-            await self._log_to_logstash(level, message, trace_id, **kwargs)
+    def close(self) -> None:
+        """Записывает накопленные в очереди записи и закрывает обработчики логгера.
 
-    async def _log_to_logstash(self, level: str, message: str, trace_id: Optional[str], **kwargs: Any):
-        """Отправляет лог-запись в Logstash.
-
-        Args:
-            level (str): Уровень логирования.
-            message (str): Логируемое сообщение.
-            trace_id (Optional[str]): Идентификатор трассировки.
-            **kwargs: Дополнительные параметры.
+        Повторный вызов ничего не делает.
         """
-        log_entry = {
-            "level": level,
-            "message": message,
-            "trace_id": trace_id,
-            "extra": kwargs
-        }
-        async with ClientSession() as session:
-            await session.post(f'http://{self.logstash_host}:{self.logstash_port}', data=json.dumps(log_entry))
+        if self._closed:
+            return
+
+        self._closed = True
+        self._listener.stop()
+        for handler in self._listener.handlers + tuple(self.logger.handlers):
+            handler.close()
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
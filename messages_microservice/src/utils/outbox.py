@@ -0,0 +1,194 @@
+import asyncio
+from datetime import timedelta
+from typing import List, Mapping, Any, Set
+
+from anika_metrics import metrics
+
+from src.database.managers import OutboxManager
+from src.utils.encoding import encode_body
+from src.utils.webhooks import WebhooksNotifier
+
+
+def entry_body(entry: Mapping[str, Any]) -> bytes:
+    """Возвращает сериализованное при постановке в очередь сообщение записи.
+
+    Args:
+        entry (Mapping[str, Any]): Запись очереди.
+
+    Returns:
+        bytes: Сообщение в формате JSON. Записи, поставленные в очередь до хранения
+            сериализованных сообщений, сериализуются при отправке.
+    """
+    if 'body' in entry:
+        return entry['body']
+    return encode_body(entry['message'])
+
+
+class OutboxDispatcher:
+    """Пул фоновых обработчиков, доставляющих вебхуки из очереди 'webhooks_outbox'.
+
+    Обработчики забирают записи из очереди и запускают доставку каждой пары (сообщение, URL)
+    отдельной задачей, поэтому сообщения и подписчики обслуживаются параллельно. Общее количество
+    одновременных доставок в процессе ограничено max_concurrency.
+
+    Записи подписок с пакетной доставкой отправляются одним запросом вместе с остальными
+    записями своего пакета и подтверждаются или повторяются целиком.
+
+    Неудачные доставки повторяются с экспоненциально растущей задержкой. После исчерпания
+    попыток запись переводится в состояние 'dead' и больше не обрабатывается.
+
+    Атрибуты:
+        _outbox (OutboxManager): Очередь исходящих вебхуков.
+        _notifier (WebhooksNotifier): Сервис отправки вебхуков.
+        _workers_count (int): Количество обработчиков, забирающих записи из очереди.
+        _max_concurrency (int): Максимальное количество одновременных доставок.
+        _poll_interval (float): Пауза между опросами пустой очереди в секундах.
+        _lease (timedelta): Время, на которое запись закрепляется за обработчиком.
+        _max_attempts (int): Максимальное количество попыток доставки.
+        _retry_base_delay (float): Задержка перед первой повторной попыткой в секундах.
+        _retry_max_delay (float): Максимальная задержка между попытками в секундах.
+        _delivered_ttl_s (int): Время хранения доставленных записей в секундах.
+        _workers (List[asyncio.Task]): Запущенные обработчики.
+        _deliveries_in_flight (Set[asyncio.Task]): Выполняющиеся доставки.
+    """
+
+    def __init__(self, outbox: OutboxManager, notifier: WebhooksNotifier, workers: int, max_concurrency: int,
+                 poll_interval_ms: int, lease_ms: int, max_attempts: int, retry_base_delay_ms: int,
+                 retry_max_delay_ms: int, delivered_ttl_s: int):
+        """Инициализирует экземпляр OutboxDispatcher.
+
+        Args:
+            outbox (OutboxManager): Очередь исходящих вебхуков.
+            notifier (WebhooksNotifier): Сервис отправки вебхуков.
+            workers (int): Количество обработчиков, забирающих записи из очереди.
+            max_concurrency (int): Максимальное количество одновременных доставок.
+            poll_interval_ms (int): Пауза между опросами пустой очереди в миллисекундах.
+            lease_ms (int): Время, на которое запись закрепляется за обработчиком, в миллисекундах.
+            max_attempts (int): Максимальное количество попыток доставки.
+            retry_base_delay_ms (int): Задержка перед первой повторной попыткой в миллисекундах.
+            retry_max_delay_ms (int): Максимальная задержка между попытками в миллисекундах.
+            delivered_ttl_s (int): Время хранения доставленных записей в секундах.
+        """
+        self._outbox = outbox
+        self._notifier = notifier
+        self._workers_count = workers
+        self._max_concurrency = max_concurrency
+        self._poll_interval = poll_interval_ms / 1000
+        self._lease = timedelta(milliseconds=lease_ms)
+        self._max_attempts = max_attempts
+        self._retry_base_delay = retry_base_delay_ms / 1000
+        self._retry_max_delay = retry_max_delay_ms / 1000
+        self._delivered_ttl_s = delivered_ttl_s
+        self._workers: List[asyncio.Task] = []
+        self._deliveries_in_flight: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = metrics.gauge('webhooks_deliveries_in_flight', 'Выполняющиеся доставки вебхуков')
+        self._deliveries = metrics.counter('webhooks_outbox_deliveries_total',
+                                           'Результаты попыток доставки вебхуков из очереди', labels=('result',))
+        self._batch_size = metrics.histogram('webhooks_batch_size', 'Количество сообщений в пакете вебхуков',
+                                             buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+        self._errors = metrics.counter('webhooks_outbox_worker_errors_total',
+                                       'Ошибки обработчиков очереди вебхуков при работе с базой данных')
+
+    async def start(self) -> None:
+        """Создает индексы очереди, назначает ведущие записи пакетам без них и запускает обработчики.
+
+        Сессия WebhooksNotifier должна быть открыта до запуска обработчиков.
+        """
+        await self._outbox.ensure_indexes(self._delivered_ttl_s)
+        await self._outbox.promote_orphaned_leaders()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self._workers_count)]
+
+    async def stop(self) -> None:
+        """Останавливает обработчики и прерывает выполняющиеся доставки.
+
+        Записи, обработка которых была прервана, снова станут доступны по истечении аренды.
+        """
+        tasks = self._workers + list(self._deliveries_in_flight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._deliveries_in_flight.clear()
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        """Вычисляет задержку перед следующей попыткой доставки.
+
+        Args:
+            attempts (int): Количество выполненных попыток.
+
+        Returns:
+            timedelta: Задержка перед следующей попыткой.
+        """
+        delay = min(self._retry_base_delay * 2 ** (attempts - 1), self._retry_max_delay)
+        return timedelta(seconds=delay)
+
+    async def _run(self) -> None:
+        """Цикл обработчика: забирает готовые записи из очереди и запускает их доставку.
+
+        Запись забирается только после освобождения места под доставку, чтобы аренда
+        не истекала, пока запись ждет своей очереди.
+        """
+        while True:
+            await self._semaphore.acquire()
+            try:
+                entry = await self._outbox.claim(self._lease)
+            except asyncio.CancelledError:
+                self._semaphore.release()
+                raise
+            except Exception:
+                # Ошибка базы данных не должна останавливать обработчик
+                entry = None
+                self._errors.inc()
+
+            if entry is None:
+                self._semaphore.release()
+                await asyncio.sleep(self._poll_interval)
+                continue
+
+            task = asyncio.create_task(self._process(entry))
+            self._deliveries_in_flight.add(task)
+            self._in_flight.inc()
+            task.add_done_callback(self._on_delivery_done)
+
+    def _on_delivery_done(self, task: asyncio.Task) -> None:
+        """Освобождает место под доставку после ее завершения.
+
+        Args:
+            task (asyncio.Task): Завершившаяся задача доставки.
+        """
+        self._deliveries_in_flight.discard(task)
+        self._in_flight.dec()
+        self._semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            self._errors.inc()
+
+    async def _process(self, entry: Mapping[str, Any]) -> None:
+        """Выполняет одну попытку доставки записи или пакета и сохраняет ее результат.
+
+        Args:
+            entry (Mapping[str, Any]): Запись очереди.
+        """
+        entries = [entry]
+        if entry.get('batch'):
+            entries += await self._outbox.collect_batch(entry)
+            self._batch_size.observe(len(entries))
+            error = await self._notifier.deliver_batch(entry['url'], [entry_body(item) for item in entries],
+                                                       batch_id=str(entry['_id']))
+        else:
+            error = await self._notifier.deliver(entry['url'], entry_body(entry))
+
+        entry_ids = [item['_id'] for item in entries]
+        attempts = entry['attempts'] + 1
+        if error is None:
+            await self._outbox.mark_delivered(entry_ids)
+            self._deliveries.labels(result='delivered').inc(len(entries))
+        elif attempts >= self._max_attempts:
+            await self._outbox.mark_dead(entry_ids, attempts, error)
+            self._deliveries.labels(result='dead').inc(len(entries))
+        else:
+            await self._outbox.reschedule(entry['_id'], attempts, self._retry_delay(attempts), error)
+            self._deliveries.labels(result='retry').inc(len(entries))
+
+        if entry.get('batch'):
+            await self._outbox.promote_leader(entry['url'])
@@ -0,0 +1,317 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional, Sequence, AsyncIterator
+
+from anika_metrics import metrics
+
+from src.database.indexes import IndexSpec
+from src.schemas.exceptions import PermissionsError, QueryRejected
+from src.schemas.responses import QueryExplanation
+
+# Операторы, выполняющие JavaScript на сервере, запрещены всегда
+JAVASCRIPT_OPERATORS = {'$where', '$function', '$accumulator'}
+
+# Логические операторы верхнего уровня фильтра
+LOGICAL_OPERATORS = {'$and', '$or', '$nor'}
+
+# Операторы, допустимые в условии на поле
+FIELD_OPERATORS = {'$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin', '$exists', '$type',
+                   '$regex', '$options', '$not', '$elemMatch', '$size', '$all'}
+
+# Операторы условия на поле, для которых MongoDB может построить границы сканирования индекса
+BOUNDED_OPERATORS = {'$eq', '$gt', '$gte', '$lt', '$lte', '$in'}
+
+# Операторы, принимающие список значений
+LIST_OPERATORS = {'$in', '$nin', '$all'}
+
+
+class QueryGuard:
+    """Проверяет пользовательские условия поиска и оценивает стоимость их выполнения.
+
+    Условия разбираются по списку разрешенных операторов. Стоимость оценивается по объявленным
+    индексам коллекции: запрос считается дорогим, если ни одно условие не ограничивает сканирование
+    индекса внутри тем запроса или сортировку нельзя выполнить по индексу. В режиме 'reject'
+    дорогие запросы отклоняются, в режиме 'limit' выполняются с ограниченной параллельностью.
+
+    Атрибуты:
+        _indexes (Sequence[IndexSpec]): Объявленные индексы коллекции, начинающиеся с topic_id.
+        _mode (str): Обработка дорогих запросов: 'limit' или 'reject'.
+        _max_depth (int): Максимальная вложенность условий.
+        _max_elem_match_depth (int): Максимальная вложенность $elemMatch.
+        _max_list_size (int): Максимальный размер списка значений в $in, $nin и $all.
+        _expensive_slots (asyncio.Semaphore): Ограничение одновременно выполняющихся дорогих запросов.
+    """
+
+    def __init__(self, indexes: Sequence[IndexSpec], mode: str = 'limit', expensive_concurrency: int = 2,
+                 max_depth: int = 6, max_elem_match_depth: int = 2, max_list_size: int = 1000):
+        """Инициализирует экземпляр QueryGuard.
+
+        Args:
+            indexes (Sequence[IndexSpec]): Объявленные индексы коллекции сообщений.
+            mode (str, optional): Обработка дорогих запросов: 'limit' или 'reject'. По умолчанию 'limit'.
+            expensive_concurrency (int, optional): Количество одновременно выполняющихся дорогих запросов.
+                По умолчанию 2.
+            max_depth (int, optional): Максимальная вложенность условий. По умолчанию 6.
+            max_elem_match_depth (int, optional): Максимальная вложенность $elemMatch. По умолчанию 2.
+            max_list_size (int, optional): Максимальный размер списка значений. По умолчанию 1000.
+        """
+        # Частичные индексы содержат не все сообщения и не подходят для произвольного поиска
+        self._indexes = [index for index in indexes if index.keys and index.keys[0][0] == 'topic_id'
+                         and 'partialFilterExpression' not in index.options]
+        self._mode = mode
+        self._max_depth = max_depth
+        self._max_elem_match_depth = max_elem_match_depth
+        self._max_list_size = max_list_size
+        self._expensive_slots = asyncio.Semaphore(expensive_concurrency)
+        self._verdicts = metrics.counter('search_query_verdicts_total', 'Результаты проверки поисковых запросов',
+                                         labels=('verdict',))
+
+    def explain(self, match: Optional[dict] = None, sort: Optional[Sequence[tuple]] = None,
+                unique_ids: Optional[List[int]] = None) -> QueryExplanation:
+        """Разбирает условия поиска и оценивает план их выполнения.
+
+        Args:
+            match (Optional[dict], optional): Условия поиска из запроса. По умолчанию None.
+            sort (Optional[Sequence[tuple]], optional): Итоговый порядок сортировки. По умолчанию None.
+            unique_ids (Optional[List[int]], optional): Уникальные идентификаторы из запроса. По умолчанию None.
+
+        Returns:
+            QueryExplanation: Результат проверки и оценки запроса.
+
+        Raises:
+            PermissionsError: Исключение, если в условиях используются операторы, выполняющие JavaScript.
+        """
+        explanation = QueryExplanation()
+        for field, direction in sort or []:
+            if field.startswith('$') or direction not in (1, -1):
+                self._reject(explanation, 'sort on %s must be 1 or -1 on a field name' % field)
+        bounded = set(self._validate_filter(match or {}, explanation, depth=0, elem_match_depth=0))
+        if unique_ids:
+            bounded.add('unique_id')
+
+        filter_index = next((index.name for index in self._indexes
+                             if len(index.keys) > 1 and index.keys[1][0] in bounded), None)
+        sort_index = self._sort_index(sort or [])
+
+        if sort and sort_index is None:
+            explanation.blocking_sort = True
+            explanation.reasons.append('sort on %s is not supported by any index'
+                                       % ', '.join(field for field, _ in sort))
+        if match and filter_index is None:
+            explanation.reasons.append('no condition narrows the index scan, every message of the topics '
+                                       'would be examined')
+
+        explanation.index = filter_index or sort_index
+        explanation.expensive = explanation.blocking_sort or bool(match and filter_index is None)
+        if explanation.expensive and self._mode == 'reject':
+            explanation.accepted = False
+
+        return explanation
+
+    def check(self, explanation: QueryExplanation) -> None:
+        """Отклоняет запрос, не прошедший проверку.
+
+        Args:
+            explanation (QueryExplanation): Результат проверки запроса.
+
+        Raises:
+            QueryRejected: Исключение, если запрос отклонен.
+        """
+        verdict = 'rejected' if not explanation.accepted else 'expensive' if explanation.expensive else 'accepted'
+        self._verdicts.labels(verdict=verdict).inc()
+        if not explanation.accepted:
+            raise QueryRejected
+
+    @asynccontextmanager
+    async def slot(self, explanation: QueryExplanation) -> AsyncIterator[None]:
+        """Ограничивает параллельность выполнения дорогих запросов.
+
+        Args:
+            explanation (QueryExplanation): Результат проверки запроса.
+        """
+        if not explanation.expensive:
+            yield
+            return
+
+        async with self._expensive_slots:
+            yield
+
+    def _sort_index(self, sort: Sequence[tuple]) -> Optional[str]:
+        """Находит индекс, по которому можно выполнить сортировку без сортировки в памяти.
+
+        Темы запроса задаются через $in, поэтому подходит индекс, в котором после topic_id идут поля
+        сортировки в том же или полностью обратном направлении.
+
+        Args:
+            sort (Sequence[tuple]): Порядок сортировки.
+
+        Returns:
+            Optional[str]: Имя индекса или None, если подходящего индекса нет.
+        """
+        if not sort or any(direction not in (1, -1) for _, direction in sort):
+            return None
+
+        sort = [(field, int(direction)) for field, direction in sort]
+        reverse = [(field, -direction) for field, direction in sort]
+        for index in self._indexes:
+            prefix = [(field, int(direction)) for field, direction in index.keys[1:len(sort) + 1]]
+            if prefix in (sort, reverse):
+                return index.name
+        return None
+
+    def _reject(self, explanation: QueryExplanation, reason: str) -> None:
+        """Помечает запрос отклоненным.
+
+        Args:
+            explanation (QueryExplanation): Результат проверки запроса.
+            reason (str): Причина отклонения.
+        """
+        explanation.accepted = False
+        explanation.reasons.append(reason)
+
+    def _validate_filter(self, query: Any, explanation: QueryExplanation, depth: int,
+                         elem_match_depth: int) -> List[str]:
+        """Проверяет документ фильтра.
+
+        Args:
+            query (Any): Документ фильтра.
+            explanation (QueryExplanation): Результат проверки запроса.
+            depth (int): Текущая вложенность условий.
+            elem_match_depth (int): Текущая вложенность $elemMatch.
+
+        Returns:
+            List[str]: Поля, условия на которые ограничивают сканирование индекса.
+
+        Raises:
+            PermissionsError: Исключение, если в условиях используются операторы, выполняющие JavaScript.
+        """
+        if not isinstance(query, dict):
+            self._reject(explanation, 'filter must be an object')
+            return []
+        if depth > self._max_depth:
+            self._reject(explanation, 'conditions are nested deeper than %s levels' % self._max_depth)
+            return []
+
+        bounded = []
+        for key, value in query.items():
+            if key in JAVASCRIPT_OPERATORS:
+                raise PermissionsError
+            if key in LOGICAL_OPERATORS:
+                if not isinstance(value, list) or not value:
+                    self._reject(explanation, '%s must be a non-empty array' % key)
+                    continue
+                branches = [self._validate_filter(branch, explanation, depth + 1, elem_match_depth)
+                            for branch in value]
+                if key == '$and':
+                    bounded += [field for branch in branches for field in branch]
+                elif key == '$or':
+                    # Индекс ограничивает $or, только если ограничена каждая ветвь
+                    bounded += list(set.intersection(*(set(branch) for branch in branches)))
+            elif key.startswith('$'):
+                self._reject(explanation, 'operator %s is not allowed' % key)
+            elif '$' in key:
+                self._reject(explanation, 'field name %s must not contain "$"' % key)
+            elif self._validate_condition(key, value, explanation, depth + 1, elem_match_depth):
+                bounded.append(key)
+
+        return bounded
+
+    def _validate_condition(self, field: str, condition: Any, explanation: QueryExplanation, depth: int,
+                            elem_match_depth: int) -> bool:
+        """Проверяет условие на поле.
+
+        Args:
+            field (str): Имя поля.
+            condition (Any): Значение для сравнения или документ с операторами.
+            explanation (QueryExplanation): Результат проверки запроса.
+            depth (int): Текущая вложенность условий.
+            elem_match_depth (int): Текущая вложенность $elemMatch.
+
+        Returns:
+            bool: True, если условие ограничивает сканирование индекса по полю.
+
+        Raises:
+            PermissionsError: Исключение, если в условиях используются операторы, выполняющие JavaScript.
+        """
+        if depth > self._max_depth:
+            self._reject(explanation, 'conditions are nested deeper than %s levels' % self._max_depth)
+            return False
+        if not isinstance(condition, dict) or not any(key.startswith('$') for key in condition):
+            self._check_literal(condition, explanation)
+            return True
+
+        bounded = False
+        for operator, argument in condition.items():
+            if operator in JAVASCRIPT_OPERATORS:
+                raise PermissionsError
+            if operator not in FIELD_OPERATORS:
+                self._reject(explanation, 'operator %s is not allowed' % operator)
+                continue
+
+            if operator in LIST_OPERATORS:
+                if not isinstance(argument, list):
+                    self._reject(explanation, '%s on %s must be an array' % (operator, field))
+                elif len(argument) > self._max_list_size:
+                    self._reject(explanation, '%s on %s has more than %s values'
+                                 % (operator, field, self._max_list_size))
+                else:
+                    self._check_literal(argument, explanation)
+            elif operator == '$regex':
+                if self._is_anchored(argument, condition.get('$options', '')):
+                    bounded = True
+                else:
+                    explanation.reasons.append('regex on %s is not anchored with "^" and cannot use an index'
+                                               % field)
+                continue
+            elif operator == '$not':
+                self._validate_condition(field, argument if isinstance(argument, dict) else {'$eq': argument},
+                                         explanation, depth + 1, elem_match_depth)
+            elif operator == '$elemMatch':
+                if elem_match_depth + 1 > self._max_elem_match_depth:
+                    self._reject(explanation, '$elemMatch on %s is nested deeper than %s levels'
+                                 % (field, self._max_elem_match_depth))
+                elif isinstance(argument, dict) and all(key.startswith('$') for key in argument) and argument \
+                        and not set(argument) & LOGICAL_OPERATORS:
+                    self._validate_condition(field, argument, explanation, depth + 1, elem_match_depth + 1)
+                else:
+                    self._validate_filter(argument, explanation, depth + 1, elem_match_depth + 1)
+            else:
+                self._check_literal(argument, explanation)
+
+            bounded = bounded or operator in BOUNDED_OPERATORS
+
+        return bounded
+
+    def _check_literal(self, value: Any, explanation: QueryExplanation) -> None:
+        """Проверяет, что значение для сравнения не содержит операторов.
+
+        Args:
+            value (Any): Значение для сравнения.
+            explanation (QueryExplanation): Результат проверки запроса.
+
+        Raises:
+            PermissionsError: Исключение, если значение содержит операторы, выполняющие JavaScript.
+        """
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in JAVASCRIPT_OPERATORS:
+                    raise PermissionsError
+                if key.startswith('$'):
+                    self._reject(explanation, 'operator %s is not allowed in a value' % key)
+                self._check_literal(item, explanation)
+        elif isinstance(value, list):
+            for item in value:
+                self._check_literal(item, explanation)
+
+    @staticmethod
+    def _is_anchored(pattern: Any, options: Any) -> bool:
+        """Проверяет, что регулярное выражение привязано к началу строки и может использовать индекс.
+
+        Args:
+            pattern (Any): Регулярное выражение.
+            options (Any): Флаги регулярного выражения.
+
+        Returns:
+            bool: True, если выражение начинается с '^' и не игнорирует регистр.
+        """
+        return isinstance(pattern, str) and pattern.startswith('^') and 'i' not in str(options)
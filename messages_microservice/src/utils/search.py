@@ -1,9 +1,109 @@
 import json
-from typing import List, Optional, Any
+import time
+from typing import List, Optional, Any, AsyncIterator, Dict, Tuple, Sequence
+
+from fastapi import HTTPException
+from anika_metrics import metrics
 
 from src.database.managers import MessagesManager
-from src.schemas.exceptions import PermissionsError
-from src.schemas.responses import MessageOutput
+from src.schemas.exceptions import InvalidCursor, TimeOutException
+from src.schemas.responses import SearchOutput, QueryExplanation
+from src.utils.cache import VersionedCache
+from src.utils.encoding import encode_response
+from src.utils.query_guard import QueryGuard
+from src.utils.cursors import SortSpec, keyset_sort, keyset_match, encode_cursor, decode_cursor
+
+
+def project_fields(fields: List[str], keyset: Optional[SortSpec] = None) -> Dict[str, int]:
+    """Формирует проекцию, оставляющую в сообщениях указанные поля payload.
+
+    Пути, вложенные в другие указанные пути, отбрасываются: MongoDB не принимает
+    проекцию с пересекающимися путями.
+
+    Args:
+        fields (List[str]): Поля payload через точку для вложенных полей.
+        keyset (Optional[SortSpec], optional): Порядок сортировки, поля которого нужно сохранить. По умолчанию None.
+
+    Returns:
+        Dict[str, int]: Спецификация стадии $project.
+    """
+    paths = ['topic_id', 'unique_id'] + [f'payload.{field}' for field in fields]
+    paths += [field for field, _ in keyset or []]
+
+    projection = {}
+    for path in sorted(set(paths)):
+        if not any(path.startswith(f'{kept}.') for kept in projection):
+            projection[path] = 1
+    return projection
+
+
+def cursor_only_fields(fields: List[str], keyset: Optional[SortSpec]) -> List[str]:
+    """Возвращает поля payload, которые попали в проекцию только ради токена продолжения.
+
+    Поле сортировки, вложенное в указанное поле или содержащее его, клиент запросил сам,
+    поэтому оно не скрывается.
+
+    Args:
+        fields (List[str]): Поля payload, указанные клиентом.
+        keyset (Optional[SortSpec]): Порядок сортировки страницы.
+
+    Returns:
+        List[str]: Поля payload через точку, которые нужно убрать из ответа.
+    """
+    hidden = []
+    for field, _ in keyset or []:
+        if not field.startswith('payload.'):
+            continue
+        path = field[len('payload.'):]
+        if not any(path == kept or path.startswith(f'{kept}.') or kept.startswith(f'{path}.') for kept in fields):
+            hidden.append(path)
+    return hidden
+
+
+def _without_path(value: Any, parts: List[str]) -> Any:
+    """Возвращает копию значения без поля по указанному пути, не изменяя исходный документ.
+
+    Вложенные объекты, оставшиеся пустыми после удаления поля, тоже удаляются: они попали
+    в проекцию только вместе с этим полем.
+
+    Args:
+        value (Any): Значение поля документа.
+        parts (List[str]): Путь к удаляемому полю, разбитый по точкам.
+
+    Returns:
+        Any: Значение без указанного поля.
+    """
+    if isinstance(value, list):
+        return [_without_path(item, parts) for item in value]
+    if not isinstance(value, dict) or parts[0] not in value:
+        return value
+
+    value = dict(value)
+    child = value.pop(parts[0])
+    if len(parts) > 1:
+        child = _without_path(child, parts[1:])
+        if child != {} and not (isinstance(child, list) and child and all(item == {} for item in child)):
+            value[parts[0]] = child
+    return value
+
+
+def message_output(document: Dict[str, Any], hidden: Sequence[str] = ()) -> Dict[str, Any]:
+    """Оставляет в документе сообщения поля модели MessageOutput.
+
+    Документы читаются из коллекции сообщений, поэтому повторная проверка моделью не нужна:
+    ответ сериализуется из словаря напрямую.
+
+    Args:
+        document (Dict[str, Any]): Документ сообщения.
+        hidden (Sequence[str], optional): Поля payload, которые нужно убрать из ответа. По умолчанию нет.
+
+    Returns:
+        Dict[str, Any]: Сообщение с полями topic_id, payload и unique_id.
+    """
+    payload = document.get('payload', {})
+    for path in hidden:
+        payload = _without_path(payload, path.split('.'))
+    return {'topic_id': document['topic_id'], 'payload': payload, 'unique_id': document.get('unique_id')}
 
 
 class SearchEngine:
@@ -11,20 +111,76 @@ class SearchEngine:
 
     Атрибуты:
         _messages_manager (MessagesManager): Менеджер сообщений для взаимодействия с базой данных.
+        _stream_batch_size (Optional[int]): Количество документов в одной порции курсора при потоковом поиске.
+        _cache (Optional[VersionedCache]): Кэш результатов поиска, действительных до записи в любую из тем запроса.
+        _guard (QueryGuard): Проверка условий поиска и оценка их стоимости.
     """
 
-    def __init__(self, messages_manager: MessagesManager):
+    def __init__(self, messages_manager: MessagesManager, stream_batch_size: Optional[int] = None,
+                 cache: Optional[VersionedCache] = None, guard: Optional[QueryGuard] = None):
         """Инициализирует экземпляр SearchEngine с указанным менеджером сообщений.
 
         Args:
             messages_manager (MessagesManager): Менеджер сообщений для выполнения запросов к базе данных.
+            stream_batch_size (Optional[int], optional): Количество документов в одной порции курсора
+                при потоковом поиске. По умолчанию размер порции сервера.
+            cache (Optional[VersionedCache], optional): Кэш результатов поиска. По умолчанию без кэширования.
+            guard (Optional[QueryGuard], optional): Проверка условий поиска. По умолчанию проверка
+                по индексам коллекции сообщений с настройками по умолчанию.
         """
         self._messages_manager = messages_manager
+        self._stream_batch_size = stream_batch_size
+        self._cache = cache
+        self._guard = guard or QueryGuard(MessagesManager.indexes)
+        self._timeouts = metrics.counter('search_timeouts_total',
+                                         'Поисковые запросы, прерванные по истечении времени выполнения',
+                                         labels=('endpoint',))
 
-    async def search(self, topic_ids: Optional[List[int]], unique_ids: Optional[List[int]] = None,
-                     match: Optional[dict] = None, sort: Optional[dict] = None, limit: Optional[int] = None) -> \
-            dict[str, list[Any]] | tuple[list[MessageOutput], Any]:
-        """Выполняет поиск сообщений по заданным критериям и возвращает результаты поиска.
+    @staticmethod
+    def _remaining_ms(deadline: Optional[float]) -> Optional[int]:
+        """Возвращает время, оставшееся у запроса до истечения его бюджета.
+
+        Args:
+            deadline (Optional[float]): Момент истечения бюджета по time.monotonic() или None, если бюджета нет.
+
+        Returns:
+            Optional[int]: Оставшееся время в миллисекундах или None, если бюджета нет.
+
+        Raises:
+            TimeOutException: Исключение, если время уже истекло.
+        """
+        if deadline is None:
+            return None
+
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            raise TimeOutException
+        return remaining_ms
+
+    @staticmethod
+    def _deadline(max_time_ms: Optional[int]) -> Optional[float]:
+        """Вычисляет момент истечения бюджета запроса.
+
+        Args:
+            max_time_ms (Optional[int]): Бюджет запроса в миллисекундах.
+
+        Returns:
+            Optional[float]: Момент истечения по time.monotonic() или None, если бюджета нет.
+        """
+        return time.monotonic() + max_time_ms / 1000 if max_time_ms else None
+
+    @staticmethod
+    def _build_pipeline(topic_ids: Optional[List[int]], unique_ids: Optional[List[int]] = None,
+                        match: Optional[dict] = None, sort: Optional[dict] = None,
+                        limit: Optional[int] = None, cursor: Optional[str] = None,
+                        fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[SortSpec]]:
+        """Формирует конвейер агрегации, выбирающий сообщения по критериям поиска.
+
+        Сообщения всегда упорядочиваются однозначно: к сортировке из запроса добавляется _id.
+        Токен продолжения превращается в условие на поля сортировки, поэтому следующая страница
+        читается с нужной позиции индекса, а не пропуском уже выданных документов.
+        Если указаны поля payload, остальные поля отбрасываются на сервере. Поля сортировки
+        сохраняются, так как из них формируется токен продолжения.
 
         Args:
             topic_ids (Optional[List[int]]): Список идентификаторов тем для поиска.
@@ -32,14 +188,15 @@ class SearchEngine:
             match (Optional[dict], optional): Критерии для сопоставления сообщений. По умолчанию None.
             sort (Optional[dict], optional): Параметры сортировки сообщений. По умолчанию None.
             limit (Optional[int], optional): Максимальное количество результатов. По умолчанию None.
+            cursor (Optional[str], optional): Токен продолжения предыдущей страницы. По умолчанию None.
+            fields (Optional[List[str]], optional): Возвращаемые поля payload. По умолчанию весь payload.
 
         Returns:
-            dict[str, list[Any]] | tuple[list[MessageOutput], Any]:
-                Словарь с ключами "messages" и "unique_ids", если результат пустой.
-                Кортеж, содержащий список объектов MessageOutput и список уникальных идентификаторов, если результат не пустой.
+            Tuple[List[Dict[str, Any]], Optional[SortSpec]]: Конвейер агрегации и порядок сортировки
+                страницы или None, если сортировка не поддерживает продолжение.
 
         Raises:
-            PermissionsError: Исключение, если в запросе используются небезопасные операторы, такие как '$where'.
+            InvalidCursor: Исключение, если токен продолжения поврежден или не подходит к сортировке.
         """
         pipeline = [{"$match": {"topic_id": {"$in": topic_ids}}}]
 
@@ -47,32 +204,275 @@ class SearchEngine:
             pipeline.append({"$match": {"unique_id": {"$in": unique_ids}}})
 
         if match:
-            if '$where' in json.dumps(match):
-                raise PermissionsError
             pipeline.append({"$match": match})
 
-        if sort:
-            if '$where' in json.dumps(sort):
-                raise PermissionsError
+        keyset = keyset_sort(sort)
+
+        if cursor:
+            if keyset is None:
+                raise InvalidCursor
+            pipeline.append({"$match": keyset_match(keyset, decode_cursor(cursor, keyset))})
+
+        if keyset:
+            pipeline.append({"$sort": dict(keyset)})
+        elif sort:
             pipeline.append({"$sort": sort})
 
         if limit:
             pipeline.append({"$limit": limit})
 
-        pipeline.append({
-            "$group": {
-                "_id": None,
-                "messages": {"$push": "$$ROOT"},
-                "unique_ids": {"$addToSet": "$unique_id"}
-            }
-        })
+        if fields:
+            pipeline.append({"$project": project_fields(fields, keyset)})
+
+        return pipeline, keyset
+
+    def _explain(self, unique_ids: Optional[List[int]], match: Optional[dict],
+                 sort: Optional[dict]) -> QueryExplanation:
+        """Проверяет условия поиска и оценивает стоимость запроса.
+
+        Args:
+            unique_ids (Optional[List[int]]): Список уникальных идентификаторов сообщений для поиска.
+            match (Optional[dict]): Критерии для сопоставления сообщений.
+            sort (Optional[dict]): Параметры сортировки сообщений.
+
+        Returns:
+            QueryExplanation: Результат проверки запроса.
+
+        Raises:
+            PermissionsError: Исключение, если в запросе используются операторы, выполняющие JavaScript.
+        """
+        return self._guard.explain(match=match, sort=keyset_sort(sort) or list((sort or {}).items()),
+                                   unique_ids=unique_ids)
+
+    @staticmethod
+    def _next_cursor(keyset: Optional[SortSpec], limit: Optional[int], count: int,
+                     last_document: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Формирует токен следующей страницы.
+
+        Args:
+            keyset (Optional[SortSpec]): Порядок сортировки страницы.
+            limit (Optional[int]): Размер страницы.
+            count (int): Количество документов на странице.
+            last_document (Optional[Dict[str, Any]]): Последний документ страницы.
+
+        Returns:
+            Optional[str]: Токен продолжения или None, если страница последняя.
+        """
+        if keyset is None or not limit or count < limit:
+            return None
+        return encode_cursor(keyset, last_document)
+
+    @staticmethod
+    def _collect_unique_id(found_unique_ids: Dict[Any, None], document: Dict[str, Any]) -> None:
+        """Запоминает уникальный идентификатор прочитанного сообщения.
+
+        Уникальные идентификаторы собираются при чтении курсора, поэтому конвейер поиска
+        не выполняется повторно для их группировки.
+
+        Args:
+            found_unique_ids (Dict[Any, None]): Идентификаторы в порядке первого появления.
+            document (Dict[str, Any]): Документ сообщения.
+        """
+        unique_id = document.get('unique_id')
+        if unique_id is not None:
+            found_unique_ids[unique_id] = None
+
+    @staticmethod
+    def _unique_ids_pipeline(pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Формирует конвейер, возвращающий уникальные идентификаторы сообщений страницы.
+
+        Выбор сообщений повторяется без проекции полей payload, после чего документы группируются
+        по unique_id. Сервер читает для группировки только поля фильтра и сортировки, поэтому
+        результат состоит из небольших документов, по одному на идентификатор.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации, выбирающий сообщения.
+
+        Returns:
+            List[Dict[str, Any]]: Конвейер агрегации с группировкой по unique_id.
+        """
+        selection = [stage for stage in pipeline if '$project' not in stage]
+        return selection + [{"$match": {"unique_id": {"$ne": None}}}, {"$group": {"_id": "$unique_id"}}]
+
+    async def search(self, topic_ids: Optional[List[int]], unique_ids: Optional[List[int]] = None,
+                     match: Optional[dict] = None, sort: Optional[dict] = None, limit: Optional[int] = None,
+                     cursor: Optional[str] = None, explain: bool = False,
+                     max_time_ms: Optional[int] = None, fields: Optional[List[str]] = None) -> bytes:
+        """Выполняет поиск сообщений по заданным критериям и возвращает страницу результатов.
+
+        Страница сериализуется в JSON модели SearchOutput напрямую из документов, без построения
+        моделей на каждое сообщение. Результат берется из кэша уже сериализованным, если кэш
+        включен и с момента сохранения в темы запроса не записывались сообщения. Дорогие запросы выполняются с ограниченной параллельностью.
+        Бюджет времени включает ожидание очереди дорогих запросов.
+
+        Args:
+            topic_ids (Optional[List[int]]): Список идентификаторов тем для поиска.
+            unique_ids (Optional[List[int]], optional): Список уникальных идентификаторов сообщений для поиска. По умолчанию None.
+            match (Optional[dict], optional): Критерии для сопоставления сообщений. По умолчанию None.
+            sort (Optional[dict], optional): Параметры сортировки сообщений. По умолчанию None.
+            limit (Optional[int], optional): Максимальное количество результатов. По умолчанию None.
+            cursor (Optional[str], optional): Токен продолжения предыдущей страницы. По умолчанию None.
+            explain (bool, optional): Только проверить запрос и вернуть результат проверки. По умолчанию False.
+            max_time_ms (Optional[int], optional): Бюджет времени выполнения запроса в миллисекундах.
+                По умолчанию без ограничения.
+            fields (Optional[List[str]], optional): Возвращаемые поля payload. По умолчанию весь payload.
+
+        Returns:
+            bytes: JSON модели SearchOutput с найденными сообщениями, их уникальными идентификаторами
+                и токеном следующей страницы или только с результатом проверки запроса.
+
+        Raises:
+            PermissionsError: Исключение, если в запросе используются операторы, выполняющие JavaScript.
+            QueryRejected: Исключение, если запрос использует неподдерживаемые операторы или слишком дорог.
+            InvalidCursor: Исключение, если токен продолжения поврежден или не подходит к сортировке.
+            TimeOutException: Исключение, если запрос не уложился в бюджет времени.
+        """
+        explanation = self._explain(unique_ids, match, sort)
+        if explain:
+            return SearchOutput(explain=explanation).model_dump_json().encode()
+        self._guard.check(explanation)
+
+        pipeline, keyset = self._build_pipeline(topic_ids, unique_ids, match, sort, limit, cursor, fields)
+        hidden = cursor_only_fields(fields, keyset) if fields else []
+        deadline = self._deadline(max_time_ms)
+        if self._cache is None:
+            async with self._guard.slot(explanation):
+                return await self._run_search(pipeline, keyset, limit, deadline, hidden)
+
+        topics = sorted(set(topic_ids))
+        # Ключ не зависит от порядка тем в запросе, остальной конвейер сравнивается как есть
+        key = (tuple(topics), json.dumps(pipeline[1:], default=str))
+        # Версии читаются до выполнения запроса: запись во время поиска сделает результат устаревшим
+        versions = tuple(sorted((await self._messages_manager.get_topic_versions(topics)).items()))
+
+        found, body = self._cache.get(key, versions)
+        if not found:
+            async with self._guard.slot(explanation):
+                body = await self._run_search(pipeline, keyset, limit, deadline, hidden)
+            self._cache.set(key, versions, body, size=len(body))
+
+        return body
+
+    async def _run_search(self, pipeline: List[Dict[str, Any]], keyset: Optional[SortSpec],
+                          limit: Optional[int], deadline: Optional[float] = None,
+                          hidden: Sequence[str] = ()) -> bytes:
+        """Выполняет конвейер поиска и сериализует страницу результатов.
+
+        Args:
+            pipeline (List[Dict[str, Any]]): Конвейер агрегации, выбирающий сообщения.
+            keyset (Optional[SortSpec]): Порядок сортировки страницы.
+            limit (Optional[int]): Размер страницы.
+            deadline (Optional[float], optional): Момент истечения бюджета по time.monotonic(). По умолчанию None.
+            hidden (Sequence[str], optional): Поля payload, нужные только для токена продолжения. По умолчанию нет.
+
+        Returns:
+            bytes: JSON модели SearchOutput с найденными сообщениями, их уникальными идентификаторами
+                и токеном следующей страницы.
+
+        Raises:
+            TimeOutException: Исключение, если запрос не уложился в бюджет времени.
+        """
+        documents, found_unique_ids = [], {}
+        try:
+            async for document in self._messages_manager.iterate_messages(
+                    pipeline, max_time_ms=self._remaining_ms(deadline)):
+                documents.append(document)
+                self._collect_unique_id(found_unique_ids, document)
+        except HTTPException as exc:
+            if exc is TimeOutException:
+                self._timeouts.labels(endpoint='search').inc()
+            raise
+
+        if not documents:
+            return SearchOutput().model_dump_json().encode()
+        return encode_response({'messages': [message_output(document, hidden) for document in documents],
+                                'unique_ids': list(found_unique_ids),
+                                'next_cursor': self._next_cursor(keyset, limit, len(documents), documents[-1]),
+                                'explain': None})
+
+    async def stream(self, topic_ids: Optional[List[int]], unique_ids: Optional[List[int]] = None,
+                     match: Optional[dict] = None, sort: Optional[dict] = None,
+                     limit: Optional[int] = None, cursor: Optional[str] = None,
+                     explain: bool = False, max_time_ms: Optional[int] = None,
+                     fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+        """Выполняет поиск сообщений и возвращает результат построчно в формате NDJSON.
+
+        Каждая строка содержит одно сообщение. Последняя строка содержит объект с ключами
+        "next_cursor" и "unique_ids". Сообщения записываются по мере чтения курсора, а уникальные
+        идентификаторы читаются отдельным запросом с группировкой по unique_id и тоже записываются
+        порциями, поэтому потребление памяти не зависит от размера результата. При пробном запуске
+        возвращается одна строка с объектом с ключом "explain".
+
+        Если бюджет времени истекает после отправки первых сообщений, последняя строка дополнительно
+        содержит ключ "error" со значением "timeout", а "next_cursor" указывает на последнее
+        отправленное сообщение, чтобы клиент мог продолжить чтение. Если бюджет истекает при чтении
+        идентификаторов, список "unique_ids" неполон и строка также содержит ключ "error".
+
+        Args:
+            topic_ids (Optional[List[int]]): Список идентификаторов тем для поиска.
+            unique_ids (Optional[List[int]], optional): Список уникальных идентификаторов сообщений для поиска. По умолчанию None.
+            match (Optional[dict], optional): Критерии для сопоставления сообщений. По умолчанию None.
+            sort (Optional[dict], optional): Параметры сортировки сообщений. По умолчанию None.
+            limit (Optional[int], optional): Максимальное количество результатов. По умолчанию None.
+            cursor (Optional[str], optional): Токен продолжения предыдущей страницы. По умолчанию None.
+            explain (bool, optional): Только проверить запрос и вернуть результат проверки. По умолчанию False.
+            max_time_ms (Optional[int], optional): Бюджет времени выполнения запроса в миллисекундах.
+                По умолчанию без ограничения.
+            fields (Optional[List[str]], optional): Возвращаемые поля payload. По умолчанию весь payload.
+
+        Yields:
+            bytes: Строки NDJSON.
+
+        Raises:
+            PermissionsError: Исключение, если в запросе используются операторы, выполняющие JavaScript.
+            QueryRejected: Исключение, если запрос использует неподдерживаемые операторы или слишком дорог.
+            InvalidCursor: Исключение, если токен продолжения поврежден или не подходит к сортировке.
+            TimeOutException: Исключение, если бюджет времени истек до отправки первого сообщения.
+        """
+        explanation = self._explain(unique_ids, match, sort)
+        if explain:
+            yield SearchOutput(explain=explanation).model_dump_json(include={'explain'}).encode() + b'\n'
+            return
+        self._guard.check(explanation)
+
+        pipeline, keyset = self._build_pipeline(topic_ids, unique_ids, match, sort, limit, cursor, fields)
+        hidden = cursor_only_fields(fields, keyset) if fields else []
+        deadline = self._deadline(max_time_ms)
 
-        result = await self._messages_manager.aggregate_messages(pipeline=pipeline)
-        if not result:
-            return {"messages": [], "unique_ids": []}
+        async with self._guard.slot(explanation):
+            count, last_document = 0, None
+            try:
+                async for document in self._messages_manager.iterate_messages(
+                        pipeline, batch_size=self._stream_batch_size, max_time_ms=self._remaining_ms(deadline)):
+                    yield encode_response(message_output(document, hidden)) + b'\n'
+                    count, last_document = count + 1, document
+            except HTTPException as exc:
+                if exc is not TimeOutException:
+                    raise
+                self._timeouts.labels(endpoint='stream').inc()
+                if count == 0:
+                    raise
 
-        aggregation_result = result[0]
-        messages = [MessageOutput(**data) for data in aggregation_result["messages"]]
-        unique_ids = aggregation_result["unique_ids"]
+                # Ответ уже начат, поэтому вместо статуса 504 клиент получает токен для продолжения чтения
+                yield encode_response({"unique_ids": None, "error": "timeout",
+                                       "next_cursor": encode_cursor(keyset, last_document) if keyset else None
+                                       }) + b'\n'
+                return
 
-        return messages, unique_ids
+            # Идентификаторы записываются в последнюю строку порциями по мере чтения курсора группировки
+            yield b'{"next_cursor":' + encode_response(self._next_cursor(keyset, limit, count, last_document)) + \
+                b',"unique_ids":['
+            separator = b''
+            try:
+                async for group in self._messages_manager.iterate_messages(
+                        self._unique_ids_pipeline(pipeline), batch_size=self._stream_batch_size,
+                        max_time_ms=self._remaining_ms(deadline)):
+                    yield separator + encode_response(group['_id'])
+                    separator = b','
+            except HTTPException as exc:
+                if exc is not TimeOutException:
+                    raise
+                self._timeouts.labels(endpoint='stream').inc()
+                yield b'],"error":"timeout"}\n'
+                return
+            yield b']}\n'
@@ -1,7 +1,11 @@
+from functools import partial
 from typing import Optional, List
 
 from aiohttp import ClientSession, BaseConnector
 
+from src.database.models import Subscription
+from src.utils.cache import TTLCache
+
 
 class APIService:
     """Базовый класс для сервисов, взаимодействующих с внешним API.
@@ -67,6 +71,23 @@ class APIService:
         headers = {'Authorization': f'Token {self._token}'}
         return headers
 
+    @staticmethod
+    def request_headers(token: Optional[str]) -> Optional[dict]:
+        """Формирует заголовки запроса от имени указанного токена.
+
+        Заголовки запроса заменяют заголовки сессии, поэтому через одну сессию можно выполнять
+        запросы от имени разных партнеров.
+
+        Args:
+            token (Optional[str]): Токен аутентификации партнера. Если не указан, используется токен сервиса.
+
+        Returns:
+            Optional[dict]: Заголовок авторизации или None, если токен не указан.
+        """
+        if token is None:
+            return None
+        return {'Authorization': f'Token {token}'}
+
 class TopicService(APIService):
     """Сервис для работы с темами через API.
 
@@ -74,40 +95,81 @@ class TopicService(APIService):
         has_permission: Проверяет, есть ли у пользователя разрешение на доступ к теме.
         get_my_topics: Получает список тем, доступных пользователю.
         get_urls: Получает список URL-адресов для подписки на указанную тему.
+        get_subscriptions: Получает список подписок на указанную тему.
+        get_retention_days: Получает срок хранения сообщений указанной темы.
     """
 
-    async def has_permission(self, topic_id: int) -> bool:
+    async def has_permission(self, topic_id: int, token: Optional[str] = None) -> bool:
         """Проверяет, есть ли у пользователя разрешение на доступ к указанной теме.
 
         Args:
             topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера, от имени которого выполняется запрос.
+                По умолчанию токен сервиса.
 
         Returns:
             bool: True, если разрешение есть, иначе False.
         """
-        response = await self._client_session.get(f'{self.base_url}/permissions/check/{topic_id}')
+        response = await self._client_session.get(f'{self.base_url}/permissions/check/{topic_id}',
+                                                   headers=self.request_headers(token))
         return response.status == 200
 
-    async def get_my_topics(self) -> List[int]:
+    async def get_my_topics(self, token: Optional[str] = None) -> List[int]:
         """Получает список тем, доступных пользователю.
 
+        Args:
+            token (Optional[str], optional): Токен партнера, от имени которого выполняется запрос.
+                По умолчанию токен сервиса.
+
         Returns:
             List[int]: Список идентификаторов доступных тем.
         """
-        response = await self._client_session.get(f'{self.base_url}/permissions/my')
+        response = await self._client_session.get(f'{self.base_url}/permissions/my',
+                                                   headers=self.request_headers(token))
         return await response.json()
 
-    async def get_urls(self, topic_id: int) -> List[int]:
+    async def get_urls(self, topic_id: int, token: Optional[str] = None) -> List[str]:
         """Получает список URL-адресов для подписки на указанную тему.
 
         Args:
             topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера, от имени которого выполняется запрос.
+                По умолчанию токен сервиса.
 
         Returns:
-            List[int]: Список URL-адресов.
+            List[str]: Список URL-адресов.
         """
-        response = await self._client_session.get(f'{self.base_url}/subscriptions/topic/{topic_id}')
-        return await response.json()
+        return [subscription.url for subscription in await self.get_subscriptions(topic_id, token)]
+
+    async def get_subscriptions(self, topic_id: int, token: Optional[str] = None) -> List[Subscription]:
+        """Получает список подписок на указанную тему вместе с настройками доставки.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера, от имени которого выполняется запрос.
+                По умолчанию токен сервиса.
+
+        Returns:
+            List[Subscription]: Список подписок.
+        """
+        response = await self._client_session.get(f'{self.base_url}/subscriptions/topic/{topic_id}',
+                                                   headers=self.request_headers(token))
+        return [Subscription(**subscription) for subscription in await response.json()]
+
+    async def get_retention_days(self, topic_id: int, token: Optional[str] = None) -> Optional[int]:
+        """Получает срок хранения сообщений указанной темы.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера, от имени которого выполняется запрос.
+                По умолчанию токен сервиса.
+
+        Returns:
+            Optional[int]: Срок хранения в днях или None, если для темы он не задан.
+        """
+        response = await self._client_session.get(f'{self.base_url}/topics/{topic_id}',
+                                                   headers=self.request_headers(token))
+        return (await response.json()).get('retention_days')
 
 class MockedTopicService(TopicService):
     """Мок-версия TopicService для тестирования.
@@ -116,38 +178,176 @@ class MockedTopicService(TopicService):
         has_permission: Всегда возвращает True.
         get_my_topics: Возвращает фиксированный список тем.
         get_urls: Возвращает фиксированный список URL-адресов.
+        get_subscriptions: Возвращает фиксированный список подписок.
+        get_retention_days: Возвращает None: срок хранения не задан.
     """
 
     def __init__(self):
         """Инициализирует экземпляр MockedTopicService с фиктивными данными."""
         super().__init__(host='mock', port=0, token='mock')
 
-    async def has_permission(self, topic_id: int) -> bool:
+    async def has_permission(self, topic_id: int, token: Optional[str] = None) -> bool:
         """Всегда возвращает True для тестирования.
 
         Args:
             topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. Не используется.
 
         Returns:
             bool: Всегда True.
         """
         return True
 
-    async def get_my_topics(self) -> List[int]:
+    async def get_my_topics(self, token: Optional[str] = None) -> List[int]:
         """Возвращает фиксированный список тем для тестирования.
 
+        Args:
+            token (Optional[str], optional): Токен партнера. Не используется.
+
         Returns:
             List[int]: Фиксированный список тем.
         """
         return [1, 2, 3]
 
-    async def get_urls(self, topic_id: int) -> List[str]:
+    async def get_urls(self, topic_id: int, token: Optional[str] = None) -> List[str]:
         """Возвращает фиксированный список URL-адресов для тестирования.
 
         Args:
             topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. Не используется.
 
         Returns:
             List[str]: Фиксированный список URL-адресов.
         """
         return ['http://localhost:8001/webhook']
+
+    async def get_subscriptions(self, topic_id: int, token: Optional[str] = None) -> List[Subscription]:
+        """Возвращает фиксированный список подписок для тестирования.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. Не используется.
+
+        Returns:
+            List[Subscription]: Фиксированный список подписок.
+        """
+        return [Subscription(url=url) for url in await self.get_urls(topic_id, token)]
+
+    async def get_retention_days(self, topic_id: int, token: Optional[str] = None) -> Optional[int]:
+        """Возвращает None для тестирования: сообщения хранятся бессрочно.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. Не используется.
+
+        Returns:
+            Optional[int]: Всегда None.
+        """
+        return None
+
+
+class CachedTopicService(TopicService):
+    """Кэширующая обертка над TopicService.
+
+    Ответы сервиса тем хранятся в общем для процесса кэше с ключами по партнеру, его токену и теме.
+    Промахи загружаются через общий для процесса сервис тем, сессия которого открывается при запуске
+    приложения, но каждый запрос выполняется с токеном партнера, поэтому сервис тем отвечает
+    с учетом прав этого партнера. Загрузка, которую ждут несколько запросов, не зависит от того,
+    какой из них первым промахнулся и когда он завершился.
+
+    Атрибуты:
+        _service (TopicService): Общий для процесса сервис тем с открытой сессией.
+        _cache (TTLCache): Кэш ответов сервиса тем.
+        _partner_id (int): Идентификатор партнера, от имени которого выполняются запросы.
+        _token (str): Токен партнера, передаваемый в каждом запросе к сервису тем.
+    """
+
+    def __init__(self, service: TopicService, cache: TTLCache, partner_id: int, token: str):
+        """Инициализирует экземпляр CachedTopicService.
+
+        Не вызывает APIService.__init__: обертка не открывает собственную сессию.
+
+        Args:
+            service (TopicService): Общий для процесса сервис тем с открытой сессией.
+            cache (TTLCache): Кэш ответов сервиса тем.
+            partner_id (int): Идентификатор партнера, от имени которого выполняются запросы.
+            token (str): Токен партнера.
+        """
+        self._service = service
+        self._cache = cache
+        self._partner_id = partner_id
+        self._token = token
+
+    async def __aenter__(self):
+        """Ничего не делает: сессией владеет общий сервис тем, а не обертка запроса."""
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Ничего не делает: сессия общего сервиса тем закрывается при остановке приложения.
+
+        Args:
+            exc_type (type): Тип исключения, если оно было выброшено.
+            exc_val (BaseException): Значение исключения, если оно было выброшено.
+            exc_tb (traceback): Трассировка стека, если исключение было выброшено.
+        """
+
+    async def has_permission(self, topic_id: int, token: Optional[str] = None) -> bool:
+        """Проверяет, есть ли у партнера разрешение на доступ к указанной теме.
+
+        Отказ кэшируется на меньшее время, чем разрешение.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. По умолчанию токен, переданный при создании.
+
+        Returns:
+            bool: True, если разрешение есть, иначе False.
+        """
+        token = token or self._token
+        return await self._cache.get_or_load(('permission', self._partner_id, token, topic_id),
+                                             partial(self._service.has_permission, topic_id, token))
+
+    async def get_my_topics(self, token: Optional[str] = None) -> List[int]:
+        """Получает список тем, доступных партнеру.
+
+        Args:
+            token (Optional[str], optional): Токен партнера. По умолчанию токен, переданный при создании.
+
+        Returns:
+            List[int]: Список идентификаторов доступных тем.
+        """
+        token = token or self._token
+        topics = await self._cache.get_or_load(('topics', self._partner_id, token),
+                                               partial(self._service.get_my_topics, token))
+        return list(topics)
+
+    async def get_subscriptions(self, topic_id: int, token: Optional[str] = None) -> List[Subscription]:
+        """Получает список подписок на указанную тему.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. По умолчанию токен, переданный при создании.
+
+        Returns:
+            List[Subscription]: Список подписок.
+        """
+        token = token or self._token
+        subscriptions = await self._cache.get_or_load(('subscriptions', self._partner_id, token, topic_id),
+                                                      partial(self._service.get_subscriptions, topic_id, token))
+        return list(subscriptions)
+
+    async def get_retention_days(self, topic_id: int, token: Optional[str] = None) -> Optional[int]:
+        """Получает срок хранения сообщений указанной темы.
+
+        Отсутствие срока хранения кэшируется на то же время, что и заданный срок.
+
+        Args:
+            topic_id (int): Идентификатор темы.
+            token (Optional[str], optional): Токен партнера. По умолчанию токен, переданный при создании.
+
+        Returns:
+            Optional[int]: Срок хранения в днях или None, если для темы он не задан.
+        """
+        token = token or self._token
+        return await self._cache.get_or_load(('retention', self._partner_id, token, topic_id),
+                                             partial(self._service.get_retention_days, topic_id, token),
+                                             is_negative=lambda value: False)
@@ -1,31 +1,73 @@
 import asyncio
-from typing import Optional
+from types import SimpleNamespace
+from typing import Optional, Any, Dict, List
 
-from aiohttp import ClientSession, BaseConnector
+from aiohttp import ClientSession, BaseConnector, ClientError, ClientTimeout, TraceConfig
+from anika_metrics import metrics
 
-from src.database.models import Message
+from src.utils.encoding import join_bodies
 
 
 class WebhooksNotifier:
     """Сервис для отправки уведомлений через вебхуки.
 
+    Сессия открывается один раз при запуске приложения и используется всеми доставками,
+    поэтому соединения с подписчиками переиспользуются через пул коннектора.
+
     Атрибуты:
         _client_session (Optional[ClientSession]): Опциональная клиентская сессия для выполнения HTTP-запросов.
         _connector (Optional[BaseConnector]): Опциональный объект для настройки соединений (например, для настройки прокси).
+        _timeout (Optional[ClientTimeout]): Тайм-ауты HTTP-запросов.
     """
 
-    def __init__(self, connector: Optional[BaseConnector] = None):
+    def __init__(self, connector: Optional[BaseConnector] = None, timeout: Optional[ClientTimeout] = None):
         """Инициализирует экземпляр WebhooksNotifier.
 
         Args:
             connector (Optional[BaseConnector], optional): Опциональный объект для настройки соединений. По умолчанию None.
+            timeout (Optional[ClientTimeout], optional): Тайм-ауты HTTP-запросов. По умолчанию тайм-ауты aiohttp.
         """
         self._client_session: Optional[ClientSession] = None
         self._connector = connector
+        self._timeout = timeout
+        self._connections = metrics.counter('webhooks_connections_total',
+                                            'Соединения с подписчиками: новые (reused=false) и взятые из пула',
+                                            labels=('reused',))
+        self._queued_time = metrics.histogram('webhooks_connection_queued_seconds',
+                                              'Время ожидания свободного соединения из-за лимитов пула')
+        self._request_time = metrics.histogram('webhooks_request_seconds',
+                                               'Время запросов к подписчикам по коду ответа '
+                                               '(timeout и error, если ответ не получен)', labels=('status',))
+
+    def _trace_config(self) -> TraceConfig:
+        """Создает трассировку соединений для учета переиспользования пула.
+
+        Returns:
+            TraceConfig: Конфигурация трассировки aiohttp.
+        """
+        async def on_connection_create_end(session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+            self._connections.labels(reused='false').inc()
+
+        async def on_connection_reuseconn(session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+            self._connections.labels(reused='true').inc()
+
+        async def on_connection_queued_start(session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+            context.queued_at = asyncio.get_running_loop().time()
+
+        async def on_connection_queued_end(session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+            self._queued_time.observe(asyncio.get_running_loop().time() - context.queued_at)
+
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(on_connection_queued_end)
+        return trace_config
 
     async def __aenter__(self):
         """Открывает клиентскую сессию при входе в контекстный менеджер."""
-        self._client_session = ClientSession(connector=self._connector)
+        kwargs = {'timeout': self._timeout} if self._timeout else {}
+        self._client_session = ClientSession(connector=self._connector, trace_configs=[self._trace_config()], **kwargs)
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Закрывает клиентскую сессию при выходе из контекстного менеджера.
@@ -38,22 +80,63 @@ class WebhooksNotifier:
         await self._client_session.close()
         self._client_session = None
 
-    async def _send(self, url: str, message: Message):
-        """Отправляет сообщение на указанный URL.
+    async def _send(self, url: str, body: bytes, headers: Optional[Dict[str, str]] = None):
+        """Отправляет сериализованное тело запроса в формате JSON на указанный URL.
 
         Args:
             url (str): URL, на который будет отправлено сообщение.
-            message (Message): Сообщение для отправки.
+            body (bytes): Сообщение или список сообщений в формате JSON.
+            headers (Optional[Dict[str, str]], optional): Дополнительные заголовки запроса. По умолчанию None.
+
+        Raises:
+            aiohttp.ClientError: Если запрос не удался или подписчик ответил кодом ошибки.
         """
-        response = await self._client_session.post(url=url, json=message.dict())
-        print(response)
+        headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body)), **(headers or {})}
+        started, status = asyncio.get_running_loop().time(), 'error'
+        try:
+            async with self._client_session.post(url=url, data=body, headers=headers) as response:
+                status = response.status
+                response.raise_for_status()
+        except asyncio.TimeoutError:
+            status = 'timeout'
+            raise
+        finally:
+            self._request_time.labels(status=status).observe(asyncio.get_running_loop().time() - started)
 
-    async def notify(self, message: Message, *urls: str):
-        """Отправляет уведомление на несколько URL-адресов.
+    async def deliver(self, url: str, body: bytes) -> Optional[str]:
+        """Доставляет сообщение на указанный URL.
 
         Args:
-            message (Message): Сообщение для отправки.
-            *urls (str): Список URL-адресов, на которые будут отправлены уведомления.
+            url (str): URL, на который будет отправлено сообщение.
+            body (bytes): Сообщение в формате JSON.
+
+        Returns:
+            Optional[str]: Описание ошибки или None, если доставка прошла успешно.
+        """
+        try:
+            await self._send(url, body)
+        except (ClientError, asyncio.TimeoutError) as e:
+            return repr(e)
+        return None
+
+    async def deliver_batch(self, url: str, bodies: List[bytes], batch_id: str) -> Optional[str]:
+        """Доставляет пакет сообщений на указанный URL одним запросом с JSON-массивом.
+
+        Массив собирается из уже сериализованных сообщений. Успешный ответ подписчика подтверждает
+        весь пакет. При повторной отправке пакет передается с тем же идентификатором в заголовке
+        X-Webhook-Batch-Id.
+
+        Args:
+            url (str): URL, на который будет отправлен пакет.
+            bodies (List[bytes]): Сообщения пакета в формате JSON.
+            batch_id (str): Идентификатор пакета.
+
+        Returns:
+            Optional[str]: Описание ошибки или None, если доставка прошла успешно.
         """
-        tasks = [self._send(url, message) for url in urls]
-        await asyncio.gather(*tasks)
+        try:
+            await self._send(url, join_bodies(bodies), headers={'X-Webhook-Batch-Id': batch_id,
+                                                                'X-Webhook-Batch-Size': str(len(bodies))})
+        except (ClientError, asyncio.TimeoutError) as e:
+            return repr(e)
+        return None
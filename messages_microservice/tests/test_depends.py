@@ -0,0 +1,23 @@
+import pytest
+
+from src.config import TimeBudgets, config
+from src.depends import resolve_time_budget
+
+
+@pytest.fixture
+def time_budgets(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, 'time_budgets',
+                        TimeBudgets(search_ms=7000, stream_ms=90000, partners={42: {'stream_ms': 300000}}))
+
+
+@pytest.mark.usefixtures('time_budgets')
+def test_partner_override_keeps_global_values_for_unset_fields() -> None:
+    assert resolve_time_budget('stream', 42) == 300000
+    assert resolve_time_budget('search', 42) == 7000
+    assert resolve_time_budget('search', 1) == 7000
+
+
+@pytest.mark.usefixtures('time_budgets')
+def test_client_can_only_lower_the_budget() -> None:
+    assert resolve_time_budget('search', 42, requested_ms=100) == 100
+    assert resolve_time_budget('search', 42, requested_ms=10 ** 6) == 7000
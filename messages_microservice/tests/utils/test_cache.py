@@ -0,0 +1,25 @@
+from src.utils.cache import VersionedCache
+
+
+def test_versioned_entries_expire_by_age(monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr('src.utils.cache.time.monotonic', lambda: now[0])
+    cache = VersionedCache(name='test_search', max_entries=10, max_bytes=1024, max_age_s=60)
+
+    cache.set('query', {1: 3}, b'page', size=4)
+    assert cache.get('query', {1: 3}) == (True, b'page')
+    # Сообщения могли быть удалены по TTL без изменения версий темы
+    now[0] += 60
+    assert cache.get('query', {1: 3}) == (False, None)
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_versioned_entries_without_max_age_follow_versions(monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr('src.utils.cache.time.monotonic', lambda: now[0])
+    cache = VersionedCache(name='test_search', max_entries=10, max_bytes=1024)
+
+    cache.set('query', {1: 3}, b'page', size=4)
+    now[0] += 86400
+    assert cache.get('query', {1: 3}) == (True, b'page')
+    assert cache.get('query', {1: 4}) == (False, None)
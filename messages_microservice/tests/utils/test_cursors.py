@@ -0,0 +1,20 @@
+from src.utils.cursors import keyset_match
+
+
+def test_page_ending_on_null_continues_with_set_values() -> None:
+    sort = [('payload.x', 1), ('_id', 1)]
+
+    assert keyset_match(sort, [None, 5]) == {'$or': [
+        {'payload.x': {'$ne': None}},
+        {'payload.x': None, '_id': {'$gt': 5}},
+    ]}
+
+
+def test_descending_page_continues_into_nulls() -> None:
+    sort = [('payload.x', -1), ('_id', -1)]
+
+    assert keyset_match(sort, [3, 5]) == {'$or': [
+        {'$or': [{'payload.x': {'$lt': 3}}, {'payload.x': None}]},
+        {'payload.x': 3, '_id': {'$lt': 5}},
+    ]}
+    assert keyset_match(sort, [None, 5]) == {'payload.x': None, '_id': {'$lt': 5}}
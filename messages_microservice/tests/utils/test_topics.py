@@ -0,0 +1,41 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from src.utils.cache import TTLCache
+from src.utils.topics import CachedTopicService, MockedTopicService
+
+
+class PartnerTopicService(MockedTopicService):
+    """Сервис тем, отвечающий в зависимости от токена запроса."""
+
+    def __init__(self, topics: Dict[str, List[int]]):
+        super().__init__()
+        self.topics = topics
+        self.tokens: List[Optional[str]] = []
+
+    async def has_permission(self, topic_id: int, token: Optional[str] = None) -> bool:
+        self.tokens.append(token)
+        return topic_id in self.topics.get(token, [])
+
+    async def get_my_topics(self, token: Optional[str] = None) -> List[int]:
+        self.tokens.append(token)
+        return self.topics.get(token, [])
+
+
+def test_partners_get_their_own_answers() -> None:
+    service = PartnerTopicService({'token-a': [1], 'token-b': [2]})
+    cache = TTLCache(name='test_topics', max_size=100, ttl_s=60, negative_ttl_s=60)
+    partner_a = CachedTopicService(service=service, cache=cache, partner_id=1, token='token-a')
+    partner_b = CachedTopicService(service=service, cache=cache, partner_id=2, token='token-b')
+
+    async def check() -> None:
+        assert await partner_a.get_my_topics() == [1]
+        assert await partner_b.get_my_topics() == [2]
+        assert await partner_a.has_permission(1)
+        assert not await partner_b.has_permission(1)
+        # Повторные запросы отвечаются из кэша, не смешивая партнеров
+        assert await partner_a.get_my_topics() == [1]
+        assert await partner_b.has_permission(2)
+
+    asyncio.run(check())
+    assert service.tokens == ['token-a', 'token-b', 'token-a', 'token-b', 'token-b']
@@ -0,0 +1,95 @@
+import asyncio
+
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+import sqlalchemy.future
+
+import src.models
+
+# Ключ блокировки, упорядочивающей запись в журнал изменений
+CHANGES_LOCK_KEY = 7_301_946_215
+
+
+class ChangeNotifier:
+    """Будит ожидающих читателей журнала после фиксации изменений.
+
+    Уведомления работают в пределах процесса. Читатели других процессов
+    узнают об изменениях при периодической проверке журнала.
+    """
+
+    def __init__(self) -> None:
+        self._waiters: set[asyncio.Future] = set()
+
+    def notify(self) -> None:
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, timeout: float) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+
+
+notifier = ChangeNotifier()
+
+
+async def record_change(  # noqa: PLR0913
+    db: sqlalchemy.ext.asyncio.AsyncSession,
+    entity: str,
+    entity_id: int,
+    action: str,
+    topic_id: int | None,
+    partner_id: int | None,
+) -> None:
+    # Вызывается до фиксации транзакции изменения. Блокировка держится до
+    # конца транзакции, поэтому версии фиксируются в порядке возрастания.
+    if db.bind.dialect.name == 'postgresql':
+        await db.execute(
+            sqlalchemy.select(
+                sqlalchemy.func.pg_advisory_xact_lock(CHANGES_LOCK_KEY),
+            ),
+        )
+
+    db.add(
+        src.models.Change(
+            entity=entity,
+            entity_id=entity_id,
+            action=action,
+            topic_id=topic_id,
+            partner_id=partner_id,
+        ),
+    )
+
+
+async def get_changes(
+    db: sqlalchemy.ext.asyncio.AsyncSession,
+    current_partner_id: int,
+    since: int = 0,
+    limit: int = 100,
+) -> list[src.models.Change]:
+    # Партнеру видны изменения принадлежащих партнеру тем, включая права
+    # доступа и подписки других партнеров, и собственные права доступа
+    # и подписки партнера. Для записей тем partner_id — владелец темы
+    own_topics = sqlalchemy.select(src.models.Topic.id).filter(
+        src.models.Topic.partner_id == current_partner_id,
+    )
+    result = await db.execute(
+        sqlalchemy.future.select(src.models.Change)
+        .filter(
+            src.models.Change.version > since,
+            sqlalchemy.or_(
+                src.models.Change.partner_id == current_partner_id,
+                src.models.Change.topic_id.in_(own_topics),
+            ),
+        )
+        .order_by(src.models.Change.version)
+        .limit(limit),
+    )
+    return result.scalars().all()
+
@@ -3,6 +3,7 @@ import sqlalchemy.ext.asyncio
 import sqlalchemy.future
 
 import src.config
+import src.crud.crud_changes
 import src.crud.crud_partners
 import src.crud.crud_topics
 import src.main
@@ -115,7 +116,17 @@ async def create_permission(
     await check_permission(permission.topic_id, db, current_partner_id)
     db_permission = src.models.Permission(**permission.model_dump())
     db.add(db_permission)
+    await db.flush()
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='permission',
+        entity_id=db_permission.id,
+        action='created',
+        topic_id=db_permission.topic_id,
+        partner_id=db_permission.partner_id,
+    )
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     await db.refresh(db_permission)
     logger.info(
         'Permission created for topic %s by partner %s',
@@ -132,8 +143,17 @@ async def delete_permission_by_id(
 ) -> src.models.Permission:
     db_permission = await get_permission_by_id(permission_id, db)
     await check_permission(db_permission.topic_id, db, current_partner_id)
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='permission',
+        entity_id=db_permission.id,
+        action='deleted',
+        topic_id=db_permission.topic_id,
+        partner_id=db_permission.partner_id,
+    )
     await db.delete(db_permission)
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     logger.info(
         'Permission with id %s deleted by partner %s',
         permission_id,
@@ -158,8 +178,17 @@ async def delete_permission_by_ids(
     db_permission = result.scalars().first()
 
     if db_permission:
+        await src.crud.crud_changes.record_change(
+            db,
+            entity='permission',
+            entity_id=db_permission.id,
+            action='deleted',
+            topic_id=db_permission.topic_id,
+            partner_id=db_permission.partner_id,
+        )
         await db.delete(db_permission)
         await db.commit()
+        src.crud.crud_changes.notifier.notify()
         logger.info(
             'Permission for partner %s and topic %s deleted by partner %s',
             partner_id,
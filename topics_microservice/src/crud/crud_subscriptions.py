@@ -4,6 +4,7 @@ import sqlalchemy.future
 import sqlalchemy.orm
 
 import src.config
+import src.crud.crud_changes
 import src.crud.crud_permissions
 import src.models
 import src.schemas
@@ -55,7 +56,17 @@ async def create_subscription(
         partner_id=current_partner_id,
     )
     db.add(db_subscription)
+    await db.flush()
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='subscription',
+        entity_id=db_subscription.id,
+        action='created',
+        topic_id=db_subscription.topic_id,
+        partner_id=db_subscription.partner_id,
+    )
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     await db.refresh(db_subscription)
     logger.info(
         'Subscription created with id %s for partner %s',
@@ -91,8 +102,17 @@ async def delete_subscription_by_id(
         db,
         current_partner_id,
     )
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='subscription',
+        entity_id=db_subscription.id,
+        action='deleted',
+        topic_id=db_subscription.topic_id,
+        partner_id=db_subscription.partner_id,
+    )
     await db.delete(db_subscription)
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     logger.info(
         'Subscription with id %s deleted by partner %s',
         subscription_id,
@@ -4,6 +4,7 @@ import sqlalchemy.ext.asyncio
 import sqlalchemy.future
 
 import src.config
+import src.crud.crud_changes
 import src.crud.crud_partners
 import src.models
 import src.schemas
@@ -95,7 +96,17 @@ async def create_topic(
         **topic.model_dump(), partner_id=current_partner_id,
     )
     db.add(db_topic)
+    await db.flush()
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='topic',
+        entity_id=db_topic.id,
+        action='created',
+        topic_id=db_topic.id,
+        partner_id=db_topic.partner_id,
+    )
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     await db.refresh(db_topic)
     logger.info(
         'Topic created with id %s by partner %s',
@@ -121,8 +132,32 @@ async def delete_topic(
             status_code=403, detail='Permission denied',
         )
 
+    # Права доступа и подписки удаляются каскадно. Их удаление записывается
+    # отдельно, чтобы партнеры, которым они принадлежали, получили изменение
+    for entity, related in (
+        ('permission', db_topic.permissions),
+        ('subscription', db_topic.subscriptions),
+    ):
+        for item in related:
+            await src.crud.crud_changes.record_change(
+                db,
+                entity=entity,
+                entity_id=item.id,
+                action='deleted',
+                topic_id=db_topic.id,
+                partner_id=item.partner_id,
+            )
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='topic',
+        entity_id=db_topic.id,
+        action='deleted',
+        topic_id=db_topic.id,
+        partner_id=db_topic.partner_id,
+    )
     await db.delete(db_topic)
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     logger.info(
         'Topic with id %s deleted by partner %s', topic_id, current_partner_id,
     )
@@ -149,7 +184,16 @@ async def edit_topic(
     for key, value in new_topic.model_dump(exclude_unset=True).items():
         setattr(db_topic, key, value)
 
+    await src.crud.crud_changes.record_change(
+        db,
+        entity='topic',
+        entity_id=db_topic.id,
+        action='updated',
+        topic_id=db_topic.id,
+        partner_id=db_topic.partner_id,
+    )
     await db.commit()
+    src.crud.crud_changes.notifier.notify()
     await db.refresh(db_topic)
     logger.info(
         'Topic with id %s edited by partner %s', topic_id, current_partner_id,
@@ -1,3 +1,4 @@
+from anika_metrics.engine import instrument_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -9,6 +10,7 @@ url = (
 )
 
 engine = create_async_engine(url=url, echo=True)
+instrument_engine(engine)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 Base = declarative_base()
 
@@ -1,7 +1,15 @@
+from anika_metrics import MetricsMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.routers import partners, permissions, subscriptions, topics
+from src.routers import (
+    changes,
+    metrics,
+    partners,
+    permissions,
+    subscriptions,
+    topics,
+)
 
 
 def create_app() -> FastAPI:
@@ -14,11 +22,14 @@ def create_app() -> FastAPI:
         allow_methods=['*'],
         allow_headers=['*'],
     )
+    app.add_middleware(MetricsMiddleware)
 
     app.include_router(topics.topic_router)
     app.include_router(permissions.permission_router)
     app.include_router(subscriptions.subscription_router)
     app.include_router(partners.partner_router)
+    app.include_router(changes.change_router)
+    app.include_router(metrics.metrics_router)
     return app
 
 
@@ -1,6 +1,7 @@
+import datetime
 from typing import List
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import BigInteger, ForeignKey, Integer, func
 from sqlalchemy.orm import (
     Mapped,
     declarative_mixin,
@@ -64,6 +65,8 @@ class Topic(Base, BaseEntity):
         cascade='all, delete-orphan',
     )
     json_template: Mapped[str] = mapped_column(default='{}')
+    # Срок хранения сообщений темы в днях, пустое значение — без ограничения
+    retention_days: Mapped[int] = mapped_column(nullable=True)
 
 
 class Permission(Base):
@@ -92,6 +95,12 @@ class Subscription(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     url: Mapped[str]
 
+    # Пакетная доставка: сообщения на один URL объединяются в один POST
+    batch_mode: Mapped[bool] = mapped_column(default=False)
+    batch_max_items: Mapped[int] = mapped_column(default=100)
+    batch_max_bytes: Mapped[int] = mapped_column(default=1048576)
+    batch_max_delay_ms: Mapped[int] = mapped_column(default=1000)
+
     topic_id: Mapped[int] = mapped_column(ForeignKey('topics.id'))
     topic: Mapped['Topic'] = relationship(
         'Topic',
@@ -105,3 +114,24 @@ class Subscription(Base):
         back_populates='subscriptions',
         lazy='selectin',
     )
+
+
+# Журнал изменений тем, прав доступа и подписок. Версии растут в порядке
+# фиксации транзакций, поэтому чтение после версии N не пропускает
+# изменений. При удалении темы удаление всех прав доступа и подписок темы
+# записывается отдельными записями.
+class Change(Base):
+    __tablename__ = 'changes'
+
+    version: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, 'sqlite'),
+        primary_key=True,
+    )
+    entity: Mapped[str]
+    entity_id: Mapped[int]
+    action: Mapped[str]
+    topic_id: Mapped[int] = mapped_column(nullable=True)
+    partner_id: Mapped[int] = mapped_column(nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        server_default=func.now(),
+    )
@@ -0,0 +1,131 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+
+from src import schemas
+from src.crud import crud_changes
+from src.database import SessionLocal
+from src.depends import get_current_partner_id
+
+change_router = APIRouter(prefix='/changes', tags=['Changes'])
+
+# Интервал проверки журнала на случай изменений, сделанных другими процессами
+POLL_INTERVAL_S = 1.0
+# Интервал отправки комментария, поддерживающего SSE-соединение
+KEEPALIVE_INTERVAL_S = 15.0
+
+
+async def fetch_changes(
+    current_partner_id: int,
+    since: int,
+    limit: int,
+) -> schemas.ChangeFeed:
+    # Отдельная короткая сессия на каждую проверку, чтобы ожидающие
+    # читатели не удерживали соединения пула
+    async with SessionLocal() as db:
+        changes = await crud_changes.get_changes(
+            db, current_partner_id, since=since, limit=limit,
+        )
+
+    version = changes[-1].version if changes else since
+    return schemas.ChangeFeed(
+        version=version,
+        changes=[schemas.Change.model_validate(change) for change in changes],
+    )
+
+
+async def wait_for_changes(
+    current_partner_id: int,
+    since: int,
+    limit: int,
+    timeout: float,
+) -> schemas.ChangeFeed:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        feed = await fetch_changes(current_partner_id, since, limit)
+        remaining = deadline - asyncio.get_running_loop().time()
+        if feed.changes or remaining <= 0:
+            return feed
+
+        await crud_changes.notifier.wait(min(POLL_INTERVAL_S, remaining))
+
+
+@change_router.get('')
+async def get_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    timeout: float = Query(default=25, ge=0, le=60),
+    current_partner_id: int = Depends(get_current_partner_id),
+) -> schemas.ChangeFeed:
+    """
+    Получить изменения тем, прав доступа и подписок после указанной версии.
+
+    Возвращаются изменения тем партнера, прав доступа и подписок на них,
+    а также прав доступа и подписок самого партнера.
+
+    Если новых изменений нет, запрос ожидает их появления до **timeout** секунд
+    (long polling) и возвращает пустой список по истечении времени.
+
+    Параметры:
+    - **since**: Версия, после которой нужно вернуть изменения
+      (по умолчанию 0 — с начала журнала).
+    - **limit**: Максимальное количество изменений в ответе
+      (по умолчанию 100).
+    - **timeout**: Максимальное время ожидания новых изменений в секундах
+      (по умолчанию 25, 0 — без ожидания).
+
+    Возвращает:
+    - Версию, с которой нужно продолжить чтение, и список изменений.
+      При удалении темы удаление ее прав доступа и подписок также
+      записывается в журнал.
+
+    Пример использования:
+    - GET `/changes?since=120` — получить изменения после версии 120.
+    """
+    return await wait_for_changes(current_partner_id, since, limit, timeout)
+
+
+@change_router.get('/stream')
+async def stream_changes(
+    since: int = Query(default=0, ge=0),
+    last_event_id: int | None = Header(default=None),
+    current_partner_id: int = Depends(get_current_partner_id),
+) -> StreamingResponse:
+    """
+    Подписаться на изменения тем, прав доступа и подписок в формате
+    Server-Sent Events.
+
+    Каждое изменение отправляется событием `change` с идентификатором,
+    равным его версии. При переподключении чтение продолжается с заголовка
+    `Last-Event-ID`. Отправляются те же изменения, что и в `GET /changes`.
+
+    Параметры:
+    - **since**: Версия, после которой нужно отправлять изменения
+      (по умолчанию 0 — с начала журнала).
+
+    Пример использования:
+    - GET `/changes/stream?since=120` — получать изменения после версии 120.
+    """
+    version = last_event_id if last_event_id is not None else since
+
+    async def events() -> AsyncIterator[str]:
+        nonlocal version
+        while True:
+            feed = await wait_for_changes(
+                current_partner_id, version, 100, KEEPALIVE_INTERVAL_S,
+            )
+            if not feed.changes:
+                yield ': keep-alive\n\n'
+                continue
+
+            for change in feed.changes:
+                yield (
+                    f'id: {change.version}\n'
+                    f'event: change\n'
+                    f'data: {change.model_dump_json()}\n\n'
+                )
+            version = feed.version
+
+    return StreamingResponse(events(), media_type='text/event-stream')
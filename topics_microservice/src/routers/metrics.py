@@ -0,0 +1,23 @@
+from anika_metrics import CONTENT_TYPE_LATEST, metrics
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+metrics_router = APIRouter(tags=['Metrics'])
+
+
+@metrics_router.get('/metrics', response_class=Response)
+async def get_metrics() -> Response:
+    """
+    Получить метрики сервиса в текстовом формате Prometheus.
+
+    Возвращает:
+    - Время обработки запросов по маршрутам, время запросов к PostgreSQL
+      и использование пула соединений.
+
+    Пример использования:
+    - GET `/metrics` — адрес для сбора метрик Prometheus.
+    """
+    return Response(
+        content=metrics.render(),
+        media_type=CONTENT_TYPE_LATEST,
+    )
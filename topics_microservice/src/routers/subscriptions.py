@@ -24,6 +24,11 @@ async def create_subscription(
 
     Параметры:
     - **subscription**: Данные для создания подписки. Включает идентификатор темы, на которую оформляется подписка.
+    - **batch_mode**: (по умолчанию: false) Доставлять сообщения пакетами:
+      один POST с JSON-массивом сообщений.
+    - **batch_max_items**, **batch_max_bytes**, **batch_max_delay_ms**:
+      Максимальные размер пакета в сообщениях и байтах и время накопления
+      пакета.
 
     Возвращает:
     - Объект созданной подписки.
@@ -32,7 +37,11 @@ async def create_subscription(
     - POST `/subscriptions/create` с телом запроса:
       ```json
       {
-        "topic_id": 123
+        "topic_id": 123,
+        "url": "https://example.com/webhook",
+        "batch_mode": true,
+        "batch_max_items": 500,
+        "batch_max_delay_ms": 2000
       }
       ```
     """
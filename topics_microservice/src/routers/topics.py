@@ -114,6 +114,8 @@ async def create_topic(
 
     Параметры:
     - **topic**: Данные для создания новой темы. Включает такие поля, как название и описание.
+      Поле **retention_days** задает срок хранения сообщений темы в днях
+      (по умолчанию без ограничения).
 
     Возвращает:
     - Объект созданной темы.
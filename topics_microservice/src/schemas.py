@@ -1,9 +1,15 @@
-from pydantic import BaseModel
+import datetime
+
+from pydantic import BaseModel, Field
 
 
 class SubscriptionBase(BaseModel):
     topic_id: int
     url: str
+    batch_mode: bool = False
+    batch_max_items: int = Field(default=100, ge=1, le=10000)
+    batch_max_bytes: int = Field(default=1048576, ge=1024)
+    batch_max_delay_ms: int = Field(default=1000, ge=0, le=60000)
 
 
 class SubscriptionCreate(SubscriptionBase):
@@ -40,6 +46,7 @@ class TopicBase(BaseModel):
     name: str
     description: str | None = None
     json_template: str
+    retention_days: int | None = Field(default=None, ge=1, le=36500)
 
 
 class TopicCreate(TopicBase):
@@ -75,3 +82,21 @@ class Topic(TopicBase):
 
     class Config:
         from_attributes = True
+
+
+class Change(BaseModel):
+    version: int
+    entity: str
+    entity_id: int
+    action: str
+    topic_id: int | None = None
+    partner_id: int | None = None
+    created_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChangeFeed(BaseModel):
+    version: int
+    changes: list[Change] = []